@@ -0,0 +1,241 @@
+"""Consistent, incremental backups of the database and uploads.
+
+    python backup.py .backup                 # base snapshot first time, then changed rows only
+    python backup.py .backup --full          # start a new chain from a fresh snapshot
+    python backup.py restore .backup --db restored.db --uploads restored_uploads
+
+A chain is one gzipped snapshot taken with the SQLite backup API, followed by
+gzipped NDJSON files holding the rows changed since the previous run (tracked
+by triggers into change_log, which the first backup switches on). If
+maintenance trimmed change_log because backups stopped running, the next run
+starts a new chain. Uploads are stored once per content hash, so re-runs and
+duplicate files cost nothing.
+
+A restore migrates the base snapshot to the current schema before replaying
+the increments, which may hold columns added after the snapshot was taken.
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import config
+import db
+import pdf_store
+
+# Start a new chain once the increments outgrow the snapshot they apply to
+REBASE_RATIO = 1.0
+
+
+def _write_json(path: Path, data: dict):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> dict:
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+# ── Database ────────────────────────────────────────────────────────────
+
+def _encode(value):
+    # BLOB columns (archived chats) as {"$bytes": base64}
+    if isinstance(value, bytes):
+        return {"$bytes": base64.b64encode(value).decode()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: dict):
+    return base64.b64decode(obj["$bytes"]) if obj.keys() == {"$bytes"} else obj
+
+
+def snapshot(db_dir: Path) -> dict:
+    """Write a fresh base snapshot and drop the previous chain."""
+    db_dir.mkdir(parents=True, exist_ok=True)
+    old = _read_json(db_dir / "manifest.json")
+    name = f"base-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.db.gz"
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = Path(tmp) / "snapshot.db"
+        last_seq = db.backup_to(str(raw))
+        with open(raw, "rb") as src, gzip.open(db_dir / f"{name}.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    os.replace(db_dir / f"{name}.tmp", db_dir / name)
+
+    manifest = {"base": name, "increments": [], "seq": last_seq}
+    _write_json(db_dir / "manifest.json", manifest)
+    db.clear_changes(last_seq)
+    for stale in [old.get("base"), *old.get("increments", [])]:
+        if stale and stale != name:
+            (db_dir / stale).unlink(missing_ok=True)
+    return {"snapshot": name, "bytes": (db_dir / name).stat().st_size}
+
+
+def export_changes(db_dir: Path) -> dict:
+    """Append the rows changed since the last run to the chain."""
+    manifest = _read_json(db_dir / "manifest.json")
+    tmp = db_dir / "increment.tmp"
+    last_seq = rows = 0
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for seq, record in db.iter_changes():
+            f.write(json.dumps(record, separators=(",", ":"), default=_encode) + "\n")
+            last_seq = max(last_seq, seq)
+            rows += 1
+    if not rows:
+        tmp.unlink()
+        return {"increment": None, "rows": 0}
+
+    name = f"incr-{last_seq:012d}.ndjson.gz"
+    os.replace(tmp, db_dir / name)
+    manifest["increments"].append(name)
+    manifest["seq"] = last_seq
+    _write_json(db_dir / "manifest.json", manifest)
+    db.clear_changes(last_seq)
+    return {"increment": name, "rows": rows, "bytes": (db_dir / name).stat().st_size}
+
+
+def _needs_rebase(db_dir: Path) -> bool:
+    manifest = _read_json(db_dir / "manifest.json")
+    if not manifest or not (db_dir / manifest["base"]).exists():
+        return True
+    # Changes were trimmed before this chain exported them
+    oldest = db.oldest_change_seq()
+    if oldest is not None and oldest > manifest["seq"] + 1:
+        return True
+    base_size = (db_dir / manifest["base"]).stat().st_size
+    incr_size = sum((db_dir / name).stat().st_size for name in manifest["increments"])
+    return incr_size > base_size * REBASE_RATIO
+
+
+def restore_db(db_dir: Path, dest: Path) -> int:
+    """Rebuild a database from the chain in db_dir; returns the number of rows replayed."""
+    manifest = _read_json(db_dir / "manifest.json")
+    if not manifest:
+        raise FileNotFoundError(f"no database backup in {db_dir}")
+    with gzip.open(db_dir / manifest["base"], "rb") as src, open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    live, db.DB_PATH = db.DB_PATH, str(dest)
+    try:
+        db.init_db()
+    finally:
+        db.DB_PATH = live
+
+    conn = sqlite3.connect(dest)
+    replayed = 0
+    try:
+        # Replay in change order; FK checks would trip on rows whose parent comes later
+        conn.execute("PRAGMA foreign_keys=OFF")
+        # The replayed rows already hold what the triggers derive (rollups, link weights,
+        # graph versions); firing them again would double-count or date rows to today
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        for name in manifest["increments"]:
+            with gzip.open(db_dir / name, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line, object_hook=_decode)
+                    table, row, key = record["table"], record["row"], record["key"]
+                    if row is None:
+                        where = " AND ".join(f"{k} = ?" for k in key)
+                        conn.execute(f"DELETE FROM {table} WHERE {where}", list(key.values()))
+                    else:
+                        cols = ", ".join(row)
+                        marks = ", ".join("?" for _ in row)
+                        conn.execute(f"INSERT OR REPLACE INTO {table} ({cols}) VALUES ({marks})", list(row.values()))
+                    replayed += 1
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.execute("DELETE FROM change_log")
+        conn.commit()
+    finally:
+        conn.close()
+    return replayed
+
+
+# ── Uploads ─────────────────────────────────────────────────────────────
+
+def _blob_path(blob_dir: Path, digest: str) -> Path:
+    return blob_dir / digest[:2] / digest
+
+
+def backup_uploads(upload_dir: Path, dest: Path) -> dict:
+    """Store each upload once under its SHA-256; the manifest maps file names to blobs."""
+    blob_dir = dest / "blobs"
+    old = _read_json(dest / "manifest.json")
+    manifest = {}
+    new_blobs = 0
+    for path in sorted(upload_dir.rglob("*")) if upload_dir.exists() else []:
+        if not path.is_file() or path.suffix == ".tmp":
+            continue
+        name = path.relative_to(upload_dir).as_posix()
+        stat = path.stat()
+        prev = old.get(name)
+        # Skip re-hashing files that have not changed since the last run
+        if prev and prev["size"] == stat.st_size and prev["mtime"] == stat.st_mtime:
+            digest = prev["sha256"]
+        else:
+            digest = pdf_store.hash_file(path)
+        blob = _blob_path(blob_dir, digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, blob.with_suffix(".tmp"))
+            os.replace(blob.with_suffix(".tmp"), blob)
+            new_blobs += 1
+        manifest[name] = {"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime}
+    dest.mkdir(parents=True, exist_ok=True)
+    _write_json(dest / "manifest.json", manifest)
+    return {"files": len(manifest), "blobs": len({m["sha256"] for m in manifest.values()}), "new_blobs": new_blobs}
+
+
+def restore_uploads(src: Path, upload_dir: Path) -> int:
+    manifest = _read_json(src / "manifest.json")
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    for name, entry in manifest.items():
+        (upload_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(_blob_path(src / "blobs", entry["sha256"]), upload_dir / name)
+    return len(manifest)
+
+
+# ── CLI ─────────────────────────────────────────────────────────────────
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    if argv[:1] == ["restore"]:
+        parser.add_argument("command")
+        parser.add_argument("backup_dir", type=Path)
+        parser.add_argument("--db", type=Path, required=True, help="database file to create")
+        parser.add_argument("--uploads", type=Path, help="directory to restore uploads into")
+        args = parser.parse_args(argv)
+        if args.db.exists():
+            parser.error(f"{args.db} already exists")
+        report = {"rows_replayed": restore_db(args.backup_dir / "db", args.db)}
+        if args.uploads:
+            report["uploads"] = restore_uploads(args.backup_dir / "uploads", args.uploads)
+    else:
+        parser.add_argument("backup_dir", type=Path)
+        parser.add_argument("--full", action="store_true", help="start a new chain from a fresh snapshot")
+        parser.add_argument("--db", help="database to back up (default: DB_PATH)")
+        args = parser.parse_args(argv)
+        if args.db:
+            db.DB_PATH = args.db
+        db.init_db()
+        db_dir = args.backup_dir / "db"
+        # Changes made while logging was off are in no increment
+        started = db.enable_change_log()
+        report = snapshot(db_dir) if args.full or started or _needs_rebase(db_dir) else export_changes(db_dir)
+        report["uploads"] = backup_uploads(config.UPLOAD_DIR, args.backup_dir / "uploads")
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
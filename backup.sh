@@ -14,9 +14,17 @@ if [ ! -d "$BACKUP_DIR/.git" ]; then
     git -C "$BACKUP_DIR" branch -m main
 fi
 
-# Copy data in
-cp -r uploads "$BACKUP_DIR/" 2>/dev/null || true
-cp -r data "$BACKUP_DIR/" 2>/dev/null || true
+PYTHON=".venv/bin/python"
+[ -x "$PYTHON" ] || PYTHON="python3"
+
+# Docker keeps the database under data/; otherwise DB_PATH from .env applies
+DB_ARGS=()
+if [ -z "$DB_PATH" ] && [ -f data/paper_mind.db ]; then
+    DB_ARGS=(--db data/paper_mind.db)
+fi
+
+# Consistent snapshot or changed rows since the last run, plus deduplicated uploads
+"$PYTHON" backup.py "$BACKUP_DIR" "${DB_ARGS[@]}"
 
 # Commit and push if there are changes
 cd "$BACKUP_DIR"
@@ -0,0 +1,158 @@
+"""Database size and page-cache hit rate before and after archiving chats.
+
+    python -m bench.chat_archive                  # 10k-paper library, ~2k chats
+    python -m bench.chat_archive --papers 50000 --recent 0.2
+
+Generates a library with bench.dbbench (every chat a year or more old, except
+a --recent fraction touched today), measures it, runs storage maintenance
+(chat archival, then incremental_vacuum), and measures it again.
+
+Each measurement has the file size, the bytes each chat table takes (dbstat),
+the median latency of the dashboard's list_chats and of opening a chat, and
+the page-cache hit rate of a mixed workload of chat lists and opened chats.
+The hit rate comes from sqlite3_db_status on one connection opened through
+ctypes, since Python's sqlite3 module does not expose it. That connection uses
+the app's cache_size with mmap off, so every page read goes through the cache.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import config
+import db
+import maintenance
+from bench.dbbench import generate_corpus
+
+SQLITE_OPEN_READONLY = 0x01
+SQLITE_DBSTATUS_CACHE_HIT = 7
+SQLITE_DBSTATUS_CACHE_MISS = 8
+
+
+class _RawConnection:
+    """Just enough of the C API to read a connection's page-cache counters."""
+
+    def __init__(self, path: str):
+        self.lib = ctypes.CDLL(ctypes.util.find_library("sqlite3"))
+        self.lib.sqlite3_exec.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_void_p,
+                                          ctypes.c_void_p]
+        self.lib.sqlite3_db_status.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_int),
+                                               ctypes.POINTER(ctypes.c_int), ctypes.c_int]
+        self.handle = ctypes.c_void_p()
+        if self.lib.sqlite3_open_v2(path.encode(), ctypes.byref(self.handle), SQLITE_OPEN_READONLY, None):
+            raise RuntimeError(f"cannot open {path}")
+
+    def execute(self, sql: str):
+        if self.lib.sqlite3_exec(self.handle, sql.encode(), None, None, None):
+            raise RuntimeError(f"failed: {sql}")
+
+    def status(self, op: int) -> int:
+        current, high = ctypes.c_int(), ctypes.c_int()
+        self.lib.sqlite3_db_status(self.handle, op, ctypes.byref(current), ctypes.byref(high), 0)
+        return current.value
+
+    def close(self):
+        self.lib.sqlite3_close(self.handle)
+
+
+def _workload(rng: random.Random, paper_ids: list[int], recent_chats: list[int], n: int) -> list[str]:
+    """What the app reads: dashboard and paper-page chat lists, and recent chats opened."""
+    statements = []
+    for _ in range(n):
+        statements.append(
+            "SELECT ch.id, ch.paper_id, ch.agent_type, ch.created_at, p.title FROM chat_history ch "
+            "JOIN papers p ON ch.paper_id = p.id ORDER BY ch.created_at DESC LIMIT 10"
+        )
+        statements.append(
+            "SELECT ch.id, ch.paper_id, ch.agent_type, ch.created_at, p.title FROM chat_history ch "
+            f"JOIN papers p ON ch.paper_id = p.id WHERE ch.paper_id = {rng.choice(paper_ids)} "
+            "ORDER BY ch.created_at DESC LIMIT 20"
+        )
+        chat_id = rng.choice(recent_chats)
+        statements.append(f"SELECT * FROM chat_history WHERE id = {chat_id}")
+        statements.append(f"SELECT codec, messages FROM chat_archive WHERE chat_id = {chat_id}")
+    return statements
+
+
+def _hit_rate(path: str, statements: list[str]) -> dict:
+    conn = _RawConnection(path)
+    try:
+        conn.execute(f"PRAGMA cache_size={db.PRAGMAS['cache_size']}; PRAGMA mmap_size=0")
+        for sql in statements:
+            conn.execute(sql)
+        hits, misses = conn.status(SQLITE_DBSTATUS_CACHE_HIT), conn.status(SQLITE_DBSTATUS_CACHE_MISS)
+    finally:
+        conn.close()
+    return {"cache_hits": hits, "cache_misses": misses, "hit_rate": round(hits / max(1, hits + misses), 4)}
+
+
+def _median_ms(fn, args: tuple, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def measure(statements: list[str], chat_ids: list[int], repeat: int) -> dict:
+    db.checkpoint()
+    with db._conn() as conn:
+        tables = {r["name"]: r["bytes"] for r in conn.execute(
+            "SELECT name, SUM(pgsize) AS bytes FROM dbstat "
+            "WHERE name IN ('chat_history', 'chat_archive') GROUP BY name"
+        )}
+    rng = random.Random(0)
+    return {
+        "file_bytes": db.storage_info()["file_bytes"],
+        "table_bytes": tables,
+        "list_chats_ms": _median_ms(db.list_chats, (None, 10), repeat),
+        "get_chat_ms": statistics.median(_median_ms(db.get_chat, (rng.choice(chat_ids),), 1) for _ in range(repeat)),
+        **_hit_rate(db.DB_PATH, statements),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=10_000)
+    parser.add_argument("--recent", type=float, default=0.1, help="fraction of chats active today")
+    parser.add_argument("--requests", type=int, default=500, help="page views in the hit-rate workload")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    path = Path(tempfile.mkdtemp()) / "archive.db"
+    print(f"generating {args.papers} papers...", file=sys.stderr)
+    generate_corpus(path, args.papers, seed=args.seed)
+    db.DB_PATH = str(path)
+    db.init_db()
+
+    rng = random.Random(args.seed)
+    with db._conn() as conn:
+        chats = [(r["id"], r["paper_id"]) for r in conn.execute("SELECT id, paper_id FROM chat_history")]
+        recent = rng.sample(chats, k=max(1, int(len(chats) * args.recent)))
+        conn.executemany("UPDATE chat_history SET updated_at = ? WHERE id = ?",
+                         [(datetime.now(timezone.utc).isoformat(), chat_id) for chat_id, _ in recent])
+    statements = _workload(rng, [p for _, p in chats], [c for c, _ in recent], args.requests)
+    chat_ids = [c for c, _ in chats]
+
+    report = {"papers": args.papers, "chats": len(chats), "archive_days": config.CHAT_ARCHIVE_DAYS}
+    report["before"] = measure(statements, chat_ids, args.repeat)
+    t0 = time.perf_counter()
+    report["maintenance"] = maintenance.run_once(force=True)["actions"]
+    report["maintenance_s"] = round(time.perf_counter() - t0, 2)
+    report["archive"] = db.get_chat_archive_stats()
+    report["after"] = measure(statements, chat_ids, args.repeat)
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
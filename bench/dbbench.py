@@ -0,0 +1,372 @@
+"""Synthetic-corpus microbenchmarks for db.py.
+
+    python -m bench.dbbench                           # 100, 10k and 100k papers
+    python -m bench.dbbench --sizes 100,10000 -o report.json
+    python -m bench.dbbench --compare baseline.json --threshold 0.25
+
+Each size gets its own generated SQLite file (cached under --cache-dir so
+reruns skip generation). Every public db function is timed against it and
+the results are written as JSON keyed by size and function name. With
+--compare, the run exits non-zero if any median regressed by more than
+--threshold relative to the baseline report.
+"""
+import argparse
+import hashlib
+import json
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import db
+import graph_metrics
+import scheduler
+
+DEFAULT_SIZES = [100, 10_000, 100_000]
+WORDS = (
+    "learning neural network graph attention model sparse dense optimal bound "
+    "gradient convex stochastic inference bayesian latent kernel transformer "
+    "retrieval embedding contrastive causal robust adversarial federated quantum "
+    "reinforcement policy reward agent language vision diffusion generative"
+).split()
+
+
+# ── Corpus generation ──────────────────────────────────────────────────
+
+def _text(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=n_words))
+
+
+def generate_corpus(path: Path, n_papers: int, seed: int = 0):
+    """Fill a fresh database at `path` with a synthetic library.
+
+    Concept popularity follows a Zipf-like curve so a few concepts are shared
+    by many papers and most by few, which is what real libraries look like.
+    """
+    rng = random.Random(seed)
+    db.DB_PATH = str(path)
+    db.init_db()
+
+    n_concepts = max(50, n_papers * 2)
+    weights = [1 / (rank ** 1.1) for rank in range(1, n_concepts + 1)]
+    cum_weights = []
+    total = 0.0
+    for w in weights:
+        total += w
+        cum_weights.append(total)
+    concept_ids = list(range(1, n_concepts + 1))
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys=OFF")
+    with conn:
+        conn.executemany(
+            "INSERT INTO concepts (id, name, description) VALUES (?, ?, ?)",
+            ((i, f"concept {i} {_text(rng, 2)}", _text(rng, 20)) for i in concept_ids),
+        )
+
+        papers, paper_concepts, links, notes, chats = [], [], {}, [], []
+        for pid in range(1, n_papers + 1):
+            added = (start + timedelta(minutes=pid)).isoformat()
+            # ~1% of uploads share a filename with an earlier one, for prune_duplicate_papers
+            source = f"paper_{pid - 1}.pdf" if pid > 1 and rng.random() < 0.01 else f"paper_{pid}.pdf"
+            authors = [f"{_text(rng, 1).title()} {_text(rng, 1).title()}" for _ in range(rng.randint(1, 8))]
+            papers.append((
+                pid, f"Paper {pid}: {_text(rng, 8)}", json.dumps(authors), _text(rng, 150),
+                _text(rng, 350), source, "", added,
+                rng.choice([None, rng.random()]), hashlib.sha256(source.encode()).hexdigest(),
+            ))
+
+            cids = set(rng.choices(concept_ids, cum_weights=cum_weights, k=rng.randint(5, 15)))
+            paper_concepts.extend((pid, c) for c in cids)
+            cid_list = sorted(cids)
+            for _ in range(rng.randint(3, 10)):
+                if len(cid_list) < 2:
+                    break
+                a, b = sorted(rng.sample(cid_list, 2))
+                links.setdefault((a, b), set()).add(pid)
+
+            for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+                notes.append((pid, _text(rng, 25), added))
+
+            if rng.random() < 0.2:
+                n_msgs = min(300, int(rng.expovariate(1 / 15)) + 2)
+                msgs = []
+                for i in range(n_msgs):
+                    if i % 2 == 0:
+                        msgs.append({"role": "user", "content": _text(rng, 30)})
+                    else:
+                        msgs.append({"role": "assistant", "content": _text(rng, 120),
+                                     "agent": rng.choice(["teach", "zealot"])})
+                chats.append((pid, rng.choice(["teach", "zealot"]), json.dumps(msgs), added, added, len(msgs)))
+
+        conn.executemany(
+            "INSERT INTO papers (id, title, authors, abstract, summary, source_url, raw_text, added_at, self_rating, "
+            "pdf_sha256) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            papers,
+        )
+        conn.executemany("INSERT INTO paper_concepts (paper_id, concept_id) VALUES (?, ?)", paper_concepts)
+        relationships = {link: rng.choice(["extends", "is a type of", "improves upon", "uses"]) for link in links}
+        conn.executemany(
+            "INSERT INTO concept_links (concept_a, concept_b, relationship, weight) VALUES (?, ?, ?, ?)",
+            ((a, b, relationships[a, b], len(pids)) for (a, b), pids in links.items()),
+        )
+        conn.executemany(
+            "INSERT INTO concept_link_papers (concept_a, concept_b, paper_id, relationship) VALUES (?, ?, ?, ?)",
+            ((a, b, pid, relationships[a, b]) for (a, b), pids in links.items() for pid in pids),
+        )
+        conn.executemany(
+            "INSERT INTO user_notes (paper_id, takeaway, created_at) VALUES (?, ?, ?)", notes
+        )
+        conn.executemany(
+            "INSERT INTO chat_history (paper_id, agent_type, messages_json, created_at, updated_at, message_count) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            chats,
+        )
+        # Only concepts some paper uses exist in a real library
+        conn.execute("DELETE FROM concepts WHERE id NOT IN (SELECT DISTINCT concept_id FROM paper_concepts)")
+        used = [r[0] for r in conn.execute("SELECT id FROM concepts")]
+        tested = rng.sample(used, k=int(len(used) * 0.3))
+        # Reviews fall due from a month ago to two months out, so the queue is never empty
+        now = datetime.now(timezone.utc)
+        conn.executemany(
+            "INSERT INTO user_knowledge (concept_id, confidence, last_tested, stability, difficulty, reviews, due_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((c, rng.random(), start.isoformat(), rng.uniform(0.25, 60), rng.uniform(1, 10), rng.randint(1, 8),
+              scheduler.stamp(now + timedelta(days=rng.uniform(-30, 60)))) for c in tested),
+        )
+        # A fresh library has nothing pending backup
+        conn.execute("DELETE FROM change_log")
+    conn.execute("ANALYZE")
+    conn.close()
+    graph_metrics.refresh(force=True)
+
+
+# ── Cases ──────────────────────────────────────────────────────────────
+
+def build_cases(path: Path, rng: random.Random) -> dict:
+    """Return {name: setup} where setup() -> (fn, args) and is not timed."""
+    conn = sqlite3.connect(path)
+
+    def _random_row(table: str, col: str = "id"):
+        # Seeded pick by rowid, so every run targets the same rows
+        max_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+        row = conn.execute(
+            f"SELECT {col} FROM {table} WHERE id >= ? ORDER BY id LIMIT 1", (rng.randint(1, max_id),)
+        ).fetchone()
+        return row[0] if row else conn.execute(f"SELECT {col} FROM {table} LIMIT 1").fetchone()[0]
+
+    def paper_id():
+        return _random_row("papers")
+
+    def concept_id():
+        return _random_row("concepts")
+
+    def chat_id():
+        return _random_row("chat_history")
+
+    def author_id():
+        return _random_row("authors")
+
+    def link():
+        return conn.execute(
+            "SELECT concept_a, concept_b FROM concept_links WHERE concept_a >= ? ORDER BY concept_a LIMIT 1",
+            (concept_id(),),
+        ).fetchone() or conn.execute("SELECT concept_a, concept_b FROM concept_links LIMIT 1").fetchone()
+
+    def paper_row(col):
+        return _random_row("papers", col)
+
+    def seed_duplicates():
+        # Recreate a handful of duplicate uploads so every prune run has work to do
+        rows = conn.execute(
+            "SELECT title, authors, abstract, summary, source_url, raw_text, added_at, pdf_sha256 "
+            "FROM papers WHERE id >= ? ORDER BY id LIMIT 10", (paper_id(),)
+        ).fetchall()
+        with conn:
+            conn.executemany(
+                "INSERT INTO papers (title, authors, abstract, summary, source_url, raw_text, added_at, pdf_sha256) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return db.prune_duplicate_papers, ()
+
+    def chat_messages():
+        cid = chat_id()
+        msgs = json.loads(conn.execute(
+            "SELECT messages_json FROM chat_history WHERE id = ?", (cid,)
+        ).fetchone()[0])
+        msgs.append({"role": "user", "content": _text(rng, 30)})
+        return db.update_chat_messages, (cid, msgs)
+
+    return {
+        "get_stats": lambda: (db.get_stats, ()),
+        "list_papers": lambda: (db.list_papers, ()),
+        "list_concepts": lambda: (db.list_concepts, ()),
+        "list_chats": lambda: (db.list_chats, ()),
+        "list_chats_for_paper": lambda: (db.list_chats, (paper_id(),)),
+        "get_all_concept_links": lambda: (db.get_all_concept_links, ()),
+        "get_top_concepts_subgraph": lambda: (db.get_top_concepts_subgraph, (100,)),
+        "get_communities": lambda: (db.get_communities, ()),
+        "get_link_papers": lambda: (db.get_link_papers, link()),
+        "get_user_knowledge": lambda: (db.get_user_knowledge, ()),
+        "get_review_queue": lambda: (db.get_review_queue, ()),
+        "get_paper": lambda: (db.get_paper, (paper_id(),)),
+        "get_paper_by_filename": lambda: (db.get_paper_by_filename, (paper_row("source_url"),)),
+        "get_paper_by_pdf": lambda: (db.get_paper_by_pdf, (paper_row("pdf_sha256"),)),
+        "get_paper_by_title": lambda: (db.get_paper_by_title, (paper_row("title"),)),
+        "get_concept": lambda: (db.get_concept, (concept_id(),)),
+        "get_concepts_for_paper": lambda: (db.get_concepts_for_paper, (paper_id(),)),
+        "get_notes_for_paper": lambda: (db.get_notes_for_paper, (paper_id(),)),
+        "get_author": lambda: (db.get_author, (author_id(),)),
+        "get_papers_by_author": lambda: (db.get_papers_by_author, (author_id(),)),
+        "get_coauthors": lambda: (db.get_coauthors, (author_id(),)),
+        "get_chat": lambda: (db.get_chat, (chat_id(),)),
+        "get_or_create_chat_for_paper": lambda: (db.get_or_create_chat_for_paper, (paper_id(),)),
+        "insert_paper": lambda: (db.insert_paper, (
+            _text(rng, 8), ["A. Author"], _text(rng, 150), _text(rng, 350), f"new_{rng.random()}.pdf", "",
+        )),
+        "update_paper_title": lambda: (db.update_paper_title, (paper_id(), _text(rng, 8))),
+        "update_paper_summary": lambda: (db.update_paper_summary, (paper_id(), _text(rng, 350))),
+        "update_paper_self_rating": lambda: (db.update_paper_self_rating, (paper_id(), rng.random())),
+        "upsert_concept": lambda: (db.upsert_concept, (_text(rng, 3), _text(rng, 20))),
+        "link_paper_concept": lambda: (db.link_paper_concept, (paper_id(), concept_id())),
+        "upsert_concept_link": lambda: (db.upsert_concept_link, (concept_id(), concept_id(), "uses", paper_id())),
+        "upsert_user_knowledge": lambda: (db.upsert_user_knowledge, (concept_id(), rng.random())),
+        "add_note": lambda: (db.add_note, (paper_id(), _text(rng, 25))),
+        "create_chat": lambda: (db.create_chat, (paper_id(),)),
+        "update_chat_messages": chat_messages,
+        "delete_paper": lambda: (db.delete_paper, (paper_id(),)),
+        "prune_duplicate_papers": seed_duplicates,
+    }
+
+
+def time_case(setup, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        fn, args = setup()
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {
+        "n": repeat,
+        "min_ms": samples[0] * 1000,
+        "median_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+# ── Reporting ──────────────────────────────────────────────────────────
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(db.__file__).parent, text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return a line per function whose median got slower than baseline * (1 + threshold)."""
+    regressions = []
+    for size, funcs in report["results"].items():
+        for name, stats in funcs.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if base is None:
+                continue
+            ratio = stats["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+            if ratio > 1 + threshold:
+                regressions.append(
+                    f"{size:>7} {name}: {base['median_ms']:.2f}ms -> {stats['median_ms']:.2f}ms ({ratio:.2f}x)"
+                )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated paper counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="comma-separated function names to time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "papermind-bench"))
+    parser.add_argument("-o", "--output", default="", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", default="", help="baseline JSON report to check against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative slowdown of the median before failing")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    only = {s for s in args.only.split(",") if s}
+    cache_dir = Path(args.cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+
+    for size in sizes:
+        template = cache_dir / f"corpus_{size}_{args.seed}.db"
+        if not template.exists():
+            print(f"generating {size} papers...", file=sys.stderr)
+            t0 = time.perf_counter()
+            generate_corpus(template, size, seed=args.seed)
+            print(f"  done in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+        # Work on a copy so write benchmarks never pollute the cached corpus
+        work = cache_dir / f"work_{size}.db"
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{work}{suffix}").unlink(missing_ok=True)
+        shutil.copy(template, work)
+        db.DB_PATH = str(work)
+        db.init_db()
+
+        rng = random.Random(args.seed)
+        results = {}
+        for name, setup in build_cases(work, rng).items():
+            if only and name not in only:
+                continue
+            results[name] = time_case(setup, args.repeat)
+            print(f"{size:>7} {name:<30} {results[name]['median_ms']:10.2f} ms", file=sys.stderr)
+        report["results"][str(size)] = results
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"regressions over {args.threshold:.0%}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("no regressions", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""End-to-end extraction latency, single-shot against map-reduce.
+
+    python -m bench.extraction thesis.pdf                 # real LLM calls on the configured route
+    python -m bench.extraction thesis.pdf --simulate      # offline, with a latency model
+    python -m bench.extraction --pages 120 --simulate     # synthetic blank document
+
+Runs extraction.extract on the same PDF once per mode and reports latency,
+sections, concept and link counts, and which mode auto-selection would pick.
+--simulate replaces the provider with a fake whose latency grows with the
+pages it is sent (--overhead + --per-page seconds), so the effect of the
+page split and CONCURRENCY can be seen without spending tokens.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+from pypdf import PdfReader, PdfWriter
+
+import db
+import extraction
+import llm
+
+
+def _blank_pdf(pages: int) -> bytes:
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(612, 792)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _simulate(overhead: float, per_page: float):
+    async def fake(**kwargs):
+        pages = 0
+        for part in kwargs["messages"][-1]["content"]:
+            if isinstance(part, dict) and part.get("type") == "file":
+                data = base64.b64decode(part["file"]["file_data"].split(",", 1)[1])
+                pages = len(PdfReader(io.BytesIO(data)).pages)
+        await asyncio.sleep(overhead + per_page * pages)
+        n = max(5, min(15, pages))
+        concepts = [{"name": f"concept {pages}-{i}", "description": "x"} for i in range(n)]
+        links = [{"from": concepts[i]["name"], "to": concepts[i + 1]["name"], "relationship": "r"} for i in range(n - 1)]
+        content = json.dumps({"title": "t", "authors": [], "abstract": "", "summary": "s", "section_summary": "s",
+                              "concepts": concepts, "concept_links": links})
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+    llm._acompletion = fake
+    # Keep the fake calls out of the real route log
+    db.DB_PATH = str(Path(tempfile.mkdtemp()) / "bench.db")
+    db.init_db()
+
+
+async def _run(pdf_bytes: bytes) -> dict:
+    pages, tokens = extraction.inspect(pdf_bytes)
+    report = {"pages": pages, "est_tokens": tokens, "auto_mode": extraction.choose_mode(pages, tokens),
+              "section_pages": extraction.SECTION_PAGES, "concurrency": extraction.CONCURRENCY}
+    for mode in ("single", "map-reduce"):
+        parsed = await extraction.extract(pdf_bytes, mode=mode)
+        report[mode] = {
+            "latency_s": parsed["_extraction"]["latency_s"],
+            "concepts": len(parsed.get("concepts", [])),
+            "concept_links": len(parsed.get("concept_links", [])),
+            "summary_words": len(parsed.get("summary", "").split()),
+        }
+    report["speedup"] = round(report["single"]["latency_s"] / report["map-reduce"]["latency_s"], 2)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", type=Path)
+    parser.add_argument("--pages", type=int, default=120, help="blank document size when no PDF is given")
+    parser.add_argument("--simulate", action="store_true")
+    parser.add_argument("--overhead", type=float, default=2.0)
+    parser.add_argument("--per-page", type=float, default=0.4)
+    args = parser.parse_args(argv)
+
+    if args.simulate:
+        _simulate(args.overhead, args.per_page)
+    elif args.pdf is None:
+        parser.error("a PDF is required without --simulate")
+    pdf_bytes = args.pdf.read_bytes() if args.pdf else _blank_pdf(args.pages)
+    print(json.dumps(asyncio.run(_run(pdf_bytes)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Page-render load test: one worker against N.
+
+    python -m bench.loadtest                          # 1 vs 4 workers, 1k-paper library
+    python -m bench.loadtest --workers 1,2,4 --papers 10000 --duration 20
+
+Starts the app as a subprocess for each worker count, then hammers a mix of
+pages from many simulated clients. Each client connects from its own
+127.0.0.x address, since the front proxy pins clients to workers by IP.
+Writer processes hammer db.py concurrently and count "database is locked"
+failures, which should stay at zero.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import config
+from bench.dbbench import generate_corpus
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(ports: list[int], timeout: float = 300) -> None:
+    deadline = time.monotonic() + timeout
+    pending = list(ports)
+    while pending and time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", pending[0], timeout=5)
+            conn.request("GET", "/upload")
+            if conn.getresponse().status == 200:
+                pending.pop(0)
+        except OSError:
+            time.sleep(0.5)
+    if pending:
+        raise RuntimeError(f"app on ports {pending} did not come up")
+
+
+def _client(idx: int, port: int, paths: list[str], stop: float, latencies: list, errors: list):
+    rng = random.Random(idx)
+    source = (f"127.0.{idx // 250}.{idx % 250 + 2}", 0)
+    conn = None
+    while time.monotonic() < stop:
+        path = rng.choice(paths)
+        t0 = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30, source_address=source)
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn = None
+            continue
+        latencies.append(time.perf_counter() - t0)
+
+
+def _writer(db_path: str, stop_at: float, result):
+    import db
+    db.DB_PATH = db_path
+    ok = locked = 0
+    rng = random.Random(os.getpid())
+    paper_ids = [r[0] for r in sqlite3.connect(db_path).execute("SELECT id FROM papers LIMIT 500")]
+    while time.time() < stop_at:
+        try:
+            pid = rng.choice(paper_ids)
+            db.add_note(pid, "load test note")
+            db.update_paper_self_rating(pid, rng.random())
+            ok += 1
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+    result.put((ok, locked))
+
+
+def run(workers: int, db_path: Path, clients: int, duration: float, writers: int) -> dict:
+    port = _free_port()
+    env = {**os.environ, "DB_PATH": str(db_path), "NICEGUI_HOST": "127.0.0.1",
+           "NICEGUI_PORT": str(port), "PAPERMIND_WORKERS": str(workers), "NICEGUI_RELOAD": "0"}
+    proc = subprocess.Popen([sys.executable, str(config.BASE_DIR / "main.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # The proxy is up before its workers; wait for each of them directly
+        _wait_ready([port] + ([port + 1 + i for i in range(workers)] if workers > 1 else []))
+        conn = sqlite3.connect(db_path)
+        paper_ids = [r[0] for r in conn.execute("SELECT id FROM papers ORDER BY id DESC LIMIT 50")]
+        chat_ids = [r[0] for r in conn.execute("SELECT id FROM chat_history ORDER BY id DESC LIMIT 50")]
+        conn.close()
+        paths = (["/upload", "/graph"] + [f"/paper/{p}" for p in paper_ids] + [f"/chat/{c}" for c in chat_ids])
+
+        # Warm every worker before measuring
+        for i in range(workers * 4):
+            _client(i, port, paths, time.monotonic() + 0.5, [], [])
+
+        stop = time.monotonic() + duration
+        latencies: list[float] = []
+        errors: list = []
+        queue = multiprocessing.Queue()
+        writer_procs = [multiprocessing.Process(target=_writer, args=(str(db_path), time.time() + duration, queue))
+                        for _ in range(writers)]
+        for w in writer_procs:
+            w.start()
+        threads = [threading.Thread(target=_client, args=(i, port, paths, stop, latencies, errors))
+                   for i in range(clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        write_results = [queue.get() for _ in writer_procs]
+        for w in writer_procs:
+            w.join()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    latencies.sort()
+    pct = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000 if latencies else 0.0
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "errors": len(errors),
+        "writes": sum(ok for ok, _ in write_results),
+        "write_lock_errors": sum(locked for _, locked in write_results),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker counts to compare")
+    parser.add_argument("--papers", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--writers", type=int, default=2, help="concurrent db writer processes")
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix="papermind-load-"))
+    try:
+        template = workdir / "corpus.db"
+        generate_corpus(template, args.papers)
+        results = []
+        for n in (int(w) for w in args.workers.split(",")):
+            db_path = workdir / f"run_{n}.db"
+            shutil.copy(template, db_path)
+            results.append(run(n, db_path, args.clients, args.duration, args.writers))
+            print(json.dumps(results[-1]), file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps({"papers": args.papers, "clients": args.clients, "duration": args.duration,
+                      "results": results}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Build time and query latency of the library search index.
+
+    python -m bench.retrieval                      # 10k-paper library, 200 queries
+    python -m bench.retrieval --papers 1000 --queries 500
+
+Builds the index for a synthetic library, appends one more paper the way an
+ingest does, then times retrieval.search for random multi-word questions.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import db
+import retrieval
+from bench.dbbench import WORDS, generate_corpus
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache-dir", default=str(Path(tempfile.gettempdir()) / "papermind-bench"))
+    args = parser.parse_args(argv)
+
+    cache_dir = Path(args.cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    corpus = cache_dir / f"corpus_{args.papers}_{args.seed}.db"
+    if not corpus.exists():
+        generate_corpus(corpus, args.papers, args.seed)
+    db.DB_PATH = str(corpus)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        retrieval.INDEX_DIR = Path(index_dir)
+        t0 = time.perf_counter()
+        passages = retrieval.update_index(full=True)
+        build_s = time.perf_counter() - t0
+
+        # Re-index the newest paper as if it had just been ingested
+        meta = json.loads((retrieval.INDEX_DIR / "meta.json").read_text())
+        meta["max_paper_id"] -= 1
+        (retrieval.INDEX_DIR / "meta.json").write_text(json.dumps(meta))
+        t0 = time.perf_counter()
+        retrieval.update_index()
+        append_ms = (time.perf_counter() - t0) * 1000
+
+        rng = random.Random(args.seed)
+        retrieval.search("warm up")
+        samples = []
+        for _ in range(args.queries):
+            query = " ".join(rng.choices(WORDS, k=rng.randint(3, 12)))
+            t0 = time.perf_counter()
+            retrieval.search(query)
+            samples.append((time.perf_counter() - t0) * 1000)
+        index_bytes = sum(f.stat().st_size for f in retrieval.INDEX_DIR.rglob("*") if f.is_file())
+
+    samples.sort()
+    print(json.dumps({
+        "papers": args.papers,
+        "passages": passages,
+        "index_mb": index_bytes / 1e6,
+        "build_s": build_s,
+        "append_one_paper_ms": append_ms,
+        "query_p50_ms": statistics.median(samples),
+        "query_p95_ms": samples[int(len(samples) * 0.95) - 1],
+        "query_max_ms": samples[-1],
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Cold-start import cost of the app, from ``python -X importtime``.
+
+    python -m bench.startup                      # 5 runs, 1500 ms budget
+    python -m bench.startup --budget-ms 800 --top 20
+
+Imports `main` in fresh interpreters, reports the median cumulative import
+time and the slowest modules, and exits non-zero if the median exceeds the
+budget or a module that should load lazily (litellm) shows up at startup.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+
+import config
+
+LAZY_MODULES = ("litellm",)
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def measure() -> dict[str, int]:
+    """Cumulative import time in µs per top-level module path for one cold `import main`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=config.BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            cumulative[m.group(4)] = int(m.group(2))
+    return cumulative
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    runs = [measure() for _ in range(args.runs)]
+    totals = [r.get("main", 0) / 1000 for r in runs]
+    median_ms = statistics.median(totals)
+    modules = {name for r in runs for name in r}
+    slowest = sorted(
+        ((name, statistics.median(r.get(name, 0) for r in runs) / 1000) for name in modules if name != "main"),
+        key=lambda item: -item[1],
+    )[:args.top]
+    eager = sorted(name for name in modules if name.split(".")[0] in LAZY_MODULES)
+
+    report = {
+        "median_ms": median_ms,
+        "runs_ms": totals,
+        "budget_ms": args.budget_ms,
+        "slowest": [{"module": name, "cumulative_ms": ms} for name, ms in slowest],
+        "eager_lazy_modules": eager,
+    }
+    print(json.dumps(report, indent=2))
+
+    failed = False
+    if median_ms > args.budget_ms:
+        print(f"startup {median_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms", file=sys.stderr)
+        failed = True
+    if eager:
+        print(f"imported at startup but should be lazy: {', '.join(eager[:5])}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Bytes on the wire and server CPU for one streamed chat reply.
+
+    python -m bench.streambench                     # 2k tokens at 100 tok/s
+    python -m bench.streambench --tokens 4000 --rate 200
+
+Compares the old per-token full re-render (every chunk re-sends the whole
+message as the html element's content prop) against coalesced deltas from
+pages.chat.coalesce. Payload sizes are the JSON NiceGUI would put on the
+websocket for each update. cpu_ms is time spent building updates; cpu_total_ms
+also includes the event loop and fake stream, which are the same in both modes.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from pages.chat import STREAM_FLUSH_INTERVAL, coalesce
+
+ELEMENT_ID = 42
+
+
+async def fake_stream(n_tokens: int, rate: float, seed: int = 0):
+    rng = random.Random(seed)
+    words = "the model attends to every token in the context window and learns".split()
+    for i in range(n_tokens):
+        await asyncio.sleep(1 / rate)
+        yield ("\n\n" if i and i % 150 == 0 else " ") + rng.choice(words)
+
+
+async def naive(n_tokens: int, rate: float) -> dict:
+    sent = updates = 0
+    full = ""
+    cpu = 0.0
+    t0 = time.process_time()
+    async for chunk in fake_stream(n_tokens, rate):
+        t1 = time.process_time()
+        full += chunk
+        payload = json.dumps({"id": ELEMENT_ID, "props": {"content": full.replace("\n", "<br>")}})
+        sent += len(payload)
+        updates += 1
+        cpu += time.process_time() - t1
+    total = time.process_time() - t0
+    return {"updates": updates, "bytes": sent, "cpu_ms": cpu * 1000, "cpu_total_ms": total * 1000}
+
+
+async def coalesced(n_tokens: int, rate: float, interval: float) -> dict:
+    sent = updates = 0
+    full = ""
+    cpu = 0.0
+    t0 = time.process_time()
+    async for delta in coalesce(fake_stream(n_tokens, rate), interval):
+        t1 = time.process_time()
+        action = "textContent = " if not full else "append("
+        sent += len(f"getHtmlElement({ELEMENT_ID}).{action}{json.dumps(delta)})")
+        full += delta
+        updates += 1
+        cpu += time.process_time() - t1
+    # Final formatted content, sent once
+    t1 = time.process_time()
+    sent += len(json.dumps({"id": ELEMENT_ID, "props": {"content": full.replace("\n", "<br>")}}))
+    updates += 1
+    cpu += time.process_time() - t1
+    total = time.process_time() - t0
+    return {"updates": updates, "bytes": sent, "cpu_ms": cpu * 1000, "cpu_total_ms": total * 1000}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=100.0, help="tokens per second from the fake LLM")
+    parser.add_argument("--interval", type=float, default=STREAM_FLUSH_INTERVAL)
+    args = parser.parse_args(argv)
+
+    report = {
+        "tokens": args.tokens,
+        "rate": args.rate,
+        "interval": args.interval,
+        "naive": asyncio.run(naive(args.tokens, args.rate)),
+        "coalesced": asyncio.run(coalesced(args.tokens, args.rate, args.interval)),
+    }
+    report["bytes_ratio"] = report["naive"]["bytes"] / report["coalesced"]["bytes"]
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
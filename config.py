@@ -7,9 +7,53 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent
 
 LITELLM_MODEL = os.getenv("LITELLM_MODEL", "openai/gpt-4o-mini")
+
+
+def _route(task: str) -> list[str]:
+    value = os.getenv(f"PAPERMIND_ROUTE_{task.upper().replace('-', '_')}", "")
+    return [m.strip() for m in value.split(",") if m.strip()] or [LITELLM_MODEL]
+
+
+# Models tried in order per task, e.g. PAPERMIND_ROUTE_ASSESS=openai/gpt-4o-mini,anthropic/claude-3-5-haiku-latest.
+# A model is skipped while its observed p95 latency (seconds; time to first token for
+# chat) is over the task's limit, and the next one is tried when a call fails.
+ROUTE_TASKS = ("parse", "summary", "chat-teach", "chat-zealot", "assess", "reextract")
+MODEL_ROUTES = {task: _route(task) for task in ROUTE_TASKS}
+# Bulk re-extraction (reextract.py) follows the parse route unless given its own
+if not os.getenv("PAPERMIND_ROUTE_REEXTRACT"):
+    MODEL_ROUTES["reextract"] = MODEL_ROUTES["parse"]
+ROUTE_P95_LIMITS = {
+    task: float(os.getenv(f"PAPERMIND_P95_{task.upper().replace('-', '_')}", default))
+    for task, default in (("parse", 180), ("summary", 180), ("chat-teach", 10), ("chat-zealot", 10), ("assess", 60),
+                          ("reextract", 180))
+}
+# Checked before every LLM call (preflight.py). A request over the per-call limits
+# is trimmed to fit; 0 turns a limit off. MAX_PROMPT_TOKENS=0 leaves only the
+# model's context window. Nothing is sent once the day's (UTC) spend reaches DAILY_BUDGET_USD.
+CALL_BUDGET_USD = float(os.getenv("PAPERMIND_CALL_BUDGET_USD", "1.0"))
+MAX_PROMPT_TOKENS = int(os.getenv("PAPERMIND_MAX_PROMPT_TOKENS", "0"))
+DAILY_BUDGET_USD = float(os.getenv("PAPERMIND_DAILY_BUDGET_USD", "0"))
 DB_PATH = os.getenv("DB_PATH", str(BASE_DIR / "paper_mind.db"))
 UPLOAD_DIR = BASE_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
+# Derived search index for library-wide chat; safe to delete, it is rebuilt
+INDEX_DIR = Path(os.getenv("INDEX_DIR", str(Path(DB_PATH).parent / "index")))
 
 NICEGUI_HOST = os.getenv("NICEGUI_HOST", "0.0.0.0")
 NICEGUI_PORT = int(os.getenv("NICEGUI_PORT", "8080"))
+# Dev server file watching; off for production
+NICEGUI_RELOAD = os.getenv("NICEGUI_RELOAD", "0") == "1"
+# Worker processes behind NICEGUI_PORT; each also listens on NICEGUI_PORT + n
+WORKERS = int(os.getenv("PAPERMIND_WORKERS", "1"))
+# Import the LLM stack in the background after startup instead of on first use
+PRELOAD_LLM = os.getenv("PAPERMIND_PRELOAD_LLM", "0") == "1"
+# Speculative chat openers generated from the paper page: at most this many per
+# hour per process (0 turns them off), and a Teach overview besides the Zealot question
+PREWARM_PER_HOUR = int(os.getenv("PAPERMIND_PREWARM_PER_HOUR", "20"))
+PREWARM_TEACH = os.getenv("PAPERMIND_PREWARM_TEACH", "0") == "1"
+# A page render or event handler is logged as slow above this many db calls, or
+# this many milliseconds not spent waiting on the LLM
+SLOW_PAGE_QUERIES = int(os.getenv("PAPERMIND_SLOW_PAGE_QUERIES", "25"))
+SLOW_PAGE_MS = float(os.getenv("PAPERMIND_SLOW_PAGE_MS", "500"))
+# Chats with no new message for this many days are compressed by storage maintenance (0 = never)
+CHAT_ARCHIVE_DAYS = float(os.getenv("PAPERMIND_CHAT_ARCHIVE_DAYS", "30"))
@@ -1,7 +1,31 @@
 import json
+import os
+import re
+import socket
 import sqlite3
-from datetime import datetime, timezone
+import time
+import unicodedata
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
 from config import DB_PATH
+import scheduler
+
+# Seconds a connection waits on another process's write lock before failing
+BUSY_TIMEOUT = 30
+LOCK_RETRIES = 5
+# Prefix for lease tokens, so a stuck lease can be traced to its process
+_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+# Set on every connection. synchronous=NORMAL is safe under WAL (a power cut can
+# only lose the last commits, never corrupt), and skips an fsync per commit.
+# Memory-mapped reads share the OS page cache across connections and workers;
+# the page cache proper is per connection, and connections are short-lived.
+PRAGMAS = {
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -8192,
+    "temp_store": "MEMORY",
+}
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS papers (
@@ -34,12 +58,145 @@ CREATE TABLE IF NOT EXISTS concept_links (
     PRIMARY KEY (concept_a, concept_b)
 );
 
+CREATE INDEX IF NOT EXISTS idx_concept_links_b ON concept_links(concept_b);
+
+-- Which papers a link was extracted from, and what each said; a link's weight
+-- is its number of papers, kept by triggers (see init_db)
+CREATE TABLE IF NOT EXISTS concept_link_papers (
+    concept_a INTEGER NOT NULL,
+    concept_b INTEGER NOT NULL,
+    paper_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+    relationship TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (concept_a, concept_b, paper_id),
+    FOREIGN KEY (concept_a, concept_b) REFERENCES concept_links(concept_a, concept_b) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_concept_link_papers_paper ON concept_link_papers(paper_id);
+
+-- Centrality and community of each concept, recomputed by graph_metrics.py
+CREATE TABLE IF NOT EXISTS concept_metrics (
+    concept_id INTEGER PRIMARY KEY REFERENCES concepts(id) ON DELETE CASCADE,
+    degree INTEGER NOT NULL,
+    strength REAL NOT NULL,
+    pagerank REAL NOT NULL,
+    importance REAL NOT NULL,
+    community INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_concept_metrics_importance ON concept_metrics(importance);
+CREATE INDEX IF NOT EXISTS idx_concept_metrics_community ON concept_metrics(community, importance);
+
+CREATE TABLE IF NOT EXISTS graph_metrics_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    version INTEGER NOT NULL,
+    computed_at TEXT NOT NULL,
+    nodes INTEGER NOT NULL,
+    links INTEGER NOT NULL,
+    duration_ms REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_paper_concepts_concept ON paper_concepts(concept_id);
+
 CREATE TABLE IF NOT EXISTS user_knowledge (
     concept_id INTEGER PRIMARY KEY REFERENCES concepts(id) ON DELETE CASCADE,
     confidence REAL NOT NULL DEFAULT 0.0,
-    last_tested TEXT
+    last_tested TEXT,
+    -- Review schedule, see scheduler.py
+    stability REAL,
+    difficulty REAL,
+    reviews INTEGER NOT NULL DEFAULT 0,
+    due_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_knowledge_confidence ON user_knowledge(confidence);
+
+-- Every assessment, append-only; previous is NULL the first time a concept is tested
+CREATE TABLE IF NOT EXISTS knowledge_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    concept_id INTEGER NOT NULL REFERENCES concepts(id) ON DELETE CASCADE,
+    confidence REAL NOT NULL,
+    previous REAL,
+    created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_events_concept ON knowledge_events(concept_id, created_at);
+
+-- Rollups per UTC day and per week (keyed by its Monday). known_total and
+-- known_count describe user_knowledge as it stood at the end of the period.
+CREATE TABLE IF NOT EXISTS knowledge_daily (
+    day TEXT PRIMARY KEY,
+    assessments INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    gain_sum REAL NOT NULL,
+    known_total REAL NOT NULL,
+    known_count INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS knowledge_weekly (
+    week TEXT PRIMARY KEY,
+    assessments INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    gain_sum REAL NOT NULL,
+    known_total REAL NOT NULL,
+    known_count INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS roll_up_knowledge_event AFTER INSERT ON knowledge_events BEGIN
+    INSERT INTO knowledge_daily (day, assessments, confidence_sum, gain_sum, known_total, known_count)
+    SELECT date(NEW.created_at), 1, NEW.confidence, NEW.confidence - COALESCE(NEW.previous, 0),
+           COALESCE((SELECT known_total FROM knowledge_daily ORDER BY day DESC LIMIT 1), 0)
+               + NEW.confidence - COALESCE(NEW.previous, 0),
+           COALESCE((SELECT known_count FROM knowledge_daily ORDER BY day DESC LIMIT 1), 0)
+               + (NEW.previous IS NULL)
+    WHERE true
+    ON CONFLICT(day) DO UPDATE SET
+        assessments = assessments + 1,
+        confidence_sum = confidence_sum + excluded.confidence_sum,
+        gain_sum = gain_sum + excluded.gain_sum,
+        known_total = excluded.known_total,
+        known_count = excluded.known_count;
+    INSERT INTO knowledge_weekly (week, assessments, confidence_sum, gain_sum, known_total, known_count)
+    SELECT date(NEW.created_at, '-6 days', 'weekday 1'), 1, NEW.confidence, NEW.confidence - COALESCE(NEW.previous, 0),
+           COALESCE((SELECT known_total FROM knowledge_weekly ORDER BY week DESC LIMIT 1), 0)
+               + NEW.confidence - COALESCE(NEW.previous, 0),
+           COALESCE((SELECT known_count FROM knowledge_weekly ORDER BY week DESC LIMIT 1), 0)
+               + (NEW.previous IS NULL)
+    WHERE true
+    ON CONFLICT(week) DO UPDATE SET
+        assessments = assessments + 1,
+        confidence_sum = confidence_sum + excluded.confidence_sum,
+        gain_sum = gain_sum + excluded.gain_sum,
+        known_total = excluded.known_total,
+        known_count = excluded.known_count;
+END;
+
+-- Concepts removed with their last paper drop out of today's totals
+CREATE TRIGGER IF NOT EXISTS roll_up_knowledge_removal AFTER DELETE ON user_knowledge BEGIN
+    INSERT INTO knowledge_daily (day, assessments, confidence_sum, gain_sum, known_total, known_count)
+    SELECT date('now'), 0, 0, 0, known_total - OLD.confidence, known_count - 1
+    FROM knowledge_daily WHERE true ORDER BY day DESC LIMIT 1
+    ON CONFLICT(day) DO UPDATE SET known_total = excluded.known_total, known_count = excluded.known_count;
+    INSERT INTO knowledge_weekly (week, assessments, confidence_sum, gain_sum, known_total, known_count)
+    SELECT date('now', '-6 days', 'weekday 1'), 0, 0, 0, known_total - OLD.confidence, known_count - 1
+    FROM knowledge_weekly WHERE true ORDER BY week DESC LIMIT 1
+    ON CONFLICT(week) DO UPDATE SET known_total = excluded.known_total, known_count = excluded.known_count;
+END;
+
+CREATE TABLE IF NOT EXISTS authors (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    -- Matching key: case-folded, accents and punctuation stripped
+    normalized TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS paper_authors (
+    paper_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+    author_id INTEGER NOT NULL REFERENCES authors(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (paper_id, position)
 );
 
+CREATE INDEX IF NOT EXISTS idx_paper_authors_author ON paper_authors(author_id, paper_id);
+
 CREATE TABLE IF NOT EXISTS user_notes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     paper_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
@@ -54,68 +211,473 @@ CREATE TABLE IF NOT EXISTS chat_history (
     messages_json TEXT NOT NULL DEFAULT '[]',
     created_at TEXT NOT NULL
 );
+
+-- Cover the chat lists, so listing chats never reads the transcripts
+CREATE INDEX IF NOT EXISTS idx_chat_history_created ON chat_history(created_at, paper_id, agent_type);
+CREATE INDEX IF NOT EXISTS idx_chat_history_paper ON chat_history(paper_id, created_at, agent_type);
+
+-- Transcripts of chats idle for CHAT_ARCHIVE_DAYS, compressed. The chat_history
+-- row keeps its metadata and an empty messages_json.
+CREATE TABLE IF NOT EXISTS chat_archive (
+    chat_id INTEGER PRIMARY KEY REFERENCES chat_history(id) ON DELETE CASCADE,
+    codec TEXT NOT NULL,
+    messages BLOB NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    archived_at TEXT NOT NULL
+);
+
+-- Bulk re-extraction runs (reextract.py) and each paper's progress in them,
+-- so an interrupted run resumes where it stopped
+CREATE TABLE IF NOT EXISTS reextract_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    models TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS reextract_items (
+    run_id INTEGER NOT NULL REFERENCES reextract_runs(id) ON DELETE CASCADE,
+    paper_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'done', 'failed')),
+    pages INTEGER,
+    est_tokens INTEGER,
+    result TEXT NOT NULL DEFAULT '',
+    duration_s REAL,
+    updated_at TEXT,
+    PRIMARY KEY (run_id, paper_id)
+);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS concept_positions (
+    concept_id INTEGER PRIMARY KEY REFERENCES concepts(id) ON DELETE CASCADE,
+    x REAL NOT NULL,
+    y REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS paper_similarity (
+    paper_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+    related_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+    score REAL NOT NULL,
+    PRIMARY KEY (paper_id, related_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_paper_similarity_related ON paper_similarity(related_id);
+
+-- Length of each paper's IDF-weighted concept vector when it was last scored
+CREATE TABLE IF NOT EXISTS paper_norms (
+    paper_id INTEGER PRIMARY KEY REFERENCES papers(id) ON DELETE CASCADE,
+    norm REAL NOT NULL
+);
+
+-- Each full rebuild of paper_similarity; papers added incrementally since the
+-- last one are those with concepts and an id above last_paper_id
+CREATE TABLE IF NOT EXISTS related_builds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    built_at TEXT NOT NULL,
+    papers INTEGER NOT NULL,
+    last_paper_id INTEGER NOT NULL
+);
+
+-- Database file size and free space, sampled by each maintenance run
+CREATE TABLE IF NOT EXISTS storage_stats (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at TEXT NOT NULL,
+    file_bytes INTEGER NOT NULL,
+    wal_bytes INTEGER NOT NULL,
+    page_size INTEGER NOT NULL,
+    page_count INTEGER NOT NULL,
+    freelist_count INTEGER NOT NULL,
+    actions TEXT NOT NULL DEFAULT ''
+);
+
+-- One row per routing decision: a model used, failed, or skipped for being slow
+CREATE TABLE IF NOT EXISTS llm_route_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    decision TEXT NOT NULL CHECK(decision IN ('used', 'failed', 'skipped')),
+    reason TEXT NOT NULL DEFAULT '',
+    latency_ms REAL,
+    duration_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cost_usd REAL,
+    created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_route_log_model ON llm_route_log(task, model, id);
+-- Covers the day's spend, which preflight.py checks before every call
+CREATE INDEX IF NOT EXISTS idx_llm_route_log_created ON llm_route_log(created_at, cost_usd);
+
+-- The graph version at which each concept ('node', id) and link ('link', "a-b")
+-- last changed, kept current by triggers; deleted ones stay to report removals
+CREATE TABLE IF NOT EXISTS graph_changes (
+    kind TEXT NOT NULL CHECK(kind IN ('node', 'link')),
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (kind, key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_graph_changes_version ON graph_changes(version);
+
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tbl TEXT NOT NULL,
+    pk TEXT NOT NULL
+);
 """
 
+# What a change to each table means for the graph payload: (kind, key of the
+# changed row, columns whose change matters on update)
+GRAPH_TRIGGERS = {
+    "concepts": ("node", "{row}.id", ("name", "description")),
+    "user_knowledge": ("node", "{row}.concept_id", ("confidence",)),
+    "concept_positions": ("node", "{row}.concept_id", ("x", "y")),
+    "concept_links": ("link", "{row}.concept_a || '-' || {row}.concept_b", ("relationship", "weight")),
+    "concept_metrics": ("node", "{row}.concept_id", ("importance", "community")),
+}
+
+# Tables covered by incremental backups, with their key columns. Leases, layout
+# positions and paper similarities are rebuilt by the app and not worth backing up.
+BACKUP_KEYS = {
+    "papers": ("id",),
+    "concepts": ("id",),
+    "paper_concepts": ("paper_id", "concept_id"),
+    "concept_links": ("concept_a", "concept_b"),
+    "concept_link_papers": ("concept_a", "concept_b", "paper_id"),
+    "user_knowledge": ("concept_id",),
+    "knowledge_events": ("id",),
+    "knowledge_daily": ("day",),
+    "knowledge_weekly": ("week",),
+    "user_notes": ("id",),
+    "chat_history": ("id",),
+    "chat_archive": ("chat_id",),
+    "authors": ("id",),
+    "paper_authors": ("paper_id", "position"),
+}
+
+
+class _Connection(sqlite3.Connection):
+    """Retries a statement that could not take the write lock.
+
+    Connections use BEGIN IMMEDIATE, so the write lock is only ever taken by
+    the first write of a transaction. If that times out nothing has happened
+    yet and the statement can simply be re-run.
+    """
+
+    def execute(self, sql, parameters=(), /):
+        return self._retry(super().execute, sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        return self._retry(super().executemany, sql, parameters)
+
+    def _retry(self, method, sql, parameters):
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return method(sql, parameters)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or self.in_transaction or attempt == LOCK_RETRIES - 1:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+
 
 def _conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+    # IMMEDIATE takes the write lock up front, so concurrent writers queue on
+    # busy_timeout instead of failing with "database is locked" on upgrade.
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT, isolation_level="IMMEDIATE", factory=_Connection)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
     return conn
 
 
 def init_db():
     with _conn() as conn:
+        # A new database starts with incremental vacuum; migrate_auto_vacuum converts old ones
+        if not conn.execute("SELECT EXISTS (SELECT 1 FROM sqlite_master)").fetchone()[0]:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
         conn.executescript(SCHEMA)
         # Migrations
         cols = {r[1] for r in conn.execute("PRAGMA table_info(papers)").fetchall()}
         if "self_rating" not in cols:
             conn.execute("ALTER TABLE papers ADD COLUMN self_rating REAL")
+        if "pdf_sha256" not in cols:
+            conn.execute("ALTER TABLE papers ADD COLUMN pdf_sha256 TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_papers_pdf_sha256 ON papers(pdf_sha256)")
+        if "authors_display" not in cols:
+            conn.execute("ALTER TABLE papers ADD COLUMN authors_display TEXT NOT NULL DEFAULT ''")
+            # Papers from before the authors table, or restored from an old backup
+            for r in conn.execute("SELECT id, authors FROM papers WHERE authors != '[]' ORDER BY id").fetchall():
+                _link_authors(conn, r["id"], json.loads(r["authors"]))
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(chat_history)").fetchall()}
+        if "updated_at" not in cols:
+            conn.execute("ALTER TABLE chat_history ADD COLUMN updated_at TEXT")
+        if "message_count" not in cols:
+            conn.execute("ALTER TABLE chat_history ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_updated ON chat_history(updated_at)")
+        # Chats from before these columns, or restored from an old backup
+        conn.execute(
+            "UPDATE chat_history SET updated_at = created_at, message_count = json_array_length(messages_json) "
+            "WHERE updated_at IS NULL"
+        )
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(concept_links)").fetchall()}
+        if "weight" not in cols:
+            conn.execute("ALTER TABLE concept_links ADD COLUMN weight INTEGER NOT NULL DEFAULT 1")
+            # Recreated below with weight among the columns that change the graph
+            conn.execute("DROP TRIGGER IF EXISTS graph_concept_links_update")
+        # Links from before provenance was kept: credit every paper that has both
+        # concepts, then count in one pass rather than by trigger. Links no paper
+        # has both ends of keep weight 1 and no provenance.
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM concept_link_papers)").fetchone()[0]:
+            conn.execute("DROP TRIGGER IF EXISTS link_weight_insert")
+            # CROSS JOIN fixes the order: walking links first visits every paper of a popular concept per link
+            conn.execute(
+                "INSERT INTO concept_link_papers (concept_a, concept_b, paper_id, relationship) "
+                "SELECT cl.concept_a, cl.concept_b, pb.paper_id, cl.relationship FROM paper_concepts pb "
+                "CROSS JOIN concept_links cl ON cl.concept_b = pb.concept_id "
+                "CROSS JOIN paper_concepts pa ON pa.paper_id = pb.paper_id AND pa.concept_id = cl.concept_a"
+            )
+            conn.execute(
+                "UPDATE concept_links SET weight = (SELECT COUNT(*) FROM concept_link_papers clp "
+                "WHERE clp.concept_a = concept_links.concept_a AND clp.concept_b = concept_links.concept_b) "
+                "WHERE EXISTS (SELECT 1 FROM concept_link_papers clp "
+                "WHERE clp.concept_a = concept_links.concept_a AND clp.concept_b = concept_links.concept_b)"
+            )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS link_weight_insert AFTER INSERT ON concept_link_papers BEGIN "
+            "UPDATE concept_links SET weight = (SELECT COUNT(*) FROM concept_link_papers "
+            "WHERE concept_a = NEW.concept_a AND concept_b = NEW.concept_b) "
+            "WHERE concept_a = NEW.concept_a AND concept_b = NEW.concept_b; END"
+        )
+        # A link goes when the last paper that stated it does
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS link_weight_delete AFTER DELETE ON concept_link_papers BEGIN "
+            "UPDATE concept_links SET weight = (SELECT COUNT(*) FROM concept_link_papers "
+            "WHERE concept_a = OLD.concept_a AND concept_b = OLD.concept_b) "
+            "WHERE concept_a = OLD.concept_a AND concept_b = OLD.concept_b; "
+            "DELETE FROM concept_links WHERE concept_a = OLD.concept_a AND concept_b = OLD.concept_b "
+            "AND weight = 0; END"
+        )
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(llm_route_log)").fetchall()}
+        if "est_prompt_tokens" not in cols:
+            conn.execute("ALTER TABLE llm_route_log ADD COLUMN est_prompt_tokens INTEGER")
+            conn.execute("ALTER TABLE llm_route_log ADD COLUMN est_completion_tokens INTEGER")
+            conn.execute("ALTER TABLE llm_route_log ADD COLUMN est_cost_usd REAL")
+            conn.execute("ALTER TABLE llm_route_log ADD COLUMN trimmed TEXT NOT NULL DEFAULT ''")
+        # Seed the history with the current scores of libraries from before it was kept
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM knowledge_events)").fetchone()[0]:
+            conn.execute(
+                "INSERT INTO knowledge_events (concept_id, confidence, previous, created_at) "
+                "SELECT concept_id, confidence, NULL, COALESCE(last_tested, ?) FROM user_knowledge "
+                "ORDER BY last_tested",
+                (datetime.now(timezone.utc).isoformat(),),
+            )
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(user_knowledge)").fetchall()}
+        if "due_at" not in cols:
+            conn.execute("ALTER TABLE user_knowledge ADD COLUMN stability REAL")
+            conn.execute("ALTER TABLE user_knowledge ADD COLUMN difficulty REAL")
+            conn.execute("ALTER TABLE user_knowledge ADD COLUMN reviews INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE user_knowledge ADD COLUMN due_at TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_user_knowledge_due ON user_knowledge(due_at)")
+        # Knowledge from before the schedule, or restored from an old backup: replay its assessments
+        _schedule_unscheduled(conn)
+        # Change logging is switched on by the first backup; tables added since get their triggers here
+        if _change_log_enabled(conn):
+            _create_change_log_triggers(conn)
+        for table, (kind, key, columns) in GRAPH_TRIGGERS.items():
+            for event, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")):
+                when = (" WHEN " + " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+                        if event == "update" else "")
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS graph_{table}_{event} AFTER {event.upper()} ON {table}{when} "
+                    f"BEGIN INSERT INTO graph_changes (kind, key, version) VALUES ('{kind}', "
+                    f"{key.format(row=row)}, (SELECT COALESCE(MAX(version), 0) + 1 FROM graph_changes)) "
+                    f"ON CONFLICT(kind, key) DO UPDATE SET version = excluded.version; END"
+                )
+        # Graphs from before graph_changes start out at version 1
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM graph_changes)").fetchone()[0]:
+            conn.execute("INSERT INTO graph_changes (kind, key, version) SELECT 'node', id, 1 FROM concepts")
+            conn.execute("INSERT INTO graph_changes (kind, key, version) "
+                         "SELECT 'link', concept_a || '-' || concept_b, 1 FROM concept_links")
+
+
+# ── Authors ─────────────────────────────────────────────────────────────
+
+_AUTHOR_NOISE = re.compile(r"[\d*†‡§¶]+$")
+_AUTHOR_KEY_DROP = re.compile(r"[^\w\s-]")
+_NAME_SUFFIXES = {"jr", "jr.", "sr", "sr.", "ii", "iii", "iv"}
+DISPLAY_AUTHORS = 3
+
+
+def normalize_author(name: str) -> tuple[str, str]:
+    """(display name, matching key) for an author as extracted from a PDF.
+
+    Drops footnote markers ("Jane Doe1*"), turns "Doe, Jane" into "Jane Doe",
+    and fixes ALL-CAPS or all-lowercase names. The key also ignores case,
+    accents and punctuation, so "J. Müller" and "j muller" are one author.
+    """
+    name = " ".join(unicodedata.normalize("NFKC", name).split())
+    name = _AUTHOR_NOISE.sub("", name).strip(" ,;")
+    if name.count(",") == 1:
+        last, first = (part.strip() for part in name.split(","))
+        if first and last and first.lower() not in _NAME_SUFFIXES:
+            name = f"{first} {last}"
+    if name.isupper() or name.islower():
+        name = name.title()
+    key = "".join(c for c in unicodedata.normalize("NFKD", name.casefold()) if not unicodedata.combining(c))
+    key = " ".join(_AUTHOR_KEY_DROP.sub(" ", key).split())
+    return name, key
+
+
+def authors_display(names: list[str]) -> str:
+    shown = ", ".join(names[:DISPLAY_AUTHORS])
+    return shown + " et al." if len(names) > DISPLAY_AUTHORS else shown
+
+
+def _link_authors(conn: sqlite3.Connection, paper_id: int, names: list[str]):
+    conn.execute("DELETE FROM paper_authors WHERE paper_id = ?", (paper_id,))
+    display, seen = [], set()
+    for raw in names:
+        name, key = normalize_author(raw)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        conn.execute("INSERT OR IGNORE INTO authors (name, normalized) VALUES (?, ?)", (name, key))
+        # The byline uses the spelling the author was first seen with, as author pages do
+        author = conn.execute("SELECT id, name FROM authors WHERE normalized = ?", (key,)).fetchone()
+        conn.execute("INSERT INTO paper_authors (paper_id, author_id, position) VALUES (?, ?, ?)",
+                     (paper_id, author["id"], len(display)))
+        display.append(author["name"])
+    conn.execute("UPDATE papers SET authors_display = ? WHERE id = ?", (authors_display(display), paper_id))
+
+
+def _with_authors(conn: sqlite3.Connection, row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    d = dict(row)
+    byline = conn.execute(
+        "SELECT a.id, a.name FROM paper_authors pa JOIN authors a ON a.id = pa.author_id "
+        "WHERE pa.paper_id = ? ORDER BY pa.position",
+        (d["id"],),
+    ).fetchall()
+    d["authors"] = [r["name"] for r in byline]
+    d["author_ids"] = [r["id"] for r in byline]
+    return d
+
+
+def get_author(author_id: int) -> dict | None:
+    with _conn() as conn:
+        row = conn.execute(
+            "SELECT a.id, a.name, COUNT(pa.paper_id) AS paper_count FROM authors a "
+            "LEFT JOIN paper_authors pa ON pa.author_id = a.id WHERE a.id = ? GROUP BY a.id",
+            (author_id,),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def get_papers_by_author(author_id: int) -> list[dict]:
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT p.id, p.title, p.authors_display, p.self_rating, p.added_at FROM paper_authors pa "
+            "JOIN papers p ON p.id = pa.paper_id WHERE pa.author_id = ? ORDER BY p.added_at DESC",
+            (author_id,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_coauthors(author_id: int, limit: int = 20) -> list[dict]:
+    """Authors sharing papers with `author_id`, most shared papers first."""
+    with _conn() as conn:
+        rows = conn.execute("""
+            SELECT a.id, a.name, COUNT(*) AS shared
+            FROM paper_authors mine
+            JOIN paper_authors theirs ON theirs.paper_id = mine.paper_id AND theirs.author_id != mine.author_id
+            JOIN authors a ON a.id = theirs.author_id
+            WHERE mine.author_id = ?
+            GROUP BY a.id ORDER BY shared DESC, a.name LIMIT ?
+        """, (author_id, limit)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def _delete_orphan_authors(conn: sqlite3.Connection):
+    conn.execute("DELETE FROM authors WHERE id NOT IN (SELECT DISTINCT author_id FROM paper_authors)")
 
 
 # ── Papers ──────────────────────────────────────────────────────────────
 
 def insert_paper(title: str, authors: list[str], abstract: str, summary: str,
-                 source_url: str, raw_text: str) -> int:
+                 source_url: str, raw_text: str, pdf_sha256: str | None = None) -> int:
     now = datetime.now(timezone.utc).isoformat()
     with _conn() as conn:
         cur = conn.execute(
-            "INSERT INTO papers (title, authors, abstract, summary, source_url, raw_text, added_at) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (title, json.dumps(authors), abstract, summary, source_url, raw_text, now),
+            "INSERT INTO papers (title, authors, abstract, summary, source_url, raw_text, added_at, pdf_sha256) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (title, json.dumps(authors), abstract, summary, source_url, raw_text, now, pdf_sha256),
         )
+        _link_authors(conn, cur.lastrowid, authors)
         return cur.lastrowid
 
 
 def get_paper(paper_id: int) -> dict | None:
     with _conn() as conn:
-        row = conn.execute("SELECT * FROM papers WHERE id = ?", (paper_id,)).fetchone()
-    if row is None:
-        return None
-    d = dict(row)
-    d["authors"] = json.loads(d["authors"])
-    return d
+        return _with_authors(conn, conn.execute("SELECT * FROM papers WHERE id = ?", (paper_id,)).fetchone())
+
+
+def get_latest_paper_id() -> int | None:
+    with _conn() as conn:
+        row = conn.execute("SELECT id FROM papers ORDER BY id DESC LIMIT 1").fetchone()
+    return row["id"] if row else None
 
 
 def get_paper_by_filename(filename: str) -> dict | None:
     with _conn() as conn:
-        row = conn.execute("SELECT * FROM papers WHERE source_url = ?", (filename,)).fetchone()
-    if row is None:
-        return None
-    d = dict(row)
-    d["authors"] = json.loads(d["authors"])
-    return d
+        return _with_authors(conn, conn.execute("SELECT * FROM papers WHERE source_url = ?", (filename,)).fetchone())
+
+
+def get_paper_by_pdf(sha256: str) -> dict | None:
+    with _conn() as conn:
+        return _with_authors(conn, conn.execute("SELECT * FROM papers WHERE pdf_sha256 = ?", (sha256,)).fetchone())
+
+
+def get_papers_with_pdf(since: str | None = None) -> list[dict]:
+    """Papers whose PDF is in the content-addressed store, optionally added on or after `since`."""
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT id, title, pdf_sha256, added_at FROM papers WHERE pdf_sha256 IS NOT NULL AND added_at >= ? "
+            "ORDER BY id",
+            (since or "",),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_papers_without_pdf() -> list[dict]:
+    """Papers whose upload predates content-addressed storage."""
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT id, source_url FROM papers WHERE pdf_sha256 IS NULL AND source_url != ''"
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def set_paper_pdf(paper_id: int, sha256: str):
+    with _conn() as conn:
+        conn.execute("UPDATE papers SET pdf_sha256 = ? WHERE id = ?", (sha256, paper_id))
 
 
 def get_paper_by_title(title: str) -> dict | None:
     with _conn() as conn:
-        row = conn.execute("SELECT * FROM papers WHERE LOWER(title) = LOWER(?)", (title,)).fetchone()
-    if row is None:
-        return None
-    d = dict(row)
-    d["authors"] = json.loads(d["authors"])
-    return d
+        return _with_authors(conn, conn.execute("SELECT * FROM papers WHERE LOWER(title) = LOWER(?)", (title,)).fetchone())
 
 
 def update_paper_title(paper_id: int, title: str):
@@ -127,8 +689,16 @@ def delete_paper(paper_id: int):
     with _conn() as conn:
         conn.execute("DELETE FROM paper_concepts WHERE paper_id = ?", (paper_id,))
         conn.execute("DELETE FROM user_notes WHERE paper_id = ?", (paper_id,))
+        conn.execute("DELETE FROM chat_archive WHERE chat_id IN (SELECT id FROM chat_history WHERE paper_id = ?)",
+                     (paper_id,))
         conn.execute("DELETE FROM chat_history WHERE paper_id = ?", (paper_id,))
+        conn.execute("DELETE FROM paper_similarity WHERE paper_id = ? OR related_id = ?", (paper_id, paper_id))
+        conn.execute("DELETE FROM paper_norms WHERE paper_id = ?", (paper_id,))
+        conn.execute("DELETE FROM paper_authors WHERE paper_id = ?", (paper_id,))
+        conn.execute("DELETE FROM reextract_items WHERE paper_id = ?", (paper_id,))
+        conn.execute("DELETE FROM concept_link_papers WHERE paper_id = ?", (paper_id,))
         conn.execute("DELETE FROM papers WHERE id = ?", (paper_id,))
+        _delete_orphan_authors(conn)
         conn.execute("""
             DELETE FROM concepts WHERE id NOT IN (
                 SELECT DISTINCT concept_id FROM paper_concepts
@@ -148,16 +718,166 @@ def update_paper_self_rating(paper_id: int, rating: float):
 
 
 def list_papers() -> list[dict]:
+    """Every paper for list views, newest first, with a ready-made byline in authors_display."""
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT id, title, authors_display, self_rating, added_at FROM papers ORDER BY added_at DESC"
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_papers_for_index(after_id: int = 0, paper_ids: list[int] | None = None) -> list[dict]:
+    """Papers with id > after_id (or just `paper_ids`) and the text the retrieval index is built from."""
+    where, params = ("p.id IN (SELECT value FROM json_each(?))", (json.dumps(paper_ids),)) \
+        if paper_ids is not None else ("p.id > ?", (after_id,))
+    with _conn() as conn:
+        rows = conn.execute(f"""
+            SELECT p.id, p.title, p.abstract, p.summary,
+                   (SELECT json_group_array(json_object('name', c.name, 'description', c.description))
+                    FROM paper_concepts pc JOIN concepts c ON c.id = pc.concept_id
+                    WHERE pc.paper_id = p.id) AS concepts
+            FROM papers p WHERE {where} ORDER BY p.id
+        """, params).fetchall()
+    results = []
+    for r in rows:
+        d = dict(r)
+        d["concepts"] = json.loads(d["concepts"])
+        results.append(d)
+    return results
+
+
+def get_paper_titles(paper_ids: list[int]) -> dict[int, str]:
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT id, title FROM papers WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(paper_ids),),
+        ).fetchall()
+    return {r["id"]: r["title"] for r in rows}
+
+
+# ── Related Papers ──────────────────────────────────────────────────────
+
+def get_paper_concept_pairs() -> list[tuple[int, int]]:
+    with _conn() as conn:
+        return [tuple(r) for r in conn.execute("SELECT paper_id, concept_id FROM paper_concepts")]
+
+
+def get_concept_frequencies(paper_id: int) -> tuple[dict[int, int], int]:
+    """Papers per concept of this paper, and the number of papers with concepts."""
+    with _conn() as conn:
+        rows = conn.execute("""
+            SELECT concept_id, COUNT(*) AS n FROM paper_concepts
+            WHERE concept_id IN (SELECT concept_id FROM paper_concepts WHERE paper_id = ?)
+            GROUP BY concept_id
+        """, (paper_id,)).fetchall()
+        n_papers = conn.execute("SELECT COUNT(DISTINCT paper_id) FROM paper_concepts").fetchone()[0]
+    return {r["concept_id"]: r["n"] for r in rows}, n_papers
+
+
+def get_concept_postings(paper_id: int) -> list[tuple[int, int, float]]:
+    """(paper_id, concept_id, norm) for every concept another scored paper shares with this one."""
+    with _conn() as conn:
+        rows = conn.execute("""
+            SELECT b.paper_id, b.concept_id, n.norm FROM paper_concepts a
+            JOIN paper_concepts b ON b.concept_id = a.concept_id AND b.paper_id != a.paper_id
+            JOIN paper_norms n ON n.paper_id = b.paper_id
+            WHERE a.paper_id = ?
+        """, (paper_id,)).fetchall()
+    return [tuple(r) for r in rows]
+
+
+def set_paper_norms(norms: dict[int, float]):
+    with _conn() as conn:
+        conn.executemany("INSERT OR REPLACE INTO paper_norms (paper_id, norm) VALUES (?, ?)", norms.items())
+
+
+def get_related_papers(paper_id: int, limit: int = 5) -> list[dict]:
+    """Most similar papers, with the concepts each shares with this one."""
     with _conn() as conn:
-        rows = conn.execute("SELECT id, title, authors, abstract, summary, self_rating, added_at FROM papers ORDER BY added_at DESC").fetchall()
+        rows = conn.execute("""
+            SELECT p.id, p.title, s.score,
+                   (SELECT json_group_array(c.name) FROM paper_concepts a
+                    JOIN paper_concepts b ON b.concept_id = a.concept_id AND b.paper_id = p.id
+                    JOIN concepts c ON c.id = a.concept_id
+                    WHERE a.paper_id = s.paper_id) AS shared
+            FROM paper_similarity s JOIN papers p ON p.id = s.related_id
+            WHERE s.paper_id = ?
+            ORDER BY s.score DESC LIMIT ?
+        """, (paper_id, limit)).fetchall()
     results = []
     for r in rows:
         d = dict(r)
-        d["authors"] = json.loads(d["authors"])
+        d["shared"] = json.loads(d["shared"])
         results.append(d)
     return results
 
 
+def get_papers_related_to(paper_id: int) -> list[int]:
+    """Papers whose related list includes this one."""
+    with _conn() as conn:
+        rows = conn.execute("SELECT paper_id FROM paper_similarity WHERE related_id = ?", (paper_id,)).fetchall()
+    return [r["paper_id"] for r in rows]
+
+
+def get_related_floors(paper_ids: list[int]) -> dict[int, tuple[int, float]]:
+    """(list length, lowest score) per paper that has a related list."""
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT paper_id, COUNT(*) AS n, MIN(score) AS floor FROM paper_similarity "
+            "WHERE paper_id IN (SELECT value FROM json_each(?)) GROUP BY paper_id",
+            (json.dumps(paper_ids),),
+        ).fetchall()
+    return {r["paper_id"]: (r["n"], r["floor"]) for r in rows}
+
+
+def replace_related_papers(related: dict[int, list[tuple[int, float]]]):
+    with _conn() as conn:
+        conn.executemany("DELETE FROM paper_similarity WHERE paper_id = ?", [(pid,) for pid in related])
+        conn.executemany(
+            "INSERT INTO paper_similarity (paper_id, related_id, score) VALUES (?, ?, ?)",
+            [(pid, rid, score) for pid, rows in related.items() for rid, score in rows],
+        )
+
+
+def get_related_lists(paper_ids: list[int]) -> dict[int, list[tuple[int, float]]]:
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT paper_id, related_id, score FROM paper_similarity "
+            "WHERE paper_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(paper_ids),),
+        ).fetchall()
+    related = {}
+    for r in rows:
+        related.setdefault(r["paper_id"], []).append((r["related_id"], r["score"]))
+    return related
+
+
+def get_related_build() -> dict | None:
+    with _conn() as conn:
+        row = conn.execute("SELECT * FROM related_builds ORDER BY id DESC LIMIT 1").fetchone()
+    return dict(row) if row else None
+
+
+def record_related_build(papers: int, last_paper_id: int):
+    with _conn() as conn:
+        conn.execute(
+            "INSERT INTO related_builds (built_at, papers, last_paper_id) VALUES (?, ?, ?)",
+            (datetime.now(timezone.utc).isoformat(), papers, last_paper_id),
+        )
+
+
+def count_papers_with_concepts(after_id: int = 0) -> int:
+    with _conn() as conn:
+        return conn.execute(
+            "SELECT COUNT(DISTINCT paper_id) FROM paper_concepts WHERE paper_id > ?", (after_id,)
+        ).fetchone()[0]
+
+
+def has_related_papers() -> bool:
+    with _conn() as conn:
+        return conn.execute("SELECT 1 FROM paper_similarity LIMIT 1").fetchone() is not None
+
+
 # ── Concepts ────────────────────────────────────────────────────────────
 
 def upsert_concept(name: str, description: str = "") -> int:
@@ -207,14 +927,45 @@ def link_paper_concept(paper_id: int, concept_id: int):
 
 # ── Concept Links ──────────────────────────────────────────────────────
 
-def upsert_concept_link(concept_a_id: int, concept_b_id: int, relationship: str = ""):
+def _add_concept_link(conn: sqlite3.Connection, a: int, b: int, relationship: str, paper_id: int | None) -> int:
+    """Upsert a link and credit it to `paper_id`; returns 1 if the link or its provenance changed.
+
+    The link keeps the first non-empty relationship; each paper's own wording
+    is in concept_link_papers. Adding a paper raises the weight (by trigger).
+    """
+    changed = conn.execute(
+        "INSERT INTO concept_links (concept_a, concept_b, relationship) VALUES (?, ?, ?) "
+        "ON CONFLICT(concept_a, concept_b) DO UPDATE SET relationship = excluded.relationship "
+        "WHERE concept_links.relationship = '' AND excluded.relationship != ''",
+        (a, b, relationship),
+    ).rowcount
+    if paper_id is not None:
+        changed |= conn.execute(
+            "INSERT INTO concept_link_papers (concept_a, concept_b, paper_id, relationship) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(concept_a, concept_b, paper_id) DO UPDATE SET relationship = excluded.relationship "
+            "WHERE concept_link_papers.relationship != excluded.relationship",
+            (a, b, paper_id, relationship),
+        ).rowcount
+    return changed
+
+
+def upsert_concept_link(concept_a_id: int, concept_b_id: int, relationship: str = "",
+                        paper_id: int | None = None):
     a, b = sorted([concept_a_id, concept_b_id])
     with _conn() as conn:
-        conn.execute(
-            "INSERT INTO concept_links (concept_a, concept_b, relationship) VALUES (?, ?, ?) "
-            "ON CONFLICT(concept_a, concept_b) DO UPDATE SET relationship = excluded.relationship",
-            (a, b, relationship),
-        )
+        _add_concept_link(conn, a, b, relationship, paper_id)
+
+
+def get_link_papers(concept_a_id: int, concept_b_id: int) -> list[dict]:
+    """The papers a link was extracted from, with the relationship each gave."""
+    a, b = sorted([concept_a_id, concept_b_id])
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT clp.paper_id, clp.relationship, p.title FROM concept_link_papers clp "
+            "JOIN papers p ON p.id = clp.paper_id WHERE clp.concept_a = ? AND clp.concept_b = ? ORDER BY p.added_at",
+            (a, b),
+        ).fetchall()
+    return [dict(r) for r in rows]
 
 
 def get_all_concept_links() -> list[dict]:
@@ -228,8 +979,245 @@ def get_all_concept_links() -> list[dict]:
     return [dict(r) for r in rows]
 
 
+# ── Subgraphs ──────────────────────────────────────────────────────────
+# Focused views of the graph: queries here touch only the requested
+# neighbourhood, never the whole concepts/concept_links tables.
+
+_NODES = (
+    "SELECT c.id, c.name, c.description, COALESCE(uk.confidence, 0.0) AS confidence, cp.x, cp.y, "
+    "COALESCE(cm.importance, 0.0) AS importance, cm.community "
+    "FROM concepts c "
+    "LEFT JOIN user_knowledge uk ON uk.concept_id = c.id "
+    "LEFT JOIN concept_positions cp ON cp.concept_id = c.id "
+    "LEFT JOIN concept_metrics cm ON cm.concept_id = c.id"
+)
+
+
+def _subgraph_nodes(conn: sqlite3.Connection, ids: list[int]) -> list[dict]:
+    rows = conn.execute(_NODES + " WHERE c.id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def _subgraph_links(conn: sqlite3.Connection, ids: list[int], new_ids: list[int]) -> list[dict]:
+    """Links with both ends in `ids` and at least one end in `new_ids`."""
+    rows = conn.execute(
+        "SELECT concept_a, concept_b, relationship, weight FROM concept_links "
+        "WHERE concept_a IN (SELECT value FROM json_each(?1)) "
+        "AND concept_b IN (SELECT value FROM json_each(?1)) "
+        "AND (concept_a IN (SELECT value FROM json_each(?2)) OR concept_b IN (SELECT value FROM json_each(?2)))",
+        (json.dumps(ids), json.dumps(new_ids)),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_concept_neighborhood(concept_id: int, hops: int = 1, limit: int = 50,
+                             known_ids: list[int] | tuple = ()) -> dict:
+    """Concepts within `hops` links of `concept_id` (itself included), nearest first.
+
+    Concepts in `known_ids` (already on screen) are walked through but not
+    returned, so a client can ask for just the delta when expanding a node.
+    Returned links are those that touch at least one returned concept.
+    """
+    known = list(known_ids)
+    with _conn() as conn:
+        rows = conn.execute(
+            """
+            WITH RECURSIVE hood(id, depth) AS (
+                SELECT ?1, 0
+                UNION
+                SELECT CASE WHEN cl.concept_a = hood.id THEN cl.concept_b ELSE cl.concept_a END,
+                       hood.depth + 1
+                FROM hood JOIN concept_links cl
+                  ON cl.concept_a = hood.id OR cl.concept_b = hood.id
+                WHERE hood.depth < ?2
+                LIMIT ?4
+            )
+            SELECT id FROM hood
+            WHERE id NOT IN (SELECT value FROM json_each(?3))
+            GROUP BY id ORDER BY MIN(depth), id LIMIT ?5
+            """,
+            (concept_id, hops, json.dumps(known), (limit + len(known)) * 10, limit),
+        ).fetchall()
+        new_ids = [r["id"] for r in rows]
+        if not new_ids:
+            return {"nodes": [], "links": []}
+        return {
+            "nodes": _subgraph_nodes(conn, new_ids),
+            "links": _subgraph_links(conn, new_ids + known, new_ids),
+        }
+
+
+def get_paper_subgraph(paper_id: int) -> dict:
+    """A paper's concepts and the links between them."""
+    with _conn() as conn:
+        ids = [r["concept_id"] for r in conn.execute(
+            "SELECT concept_id FROM paper_concepts WHERE paper_id = ?", (paper_id,)
+        ).fetchall()]
+        return {"nodes": _subgraph_nodes(conn, ids), "links": _subgraph_links(conn, ids, ids)}
+
+
+def search_concepts(query: str, limit: int = 10) -> list[dict]:
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT id, name FROM concepts WHERE name LIKE ? ORDER BY length(name), name LIMIT ?",
+            (f"%{query.strip().lower()}%", limit),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ── Graph Versions ─────────────────────────────────────────────────────
+
+def _graph_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM graph_changes").fetchone()[0]
+
+
+def get_graph_version() -> int:
+    with _conn() as conn:
+        return _graph_version(conn)
+
+
+def get_graph() -> dict:
+    """Every concept and link, and the graph version they are current as of."""
+    with _conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            return {
+                "version": _graph_version(conn),
+                "nodes": [dict(r) for r in conn.execute(_NODES).fetchall()],
+                "links": [dict(r) for r in conn.execute(
+                    "SELECT concept_a, concept_b, relationship, weight FROM concept_links"
+                ).fetchall()],
+            }
+        finally:
+            conn.rollback()
+
+
+def get_graph_changes(since: int) -> dict:
+    """Concepts and links changed after version `since`, and the ids of those deleted since."""
+    with _conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            version = _graph_version(conn)
+            changed = conn.execute("SELECT kind, key FROM graph_changes WHERE version > ?", (since,)).fetchall()
+            node_ids = [int(r["key"]) for r in changed if r["kind"] == "node"]
+            link_keys = [[int(k) for k in r["key"].split("-")] for r in changed if r["kind"] == "link"]
+            nodes = _subgraph_nodes(conn, node_ids)
+            links = [dict(r) for r in conn.execute(
+                "SELECT cl.concept_a, cl.concept_b, cl.relationship, cl.weight FROM json_each(?) k "
+                "JOIN concept_links cl ON cl.concept_a = json_extract(k.value, '$[0]') "
+                "AND cl.concept_b = json_extract(k.value, '$[1]')",
+                (json.dumps(link_keys),),
+            ).fetchall()]
+        finally:
+            conn.rollback()
+    present = {n["id"] for n in nodes}
+    linked = {(link["concept_a"], link["concept_b"]) for link in links}
+    return {
+        "version": version,
+        "since": since,
+        "nodes": nodes,
+        "links": links,
+        "removed_nodes": [i for i in node_ids if i not in present],
+        "removed_links": [k for k in link_keys if tuple(k) not in linked],
+    }
+
+
+# ── Graph Metrics ──────────────────────────────────────────────────────
+
+def get_weighted_graph() -> dict:
+    """Every concept id and weighted link, and the graph version they are current as of."""
+    with _conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            return {
+                "version": _graph_version(conn),
+                "concept_ids": [r[0] for r in conn.execute("SELECT id FROM concepts ORDER BY id")],
+                "links": [tuple(r) for r in conn.execute("SELECT concept_a, concept_b, weight FROM concept_links")],
+            }
+        finally:
+            conn.rollback()
+
+
+def get_graph_metrics_state() -> dict:
+    """The version metrics were last computed at, and how many links changed since."""
+    with _conn() as conn:
+        last = conn.execute("SELECT version, computed_at FROM graph_metrics_runs ORDER BY id DESC LIMIT 1").fetchone()
+        changed = conn.execute(
+            "SELECT COUNT(*) FROM graph_changes WHERE kind = 'link' AND version > ?", (last["version"] if last else 0,)
+        ).fetchone()[0]
+        return {
+            "version": last["version"] if last else None,
+            "computed_at": last["computed_at"] if last else None,
+            "links": conn.execute("SELECT COUNT(*) FROM concept_links").fetchone()[0],
+            "changed_links": changed,
+        }
+
+
+def save_concept_metrics(version: int, rows: list[tuple], links: int, duration_ms: float):
+    """Upsert (concept_id, degree, strength, pagerank, importance, community) rows and record the run."""
+    with _conn() as conn:
+        conn.executemany(
+            "INSERT INTO concept_metrics (concept_id, degree, strength, pagerank, importance, community) "
+            "SELECT ?1, ?2, ?3, ?4, ?5, ?6 WHERE EXISTS (SELECT 1 FROM concepts WHERE id = ?1) "
+            "ON CONFLICT(concept_id) DO UPDATE SET degree = excluded.degree, strength = excluded.strength, "
+            "pagerank = excluded.pagerank, importance = excluded.importance, community = excluded.community",
+            rows,
+        )
+        conn.execute(
+            "INSERT INTO graph_metrics_runs (version, computed_at, nodes, links, duration_ms) VALUES (?, ?, ?, ?, ?)",
+            (version, datetime.now(timezone.utc).isoformat(), len(rows), links, duration_ms),
+        )
+
+
+def get_top_concepts_subgraph(limit: int = 50, community: int | None = None) -> dict:
+    """The `limit` most central concepts, optionally of one community, and the links between them."""
+    with _conn() as conn:
+        if community is None:
+            rows = conn.execute("SELECT concept_id FROM concept_metrics ORDER BY importance DESC LIMIT ?", (limit,))
+        else:
+            rows = conn.execute(
+                "SELECT concept_id FROM concept_metrics WHERE community = ? ORDER BY importance DESC LIMIT ?",
+                (community, limit),
+            )
+        ids = [r[0] for r in rows]
+        return {"nodes": _subgraph_nodes(conn, ids), "links": _subgraph_links(conn, ids, ids)}
+
+
+def get_communities(limit: int = 20) -> list[dict]:
+    """The largest communities, each with its size and most central concept."""
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT cm.community, COUNT(*) AS size, c.name AS top_concept, MAX(cm.importance) AS importance "
+            "FROM concept_metrics cm JOIN concepts c ON c.id = cm.concept_id "
+            "GROUP BY cm.community HAVING size > 1 ORDER BY size DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ── Graph Layout ───────────────────────────────────────────────────────
+
+def get_concept_positions() -> dict[int, tuple[float, float]]:
+    with _conn() as conn:
+        rows = conn.execute("SELECT concept_id, x, y FROM concept_positions").fetchall()
+    return {r["concept_id"]: (r["x"], r["y"]) for r in rows}
+
+
+def save_concept_positions(positions: dict[int, tuple[float, float]]):
+    with _conn() as conn:
+        conn.executemany(
+            "INSERT INTO concept_positions (concept_id, x, y) VALUES (?, ?, ?) "
+            "ON CONFLICT(concept_id) DO UPDATE SET x = excluded.x, y = excluded.y",
+            [(cid, x, y) for cid, (x, y) in positions.items()],
+        )
+
+
 # ── User Knowledge ─────────────────────────────────────────────────────
 
+# The review queue counts due concepts up to this many, so the count stays a bounded scan
+REVIEW_COUNT_CAP = 100
+
+
 def get_user_knowledge() -> list[dict]:
     with _conn() as conn:
         rows = conn.execute(
@@ -241,15 +1229,122 @@ def get_user_knowledge() -> list[dict]:
 
 
 def upsert_user_knowledge(concept_id: int, confidence: float):
-    now = datetime.now(timezone.utc).isoformat()
+    """Record an assessment, and reschedule the concept's next review from it."""
+    tested = datetime.now(timezone.utc)
+    now = tested.isoformat()
+    confidence = max(0.0, min(1.0, confidence))
     with _conn() as conn:
+        # Take the write lock before reading, so a concurrent assessment of the concept
+        # waits for this one instead of rescheduling from the same previous state
+        conn.execute("BEGIN IMMEDIATE")
+        previous = conn.execute(
+            "SELECT confidence, stability, difficulty, reviews, last_tested FROM user_knowledge WHERE concept_id = ?",
+            (concept_id,),
+        ).fetchone()
+        schedule = scheduler.review(dict(previous) if previous else None, confidence, tested)
+        conn.execute(
+            "INSERT INTO user_knowledge (concept_id, confidence, last_tested, stability, difficulty, reviews, due_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(concept_id) DO UPDATE SET confidence = excluded.confidence, last_tested = excluded.last_tested, "
+            "stability = excluded.stability, difficulty = excluded.difficulty, reviews = excluded.reviews, "
+            "due_at = excluded.due_at",
+            (concept_id, confidence, now, schedule["stability"], schedule["difficulty"], schedule["reviews"],
+             schedule["due_at"]),
+        )
+        # Triggers roll the event up into knowledge_daily / knowledge_weekly
         conn.execute(
-            "INSERT INTO user_knowledge (concept_id, confidence, last_tested) VALUES (?, ?, ?) "
-            "ON CONFLICT(concept_id) DO UPDATE SET confidence = excluded.confidence, last_tested = excluded.last_tested",
-            (concept_id, max(0.0, min(1.0, confidence)), now),
+            "INSERT INTO knowledge_events (concept_id, confidence, previous, created_at) VALUES (?, ?, ?, ?)",
+            (concept_id, confidence, previous["confidence"] if previous else None, now),
         )
 
 
+def _schedule_unscheduled(conn: sqlite3.Connection):
+    """Schedule knowledge without a due_at by replaying its assessments in order."""
+    if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM user_knowledge WHERE due_at IS NULL)").fetchone()[0]:
+        return
+    states: dict[int, dict] = {}
+    for e in conn.execute(
+        "SELECT concept_id, confidence, created_at FROM knowledge_events WHERE concept_id IN "
+        "(SELECT concept_id FROM user_knowledge WHERE due_at IS NULL) ORDER BY concept_id, id"
+    ):
+        when = datetime.fromisoformat(e["created_at"])
+        states[e["concept_id"]] = {**scheduler.review(states.get(e["concept_id"]), e["confidence"], when),
+                                   "last_tested": e["created_at"]}
+    # Knowledge no event explains (the history was cleared) starts from its current score
+    now = datetime.now(timezone.utc)
+    for r in conn.execute(
+        "SELECT concept_id, confidence, last_tested FROM user_knowledge WHERE due_at IS NULL"
+    ).fetchall():
+        if r["concept_id"] not in states:
+            when = datetime.fromisoformat(r["last_tested"]) if r["last_tested"] else now
+            states[r["concept_id"]] = scheduler.review(None, r["confidence"], when)
+    conn.executemany(
+        "UPDATE user_knowledge SET stability = ?, difficulty = ?, reviews = ?, due_at = ? WHERE concept_id = ?",
+        [(st["stability"], st["difficulty"], st["reviews"], st["due_at"], cid) for cid, st in states.items()],
+    )
+
+
+def get_review_queue(limit: int = 20) -> dict:
+    """The concepts due for review, most overdue first, and when the next one falls due.
+
+    Both are range scans of idx_user_knowledge_due; due_count stops at REVIEW_COUNT_CAP.
+    """
+    now = scheduler.stamp(datetime.now(timezone.utc))
+    with _conn() as conn:
+        due = conn.execute(
+            "SELECT uk.concept_id AS id, c.name, uk.confidence, uk.stability, uk.reviews, uk.due_at "
+            "FROM user_knowledge uk CROSS JOIN concepts c ON c.id = uk.concept_id "
+            "WHERE uk.due_at <= ? ORDER BY uk.due_at LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        due_count = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM user_knowledge WHERE due_at <= ? LIMIT ?)",
+            (now, REVIEW_COUNT_CAP),
+        ).fetchone()[0]
+        next_due = conn.execute(
+            "SELECT due_at FROM user_knowledge WHERE due_at > ? ORDER BY due_at LIMIT 1", (now,)
+        ).fetchone()
+    return {"due": [dict(r) for r in due], "due_count": due_count, "next_due": next_due[0] if next_due else None}
+
+
+def get_review_paper(concept_ids: list[int]) -> tuple[int, list[int]] | None:
+    """(paper, the given concepts it covers) for the paper covering the most of them."""
+    if not concept_ids:
+        return None
+    placeholders = ",".join("?" * len(concept_ids))
+    with _conn() as conn:
+        row = conn.execute(
+            f"SELECT paper_id, COUNT(*) AS n FROM paper_concepts WHERE concept_id IN ({placeholders}) "
+            "GROUP BY paper_id ORDER BY n DESC, paper_id DESC LIMIT 1",
+            concept_ids,
+        ).fetchone()
+        if row is None:
+            return None
+        covered = {r[0] for r in conn.execute(
+            f"SELECT concept_id FROM paper_concepts WHERE paper_id = ? AND concept_id IN ({placeholders})",
+            (row["paper_id"], *concept_ids),
+        )}
+    return row["paper_id"], [c for c in concept_ids if c in covered]
+
+
+def get_knowledge_progress(period: str = "day", limit: int = 90) -> list[dict]:
+    """Most recent `limit` rollup rows for "day" or "week", oldest first."""
+    table, key = ("knowledge_weekly", "week") if period == "week" else ("knowledge_daily", "day")
+    with _conn() as conn:
+        rows = conn.execute(
+            f"SELECT {key} AS period, assessments, confidence_sum, gain_sum, known_total, known_count "
+            f"FROM {table} ORDER BY {key} DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    results = []
+    for r in reversed(rows):
+        d = dict(r)
+        d["avg_confidence"] = d["known_total"] / d["known_count"] if d["known_count"] else 0.0
+        d["avg_assessed"] = d["confidence_sum"] / d["assessments"] if d["assessments"] else None
+        results.append(d)
+    return results
+
+
 # ── User Notes ──────────────────────────────────────────────────────────
 
 def add_note(paper_id: int, takeaway: str) -> int:
@@ -277,8 +1372,9 @@ def create_chat(paper_id: int, agent_type: str = "teach") -> int:
     now = datetime.now(timezone.utc).isoformat()
     with _conn() as conn:
         cur = conn.execute(
-            "INSERT INTO chat_history (paper_id, agent_type, messages_json, created_at) VALUES (?, ?, '[]', ?)",
-            (paper_id, agent_type, now),
+            "INSERT INTO chat_history (paper_id, agent_type, messages_json, created_at, updated_at) "
+            "VALUES (?, ?, '[]', ?, ?)",
+            (paper_id, agent_type, now, now),
         )
         return cur.lastrowid
 
@@ -294,24 +1390,106 @@ def get_or_create_chat_for_paper(paper_id: int) -> int:
     return create_chat(paper_id)
 
 
+_DECOMPRESS = {"zlib": zlib.decompress}
+
+
+def _archived_messages(conn: sqlite3.Connection, chat_id: int) -> list[dict] | None:
+    """The transcript of an archived chat, or None if the chat is not archived."""
+    row = conn.execute("SELECT codec, messages FROM chat_archive WHERE chat_id = ?", (chat_id,)).fetchone()
+    if row is None:
+        return None
+    return json.loads(_DECOMPRESS[row["codec"]](row["messages"]))
+
+
 def get_chat(chat_id: int) -> dict | None:
     with _conn() as conn:
         row = conn.execute("SELECT * FROM chat_history WHERE id = ?", (chat_id,)).fetchone()
-    if row is None:
-        return None
-    d = dict(row)
-    d["messages_json"] = json.loads(d["messages_json"])
+        if row is None:
+            return None
+        d = dict(row)
+        archived = _archived_messages(conn, chat_id)
+    d["messages_json"] = json.loads(d["messages_json"]) if archived is None else archived
     return d
 
 
+def get_chat_info(chat_id: int) -> dict | None:
+    """Chat metadata plus its message count, without decoding the transcript."""
+    with _conn() as conn:
+        row = conn.execute(
+            "SELECT id, paper_id, agent_type, created_at, updated_at, message_count FROM chat_history WHERE id = ?",
+            (chat_id,),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def get_chat_messages(chat_id: int, offset: int, limit: int) -> list[dict]:
+    """Messages [offset, offset + limit) of a chat, oldest first."""
+    with _conn() as conn:
+        archived = _archived_messages(conn, chat_id)
+        if archived is not None:
+            return archived[offset:offset + limit]
+        rows = conn.execute(
+            "SELECT je.value FROM chat_history ch, json_each(ch.messages_json) je "
+            "WHERE ch.id = ? AND je.key >= ? AND je.key < ? ORDER BY je.key",
+            (chat_id, offset, offset + limit),
+        ).fetchall()
+    return [json.loads(r["value"]) for r in rows]
+
+
 def update_chat_messages(chat_id: int, messages: list[dict]):
+    """Replace a chat's transcript; an archived chat becomes active again."""
+    now = datetime.now(timezone.utc).isoformat()
     with _conn() as conn:
+        conn.execute("DELETE FROM chat_archive WHERE chat_id = ?", (chat_id,))
         conn.execute(
-            "UPDATE chat_history SET messages_json = ? WHERE id = ?",
-            (json.dumps(messages), chat_id),
+            "UPDATE chat_history SET messages_json = ?, message_count = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(messages), len(messages), now, chat_id),
         )
 
 
+def archive_chats(idle_before: str, limit: int = 200) -> int:
+    """Compress the transcripts of up to `limit` chats last active before `idle_before`.
+
+    Returns how many were archived. Reads decompress them transparently, and
+    the next update_chat_messages stores the transcript uncompressed again.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT * FROM chat_history ch WHERE updated_at < ? AND message_count > 0 "
+            "AND NOT EXISTS (SELECT 1 FROM chat_archive a WHERE a.chat_id = ch.id) LIMIT ?",
+            (idle_before, limit),
+        ).fetchall()
+        for r in rows:
+            row = dict(r)
+            raw = row["messages_json"].encode()
+            row["messages_json"] = "[]"
+            # Delete and re-insert rather than UPDATE: only a delete rebalances the
+            # b-tree, so the leaf pages that held the transcripts are merged and freed
+            conn.execute("DELETE FROM chat_history WHERE id = ?", (row["id"],))
+            conn.execute(f"INSERT INTO chat_history ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                         list(row.values()))
+            conn.execute(
+                "INSERT INTO chat_archive (chat_id, codec, messages, raw_bytes, archived_at) "
+                "VALUES (?, 'zlib', ?, ?, ?)",
+                (row["id"], zlib.compress(raw, 9), len(raw), now),
+            )
+    return len(rows)
+
+
+def get_chat_archive_stats() -> dict:
+    """Chats stored inline and archived, with transcript bytes before and after compression."""
+    with _conn() as conn:
+        row = conn.execute("""
+            SELECT (SELECT COUNT(*) FROM chat_history) - COUNT(*) AS active_chats,
+                   COUNT(*) AS archived_chats,
+                   COALESCE(SUM(raw_bytes), 0) AS archived_raw_bytes,
+                   COALESCE(SUM(length(messages)), 0) AS archived_bytes
+            FROM chat_archive
+        """).fetchone()
+    return dict(row)
+
+
 def list_chats(paper_id: int | None = None, limit: int = 20) -> list[dict]:
     with _conn() as conn:
         if paper_id is not None:
@@ -331,19 +1509,174 @@ def list_chats(paper_id: int | None = None, limit: int = 20) -> list[dict]:
     return [dict(r) for r in rows]
 
 
+# ── Re-extraction ───────────────────────────────────────────────────────
+
+REEXTRACT_FIELDS = ("title", "authors", "abstract", "summary")
+
+
+def apply_reextraction(paper_id: int, parsed: dict, fields: tuple[str, ...] = ("abstract", "summary")) -> dict:
+    """Diff a fresh extraction into an existing paper, in one transaction.
+
+    New concepts are added and linked. Concepts no longer extracted are
+    unlinked, except ones the user has knowledge of, and deleted if no other
+    paper uses them. Links are upserted and credited to the paper; links it
+    no longer states lose its credit, and go if no other paper states them.
+    Of the paper's own columns only `fields` are overwritten. Notes, chats and knowledge are never touched.
+    Returns counts of what changed.
+    """
+    with _conn() as conn:
+        current = {r["name"]: r["id"] for r in conn.execute(
+            "SELECT c.id, c.name FROM paper_concepts pc JOIN concepts c ON c.id = pc.concept_id WHERE pc.paper_id = ?",
+            (paper_id,),
+        )}
+        extracted = {}
+        for c in parsed.get("concepts", []):
+            name = c.get("name", "").strip().lower()
+            if not name or name in extracted:
+                continue
+            description = c.get("description", "")
+            conn.execute(
+                "INSERT INTO concepts (name, description) VALUES (?, ?) ON CONFLICT(name) DO UPDATE "
+                "SET description = excluded.description "
+                "WHERE excluded.description != '' AND excluded.description != concepts.description",
+                (name, description),
+            )
+            extracted[name] = conn.execute("SELECT id FROM concepts WHERE name = ?", (name,)).fetchone()[0]
+        added = [cid for name, cid in extracted.items() if name not in current]
+        conn.executemany("INSERT OR IGNORE INTO paper_concepts (paper_id, concept_id) VALUES (?, ?)",
+                         [(paper_id, cid) for cid in added])
+
+        dropped = [cid for name, cid in current.items() if name not in extracted]
+        placeholders = ",".join("?" * len(dropped))
+        known = {r[0] for r in conn.execute(
+            f"SELECT concept_id FROM user_knowledge WHERE concept_id IN ({placeholders})", dropped
+        )} if dropped else set()
+        removed = [cid for cid in dropped if cid not in known]
+        conn.executemany("DELETE FROM paper_concepts WHERE paper_id = ? AND concept_id = ?",
+                         [(paper_id, cid) for cid in removed])
+        deleted = 0
+        if removed:
+            placeholders = ",".join("?" * len(removed))
+            deleted = conn.execute(
+                f"DELETE FROM concepts WHERE id IN ({placeholders}) "
+                "AND NOT EXISTS (SELECT 1 FROM paper_concepts pc WHERE pc.concept_id = concepts.id)",
+                removed,
+            ).rowcount
+
+        links, stated = 0, set()
+        for link in parsed.get("concept_links", []):
+            a = extracted.get(link.get("from", "").strip().lower())
+            b = extracted.get(link.get("to", "").strip().lower())
+            if a is None or b is None or a == b:
+                continue
+            a, b = sorted([a, b])
+            stated.add((a, b))
+            links += _add_concept_link(conn, a, b, link.get("relationship", ""), paper_id)
+        # Links this extraction did not restate lose the paper's credit
+        previous = [tuple(r) for r in conn.execute(
+            "SELECT concept_a, concept_b FROM concept_link_papers WHERE paper_id = ?", (paper_id,)
+        )]
+        withdrawn = [(a, b, paper_id) for a, b in previous if (a, b) not in stated]
+        conn.executemany("DELETE FROM concept_link_papers WHERE concept_a = ? AND concept_b = ? AND paper_id = ?",
+                         withdrawn)
+        links += len(withdrawn)
+
+        updated = []
+        for field in fields:
+            value = parsed.get(field)
+            if not value:
+                continue
+            if field == "authors":
+                if conn.execute("UPDATE papers SET authors = ? WHERE id = ? AND authors != ?",
+                                (json.dumps(value), paper_id, json.dumps(value))).rowcount:
+                    _link_authors(conn, paper_id, value)
+                    _delete_orphan_authors(conn)
+                    updated.append(field)
+            elif conn.execute(f"UPDATE papers SET {field} = ? WHERE id = ? AND {field} != ?",
+                              (value, paper_id, value)).rowcount:
+                updated.append(field)
+    return {"concepts_added": len(added), "concepts_removed": len(removed), "concepts_kept": len(known),
+            "concepts_deleted": deleted, "links_changed": links, "fields_updated": updated}
+
+
+def create_reextract_run(items: list[dict], task: str, models: list[str], fields: tuple[str, ...]) -> int:
+    """Start a run over `items` (paper_id, and pages and est_tokens if known)."""
+    now = datetime.now(timezone.utc).isoformat()
+    with _conn() as conn:
+        run_id = conn.execute(
+            "INSERT INTO reextract_runs (task, models, fields, started_at) VALUES (?, ?, ?, ?)",
+            (task, ",".join(models), ",".join(fields), now),
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO reextract_items (run_id, paper_id, pages, est_tokens) VALUES (?, ?, ?, ?)",
+            [(run_id, i["paper_id"], i.get("pages"), i.get("est_tokens")) for i in items],
+        )
+    return run_id
+
+
+def get_reextract_run(run_id: int | None = None) -> dict | None:
+    """A run with its item counts by status; by default the latest unfinished one."""
+    with _conn() as conn:
+        if run_id is None:
+            row = conn.execute(
+                "SELECT * FROM reextract_runs WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        else:
+            row = conn.execute("SELECT * FROM reextract_runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM reextract_items WHERE run_id = ? GROUP BY status", (row["id"],)
+        ).fetchall())
+    return {**dict(row), **{status: counts.get(status, 0) for status in ("pending", "done", "failed")}}
+
+
+def get_reextract_items(run_id: int, status: str = "pending") -> list[dict]:
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT ri.*, p.title, p.pdf_sha256 FROM reextract_items ri JOIN papers p ON p.id = ri.paper_id "
+            "WHERE ri.run_id = ? AND ri.status = ? ORDER BY ri.paper_id",
+            (run_id, status),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def finish_reextract_item(run_id: int, paper_id: int, status: str, result: dict | str, duration_s: float):
+    with _conn() as conn:
+        conn.execute(
+            "UPDATE reextract_items SET status = ?, result = ?, duration_s = ?, updated_at = ? "
+            "WHERE run_id = ? AND paper_id = ?",
+            (status, result if isinstance(result, str) else json.dumps(result), duration_s,
+             datetime.now(timezone.utc).isoformat(), run_id, paper_id),
+        )
+
+
+def retry_failed_reextract_items(run_id: int) -> int:
+    with _conn() as conn:
+        return conn.execute(
+            "UPDATE reextract_items SET status = 'pending' WHERE run_id = ? AND status = 'failed'", (run_id,)
+        ).rowcount
+
+
+def finish_reextract_run(run_id: int):
+    with _conn() as conn:
+        conn.execute("UPDATE reextract_runs SET finished_at = ? WHERE id = ?",
+                     (datetime.now(timezone.utc).isoformat(), run_id))
+
+
 # ── Maintenance ─────────────────────────────────────────────────────────
 
 def prune_duplicate_papers():
-    """Delete duplicate papers by source_url, keeping the latest entry."""
+    """Delete duplicate papers by PDF content, keeping the latest entry."""
     with _conn() as conn:
-        # Find duplicates by filename (source_url), keep max(id) for each
+        # Same PDF bytes, or same filename for uploads whose file is gone; keep max(id) for each
         dupes = conn.execute("""
             SELECT id FROM papers
             WHERE source_url != ''
               AND id NOT IN (
                 SELECT MAX(id) FROM papers
                 WHERE source_url != ''
-                GROUP BY source_url
+                GROUP BY COALESCE(pdf_sha256, source_url)
               )
         """).fetchall()
         ids = [r["id"] for r in dupes]
@@ -352,8 +1685,14 @@ def prune_duplicate_papers():
         placeholders = ",".join("?" * len(ids))
         conn.execute(f"DELETE FROM paper_concepts WHERE paper_id IN ({placeholders})", ids)
         conn.execute(f"DELETE FROM user_notes WHERE paper_id IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM chat_archive WHERE chat_id IN "
+                     f"(SELECT id FROM chat_history WHERE paper_id IN ({placeholders}))", ids)
         conn.execute(f"DELETE FROM chat_history WHERE paper_id IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM paper_authors WHERE paper_id IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM reextract_items WHERE paper_id IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM concept_link_papers WHERE paper_id IN ({placeholders})", ids)
         conn.execute(f"DELETE FROM papers WHERE id IN ({placeholders})", ids)
+        _delete_orphan_authors(conn)
         # Clean up orphaned concepts
         conn.execute("""
             DELETE FROM concepts WHERE id NOT IN (
@@ -363,6 +1702,100 @@ def prune_duplicate_papers():
         return len(ids)
 
 
+def storage_info() -> dict:
+    """File and WAL size, page counts and auto_vacuum mode of the database."""
+    with _conn() as conn:
+        info = {name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")}
+    info["file_bytes"] = os.path.getsize(DB_PATH)
+    wal = DB_PATH + "-wal"
+    info["wal_bytes"] = os.path.getsize(wal) if os.path.exists(wal) else 0
+    return info
+
+
+def checkpoint() -> tuple[int, int, int]:
+    """Copy the WAL into the database and truncate it; returns (busy, wal pages, checkpointed)."""
+    with _conn() as conn:
+        return tuple(conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+
+
+def optimize():
+    """Refresh query planner statistics where SQLite thinks they are stale."""
+    with _conn() as conn:
+        conn.execute("PRAGMA analysis_limit=1000")
+        conn.execute("PRAGMA optimize")
+
+
+def incremental_vacuum(pages: int) -> int:
+    """Return up to `pages` free pages to the filesystem; returns how many were freed."""
+    with _conn() as conn:
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # execute() steps the pragma once, freeing a single page; executescript runs it to completion
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def migrate_auto_vacuum() -> bool:
+    """Switch an existing database to auto_vacuum=INCREMENTAL.
+
+    Takes a full VACUUM, which rewrites the file and blocks writers meanwhile.
+    Returns False if it was already done.
+    """
+    with _conn() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
+
+
+def record_storage_stats(info: dict, actions: list[str]):
+    with _conn() as conn:
+        conn.execute(
+            "INSERT INTO storage_stats (recorded_at, file_bytes, wal_bytes, page_size, page_count, "
+            "freelist_count, actions) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (datetime.now(timezone.utc).isoformat(), info["file_bytes"], info["wal_bytes"], info["page_size"],
+             info["page_count"], info["freelist_count"], ",".join(actions)),
+        )
+
+
+def get_storage_stats(limit: int = 100) -> list[dict]:
+    """Latest storage samples, oldest first."""
+    with _conn() as conn:
+        rows = conn.execute("SELECT * FROM storage_stats ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(r) for r in reversed(rows)]
+
+
+# ── Leases ──────────────────────────────────────────────────────────────
+# Cross-process mutual exclusion for work that must run once even when
+# several workers share the database.
+
+def acquire_lease(name: str, ttl: float = 300, wait: float = 0.0) -> str | None:
+    """Take the named lease for `ttl` seconds, polling up to `wait` seconds while
+    someone else holds it. Returns a token for release_lease, or None."""
+    token = f"{_OWNER}:{uuid.uuid4().hex[:8]}"
+    deadline = time.monotonic() + wait
+    while True:
+        now = datetime.now(timezone.utc)
+        with _conn() as conn:
+            cur = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ?",
+                (name, token, (now + timedelta(seconds=ttl)).isoformat(), now.isoformat()),
+            )
+            if cur.rowcount:
+                return token
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.25)
+
+
+def release_lease(name: str, token: str):
+    with _conn() as conn:
+        conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, token))
+
+
 # ── Stats ───────────────────────────────────────────────────────────────
 
 def get_stats() -> dict:
@@ -377,3 +1810,160 @@ def get_stats() -> dict:
         "chat_count": chat_count,
         "avg_confidence": avg_confidence or 0.0,
     }
+
+
+# ── Model Routing ───────────────────────────────────────────────────────
+
+def log_route_decision(task: str, model: str, position: int, decision: str, reason: str = "",
+                       latency_ms: float | None = None, duration_ms: float | None = None,
+                       prompt_tokens: int | None = None, completion_tokens: int | None = None,
+                       cost_usd: float | None = None, estimate: dict | None = None):
+    """Log one routing decision; `estimate` is preflight's, for comparing with the actual usage."""
+    now = datetime.now(timezone.utc).isoformat()
+    estimate = estimate or {}
+    with _conn() as conn:
+        conn.execute(
+            "INSERT INTO llm_route_log (task, model, position, decision, reason, latency_ms, duration_ms, "
+            "prompt_tokens, completion_tokens, cost_usd, est_prompt_tokens, est_completion_tokens, est_cost_usd, "
+            "trimmed, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (task, model, position, decision, reason, latency_ms, duration_ms,
+             prompt_tokens, completion_tokens, cost_usd, estimate.get("prompt_tokens"),
+             estimate.get("completion_tokens"), estimate.get("cost_usd"), ", ".join(estimate.get("trimmed", ())),
+             now),
+        )
+
+
+def get_llm_spend(since: str) -> float:
+    """USD spent on LLM calls since an ISO timestamp, as far as the models are priced."""
+    with _conn() as conn:
+        return conn.execute(
+            "SELECT COALESCE(SUM(cost_usd), 0) FROM llm_route_log WHERE created_at >= ?", (since,)
+        ).fetchone()[0]
+
+
+def get_route_latencies(task: str, model: str, limit: int = 50) -> list[float]:
+    """Latest latencies of successful calls, oldest first."""
+    with _conn() as conn:
+        rows = conn.execute(
+            "SELECT latency_ms FROM llm_route_log WHERE task = ? AND model = ? AND decision = 'used' "
+            "ORDER BY id DESC LIMIT ?",
+            (task, model, limit),
+        ).fetchall()
+    return [r["latency_ms"] for r in reversed(rows)]
+
+
+def get_route_stats(since: str | None = None) -> list[dict]:
+    """Calls, failures, skips, latency, cost and estimate accuracy per (task, model)."""
+    with _conn() as conn:
+        rows = conn.execute("""
+            SELECT task, model,
+                   SUM(decision = 'used') AS calls,
+                   SUM(decision = 'failed') AS failures,
+                   SUM(decision = 'skipped') AS skips,
+                   AVG(CASE WHEN decision = 'used' THEN latency_ms END) AS avg_latency_ms,
+                   AVG(CASE WHEN decision = 'used' THEN duration_ms END) AS avg_duration_ms,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens,
+                   SUM(cost_usd) AS cost_usd,
+                   SUM(trimmed != '') AS trimmed,
+                   -- Actual over estimated, on calls that have both: how far off preflight is
+                   ROUND(SUM(prompt_tokens * (est_prompt_tokens IS NOT NULL)) * 1.0
+                         / SUM(est_prompt_tokens * (prompt_tokens IS NOT NULL)), 3) AS prompt_estimate_ratio,
+                   ROUND(SUM(completion_tokens * (est_completion_tokens IS NOT NULL)) * 1.0
+                         / SUM(est_completion_tokens * (completion_tokens IS NOT NULL)), 3) AS completion_estimate_ratio,
+                   ROUND(SUM(cost_usd * (est_cost_usd IS NOT NULL)) * 1.0
+                         / SUM(est_cost_usd * (cost_usd IS NOT NULL)), 3) AS cost_estimate_ratio
+            FROM llm_route_log WHERE created_at >= ?
+            GROUP BY task, model ORDER BY task, MIN(position)
+        """, (since or "",)).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ── Backups ─────────────────────────────────────────────────────────────
+
+def backup_to(path: str) -> int:
+    """Consistent copy of the live database; returns the last change_log seq it contains."""
+    with _conn() as conn:
+        dest = sqlite3.connect(path)
+        try:
+            conn.backup(dest)
+            last_seq = dest.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+            dest.execute("DELETE FROM change_log")
+            dest.commit()
+        finally:
+            dest.close()
+    return last_seq
+
+
+def iter_changes():
+    """Yield (seq, record) for every row changed since the last clear_changes.
+
+    Each key appears once, with its current row, or row None if it was deleted.
+    All rows come from one read snapshot.
+    """
+    with _conn() as conn:
+        conn.execute("BEGIN")
+        try:
+            changed = conn.execute(
+                "SELECT tbl, pk, MAX(seq) AS seq FROM change_log GROUP BY tbl, pk ORDER BY seq"
+            ).fetchall()
+            for c in changed:
+                keys = BACKUP_KEYS[c["tbl"]]
+                values = json.loads(c["pk"])
+                where = " AND ".join(f"{k} = ?" for k in keys)
+                row = conn.execute(f"SELECT * FROM {c['tbl']} WHERE {where}", values).fetchone()
+                yield c["seq"], {
+                    "table": c["tbl"],
+                    "key": dict(zip(keys, values)),
+                    "row": dict(row) if row else None,
+                }
+        finally:
+            conn.rollback()
+
+
+def clear_changes(upto_seq: int):
+    with _conn() as conn:
+        conn.execute("DELETE FROM change_log WHERE seq <= ?", (upto_seq,))
+
+
+def _change_log_enabled(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'log\\_%' ESCAPE '\\')"
+    ).fetchone()[0]
+
+
+def _create_change_log_triggers(conn: sqlite3.Connection):
+    for table, keys in BACKUP_KEYS.items():
+        for event, rows in (("insert", ("NEW",)), ("update", ("OLD", "NEW")), ("delete", ("OLD",))):
+            logs = "".join(
+                f"INSERT INTO change_log (tbl, pk) VALUES ('{table}', "
+                f"json_array({', '.join(f'{row}.{k}' for k in keys)})); "
+                for row in rows
+            )
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS log_{table}_{event} "
+                         f"AFTER {event.upper()} ON {table} BEGIN {logs}END")
+
+
+def enable_change_log() -> bool:
+    """Start logging changed rows for incremental backups; True if it was off until now."""
+    with _conn() as conn:
+        enabled = _change_log_enabled(conn)
+        _create_change_log_triggers(conn)
+    return not enabled
+
+
+def oldest_change_seq() -> int | None:
+    with _conn() as conn:
+        return conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+
+
+def trim_change_log(keep: int) -> int:
+    """Drop all but the newest `keep` changes, e.g. when backups stopped running; returns rows dropped.
+
+    The next backup sees the gap in seq and starts a new chain.
+    """
+    with _conn() as conn:
+        newest = conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+        if newest is None:
+            return 0
+        return conn.execute("DELETE FROM change_log WHERE seq <= ?", (newest - keep,)).rowcount
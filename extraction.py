@@ -0,0 +1,122 @@
+"""Paper extraction, single-shot or map-reduce by document size.
+
+Short papers go to the LLM whole, as before. Long documents (theses,
+surveys) are split into page ranges that are extracted concurrently, at most
+CONCURRENCY at a time; a reduce call then merges their concepts and links and
+writes the overall summary from the section summaries. Map-reduce is used
+above MAP_REDUCE_PAGES pages or MAP_REDUCE_TOKENS estimated tokens, and as a
+fallback when a single-shot call fails on a document with several sections.
+"""
+import asyncio
+import base64
+import io
+import time
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.errors import PyPdfError
+
+import llm
+import preflight
+
+MAP_REDUCE_PAGES = 40
+MAP_REDUCE_TOKENS = 60_000
+SECTION_PAGES = 12
+CONCURRENCY = 4
+
+
+def inspect(pdf_bytes: bytes) -> tuple[int, int]:
+    """Page count and estimated text tokens (about 4 characters each)."""
+    return preflight.inspect_pdf(pdf_bytes)
+
+
+def choose_mode(pages: int, tokens: int) -> str:
+    return "map-reduce" if pages > MAP_REDUCE_PAGES or tokens > MAP_REDUCE_TOKENS else "single"
+
+
+def split(pdf_bytes: bytes, section_pages: int = SECTION_PAGES) -> list[tuple[int, int, bytes]]:
+    """(first page, last page, PDF bytes) per section, 1-based and inclusive."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    sections = []
+    for start in range(0, len(reader.pages), section_pages):
+        end = min(start + section_pages, len(reader.pages))
+        writer = PdfWriter()
+        for i in range(start, end):
+            writer.add_page(reader.pages[i])
+        out = io.BytesIO()
+        writer.write(out)
+        sections.append((start + 1, end, out.getvalue()))
+    return sections
+
+
+def _b64(data: bytes) -> str:
+    return base64.standard_b64encode(data).decode("utf-8")
+
+
+def _merge(sections: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Concepts deduplicated by name (longest description wins) and links by endpoints."""
+    concepts: dict[str, str] = {}
+    links: dict[tuple[str, str], str] = {}
+    for section in sections:
+        for c in section.get("concepts", []):
+            name = c.get("name", "").strip().lower()
+            if name and len(c.get("description", "")) >= len(concepts.get(name, "")):
+                concepts[name] = c.get("description", "")
+    # A link may point at a concept that only a later section introduces
+    for section in sections:
+        for link in section.get("concept_links", []):
+            a, b = link.get("from", "").strip().lower(), link.get("to", "").strip().lower()
+            if a in concepts and b in concepts and a != b:
+                links.setdefault((a, b), link.get("relationship", ""))
+    return ([{"name": n, "description": d} for n, d in concepts.items()],
+            [{"from": a, "to": b, "relationship": r} for (a, b), r in links.items()])
+
+
+async def map_reduce(pdf_bytes: bytes, task: str = "parse") -> dict:
+    parts = await asyncio.to_thread(split, pdf_bytes)
+    total = parts[-1][1]
+    limit = asyncio.Semaphore(CONCURRENCY)
+
+    async def extract(first: int, last: int, data: bytes) -> dict:
+        async with limit:
+            section = await llm.parse_section(_b64(data), first, last, total, task)
+        return {**section, "pages": f"{first}-{last}"}
+
+    sections = await asyncio.gather(*(extract(*part) for part in parts))
+    concepts, links = _merge(sections)
+    parsed = await llm.merge_sections(sections, concepts, links, task)
+    # Links the reduce step dropped are kept when both ends survived it
+    kept = {c.get("name", "").strip().lower() for c in parsed.get("concepts", [])}
+    seen = {(l.get("from", "").strip().lower(), l.get("to", "").strip().lower()) for l in parsed.get("concept_links", [])}
+    parsed["concept_links"] = parsed.get("concept_links", []) + [
+        l for l in links if l["from"] in kept and l["to"] in kept and (l["from"], l["to"]) not in seen
+    ]
+    return parsed
+
+
+async def extract(pdf_bytes: bytes, task: str = "parse", mode: str | None = None) -> dict:
+    """Structured paper data from a PDF; the shape of llm.parse_paper_with_llm.
+
+    mode forces "single" or "map-reduce"; by default it is picked from the
+    document's size. The mode used and its timing are returned under "_extraction".
+    """
+    start = time.perf_counter()
+    try:
+        pages, tokens = await asyncio.to_thread(inspect, pdf_bytes)
+    except PyPdfError:
+        # Encrypted or damaged: pypdf cannot split it, but the provider may still read it whole
+        pages = tokens = 0
+    mode = mode or choose_mode(pages, tokens)
+    if mode == "map-reduce":
+        parsed = await map_reduce(pdf_bytes, task)
+    else:
+        try:
+            parsed = await llm.parse_paper_with_llm(_b64(pdf_bytes), task=task)
+        except Exception:
+            # Typically a context-window overflow the estimate missed
+            if pages <= SECTION_PAGES:
+                raise
+            mode = "map-reduce"
+            parsed = await map_reduce(pdf_bytes, task)
+    parsed["_extraction"] = {"mode": mode, "pages": pages, "est_tokens": tokens,
+                             "latency_s": round(time.perf_counter() - start, 3)}
+    return parsed
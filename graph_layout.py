@@ -0,0 +1,127 @@
+"""Server-side force-directed layout for the knowledge graph.
+
+Positions are stored per concept so the graph page can render with ECharts'
+``layout: "none"`` instead of running a force simulation in the browser on
+every visit. When concepts are added, only the new nodes and their direct
+neighbours are relaxed, starting from the stored positions; everything else
+stays where the user last saw it.
+"""
+import numpy as np
+import db
+
+FULL_ITERATIONS = 150
+INCREMENTAL_ITERATIONS = 60
+# Above this share of unplaced concepts a full re-layout is cheaper and prettier
+FULL_RELAYOUT_RATIO = 0.5
+GRAVITY = 0.1
+_CHUNK = 1024
+# Workers take turns so a layout always sees the concepts the previous one wrote
+LEASE_TTL = 600
+
+
+def _relax(pos: np.ndarray, edges: np.ndarray, mobile: np.ndarray,
+           iterations: int, temperature: float) -> np.ndarray:
+    """Fruchterman-Reingold with unit ideal edge length, moving only `mobile` rows."""
+    pos = pos.copy()
+    n = len(pos)
+    if n < 2 or len(mobile) == 0:
+        return pos
+    cooling = temperature / iterations
+    for _ in range(iterations):
+        disp = np.zeros((len(mobile), 2))
+
+        # Repulsion k²/d from every node: Σ_j (p_i - p_j) / d²_ij, expanded so the
+        # heavy lifting is two BLAS products over a (chunk × n) block
+        sq = np.einsum("ij,ij->i", pos, pos)
+        pos32 = pos.astype(np.float32)
+        for start in range(0, len(mobile), _CHUNK):
+            rows = mobile[start:start + _CHUNK]
+            inv = pos32[rows] @ pos32.T
+            inv *= -2.0
+            inv += sq[rows, None].astype(np.float32)
+            inv += sq[None, :].astype(np.float32)
+            np.maximum(inv, 1e-4, out=inv)
+            np.reciprocal(inv, out=inv)
+            disp[start:start + _CHUNK] = pos[rows] * inv.sum(axis=1)[:, None] - inv @ pos32
+
+        # Attraction d²/k along edges, accumulated for both endpoints
+        if len(edges):
+            delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+            pull = delta * np.linalg.norm(delta, axis=1)[:, None]
+            full = np.zeros((n, 2))
+            np.add.at(full, edges[:, 0], -pull)
+            np.add.at(full, edges[:, 1], pull)
+            disp += full[mobile]
+
+        # Weak gravity keeps disconnected components from drifting apart
+        disp -= GRAVITY * pos[mobile]
+
+        length = np.linalg.norm(disp, axis=1)
+        length[length == 0] = 1e-9
+        pos[mobile] += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature = max(temperature - cooling, 1e-3)
+    return pos
+
+
+def compute_layout(concept_ids: list[int], links: list[tuple[int, int]],
+                   known: dict[int, tuple[float, float]], full: bool = False,
+                   seed: int = 0) -> dict[int, tuple[float, float]]:
+    """Return positions for every concept, warm-starting from `known`."""
+    n = len(concept_ids)
+    if n == 0:
+        return {}
+    rng = np.random.default_rng(seed)
+    index = {cid: i for i, cid in enumerate(concept_ids)}
+    edges = np.array(
+        [(index[a], index[b]) for a, b in links if a in index and b in index and a != b],
+        dtype=np.intp,
+    ).reshape(-1, 2)
+
+    placed = np.array([cid in known for cid in concept_ids])
+    if full or not placed.any() or (~placed).mean() > FULL_RELAYOUT_RATIO:
+        spread = np.sqrt(n)
+        pos = rng.uniform(-spread, spread, size=(n, 2))
+        if placed.any():
+            pos[placed] = [known[cid] for cid, p in zip(concept_ids, placed) if p]
+        mobile = np.arange(n)
+        pos = _relax(pos, edges, mobile, FULL_ITERATIONS, temperature=spread / 2)
+    else:
+        pos = np.zeros((n, 2))
+        pos[placed] = [known[cid] for cid, p in zip(concept_ids, placed) if p]
+        new = np.flatnonzero(~placed)
+
+        # Seed each new node at the centroid of its placed neighbours, or on the rim
+        radius = np.linalg.norm(pos[placed], axis=1).max() + 1.0
+        for i in new:
+            nbrs = np.concatenate([edges[edges[:, 0] == i, 1], edges[edges[:, 1] == i, 0]])
+            nbrs = nbrs[placed[nbrs]]
+            if len(nbrs):
+                pos[i] = pos[nbrs].mean(axis=0) + rng.normal(scale=0.5, size=2)
+            else:
+                angle = rng.uniform(0, 2 * np.pi)
+                pos[i] = radius * np.array([np.cos(angle), np.sin(angle)])
+
+        touches_new = (~placed[edges[:, 0]]) | (~placed[edges[:, 1]]) if len(edges) else np.array([], bool)
+        mobile = np.unique(np.concatenate([new, edges[touches_new].ravel()]))
+        pos = _relax(pos, edges, mobile, INCREMENTAL_ITERATIONS, temperature=1.0)
+
+    return {cid: (float(pos[i, 0]), float(pos[i, 1])) for cid, i in index.items()}
+
+
+def update_layout(full: bool = False) -> int:
+    """Place any concepts without a stored position. Returns how many were placed."""
+    token = db.acquire_lease("graph_layout", ttl=LEASE_TTL, wait=LEASE_TTL)
+    if token is None:
+        return 0
+    try:
+        concept_ids = [c["id"] for c in db.list_concepts()]
+        known = db.get_concept_positions()
+        missing = [cid for cid in concept_ids if cid not in known]
+        if not missing and not full:
+            return 0
+        links = [(link["concept_a"], link["concept_b"]) for link in db.get_all_concept_links()]
+        positions = compute_layout(concept_ids, links, known, full=full)
+        db.save_concept_positions(positions)
+        return len(missing)
+    finally:
+        db.release_lease("graph_layout", token)
@@ -0,0 +1,143 @@
+"""Centrality and communities of the concept graph, cached in concept_metrics.
+
+The graph is one sparse symmetric matrix of link weights (the number of
+papers stating each link). From it, in vectorised passes:
+
+- degree: distinct neighbours; strength: summed link weight
+- PageRank by power iteration, with dangling concepts spreading evenly
+- communities by synchronous label propagation: each round every concept
+  takes the label with the most weight among itself and its neighbours,
+  computed as one sparse product with the one-hot label matrix
+
+importance is PageRank scaled to the most central concept, and sizes nodes
+on the graph page. Communities are numbered by size, largest first.
+
+Recomputing touches every concept, so refresh() skips it until the links
+changed since the last run reach CHANGE_RATIO of the graph.
+
+    python graph_metrics.py          # recompute now
+    python graph_metrics.py --top 20 # and print the most central concepts
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+import db
+
+CHANGE_RATIO = 0.05
+DAMPING = 0.85
+PAGERANK_TOL = 1e-8
+PAGERANK_ITERATIONS = 100
+PROPAGATION_ITERATIONS = 20
+LEASE_TTL = 600
+
+
+def _adjacency(concept_ids: list[int], links: list[tuple[int, int, int]]) -> sparse.csr_matrix:
+    n = len(concept_ids)
+    edges = np.array(links, dtype=np.int64).reshape(-1, 3)
+    ids = np.array(concept_ids, dtype=np.int64)
+    rows, cols = np.searchsorted(ids, edges[:, 0]), np.searchsorted(ids, edges[:, 1])
+    w = sparse.coo_matrix((edges[:, 2].astype(np.float64), (rows, cols)), shape=(n, n))
+    return sparse.csr_matrix(w + w.T)
+
+
+def pagerank(w: sparse.csr_matrix) -> np.ndarray:
+    n = w.shape[0]
+    strength = np.asarray(w.sum(axis=1)).ravel()
+    dangling = strength == 0
+    inv = np.divide(1.0, strength, out=np.zeros(n), where=~dangling)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_ITERATIONS):
+        new = DAMPING * (w.T @ (rank * inv)) + (DAMPING * rank[dangling].sum() + 1 - DAMPING) / n
+        if np.abs(new - rank).sum() < PAGERANK_TOL:
+            return new
+        rank = new
+    return rank
+
+
+def communities(w: sparse.csr_matrix) -> np.ndarray:
+    n = w.shape[0]
+    # The self-loop keeps a concept's own label in the running, which stops
+    # synchronous updates from flip-flopping between two labels
+    m = sparse.csr_matrix(w + sparse.identity(n, format="csr"))
+    labels = np.arange(n)
+    for _ in range(PROPAGATION_ITERATIONS):
+        onehot = sparse.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, n))
+        scores = sparse.csr_matrix(m @ onehot)
+        scores.sum_duplicates()
+        # Row-wise argmax over the stored entries (every row has one, its own label),
+        # lowest label on ties; scipy's argmax loops over rows in Python
+        starts = scores.indptr[:-1]
+        best = np.maximum.reduceat(scores.data, starts)
+        top = scores.data == np.repeat(best, np.diff(scores.indptr))
+        new = np.minimum.reduceat(np.where(top, scores.indices, n), starts)
+        if np.array_equal(new, labels):
+            break
+        labels = new
+    _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(counts), dtype=np.int64)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(len(counts))
+    return rank[inverse]
+
+
+def compute(concept_ids: list[int], links: list[tuple[int, int, int]]) -> list[tuple]:
+    """(concept_id, degree, strength, pagerank, importance, community) for every concept."""
+    if not concept_ids:
+        return []
+    w = _adjacency(concept_ids, links)
+    degree = np.diff(w.indptr)
+    strength = np.asarray(w.sum(axis=1)).ravel()
+    rank = pagerank(w)
+    # Rounded so a recompute that barely moves a concept leaves its row, and the graph version, alone
+    importance = np.round(rank / rank.max(), 3)
+    community = communities(w)
+    return [(int(c), int(d), float(s), float(p), float(i), int(k))
+            for c, d, s, p, i, k in zip(concept_ids, degree, strength, rank, importance, community)]
+
+
+def due(state: dict) -> bool:
+    return state["version"] is None or state["changed_links"] >= max(1, CHANGE_RATIO * state["links"])
+
+
+def refresh(force: bool = False) -> dict | None:
+    """Recompute the metrics if the graph changed enough since the last run (or with force).
+
+    Returns the run's summary, or None if nothing was due or another worker is on it.
+    """
+    if not force and not due(db.get_graph_metrics_state()):
+        return None
+    token = db.acquire_lease("graph_metrics", ttl=LEASE_TTL)
+    if token is None:
+        return None
+    try:
+        start = time.perf_counter()
+        graph = db.get_weighted_graph()
+        rows = compute(graph["concept_ids"], graph["links"])
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        db.save_concept_metrics(graph["version"], rows, len(graph["links"]), duration_ms)
+        return {"version": graph["version"], "nodes": len(rows), "links": len(graph["links"]),
+                "communities": len({r[5] for r in rows}), "duration_ms": duration_ms}
+    finally:
+        db.release_lease("graph_metrics", token)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=0, help="print this many of the most central concepts")
+    args = parser.parse_args(argv)
+    db.init_db()
+    result = {"run": refresh(force=True)}
+    if args.top:
+        top = db.get_top_concepts_subgraph(args.top)["nodes"]
+        result["top"] = [{"id": n["id"], "name": n["name"], "importance": n["importance"],
+                          "community": n["community"]} for n in sorted(top, key=lambda n: -n["importance"])]
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
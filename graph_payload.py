@@ -0,0 +1,127 @@
+"""Versioned ECharts payload of the concept graph, served at /api/graph.
+
+Triggers record in graph_changes the graph version at which each concept and
+link last changed (see db.GRAPH_TRIGGERS). The full payload is serialised
+once per version and cached. With ?since=<version>, the response holds only
+the nodes and links changed after that version, plus the ids of those
+deleted. Nodes are sized by importance (see graph_metrics.py) and carry
+their community; links carry their weight. Every response has an ETag
+naming the version(s) it describes, so a client revalidating with
+If-None-Match gets a 304 until the graph changes. Checking costs one indexed
+MAX() query.
+"""
+import asyncio
+import json
+import math
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+import db
+
+_cache: dict = {"version": None, "body": b""}
+
+
+# Colours of the largest communities; the rest share the last one
+COMMUNITY_COLORS = ["#6366f1", "#f97316", "#14b8a6", "#ec4899", "#84cc16", "#0ea5e9", "#a855f7", "#f59e0b",
+                    "#10b981", "#94a3b8"]
+
+
+def node(n: dict, color_by: str = "confidence") -> dict:
+    conf = n["confidence"]
+    return {
+        "id": str(n["id"]),
+        "name": n["name"],
+        "x": n["x"] or 0.0,
+        "y": n["y"] or 0.0,
+        "symbolSize": 10 + 40 * math.sqrt(n["importance"]),
+        "value": n["description"],
+        "confidence": conf,
+        "importance": n["importance"],
+        "community": n["community"],
+        "itemStyle": {"color": community_color(n["community"]) if color_by == "community"
+                      else confidence_color(conf)},
+    }
+
+
+def edge(link: dict) -> dict:
+    return {
+        "source": str(link["concept_a"]),
+        "target": str(link["concept_b"]),
+        "value": link["relationship"],
+        "weight": link["weight"],
+        "lineStyle": {"width": 1 + math.log2(link["weight"])},
+    }
+
+
+def confidence_color(conf: float) -> str:
+    if conf == 0.0:
+        return "#94a3b8"  # gray for untested
+    if conf < 0.33:
+        return "#ef4444"
+    elif conf < 0.66:
+        return "#eab308"
+    return "#22c55e"
+
+
+def community_color(community: int | None) -> str:
+    if community is None:
+        return COMMUNITY_COLORS[-1]
+    return COMMUNITY_COLORS[min(community, len(COMMUNITY_COLORS) - 1)]
+
+
+def _encode(payload: dict) -> bytes:
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+def full() -> tuple[int, bytes]:
+    """(version, JSON body) of the whole graph, rebuilt only when the version moved."""
+    version = db.get_graph_version()
+    if _cache["version"] != version:
+        graph = db.get_graph()
+        _cache["body"] = _encode({"version": graph["version"], "nodes": [node(n) for n in graph["nodes"]],
+                                  "links": [edge(link) for link in graph["links"]]})
+        _cache["version"] = graph["version"]
+    return _cache["version"], _cache["body"]
+
+
+def changes(since: int, color_by: str = "confidence") -> dict:
+    """What changed after `since`, in payload form."""
+    diff = db.get_graph_changes(since)
+    return {
+        "version": diff["version"],
+        "since": since,
+        "nodes": [node(n, color_by) for n in diff["nodes"]],
+        "links": [edge(link) for link in diff["links"]],
+        "removed_nodes": [str(i) for i in diff["removed_nodes"]],
+        "removed_links": [[str(a), str(b)] for a, b in diff["removed_links"]],
+    }
+
+
+def _etag(*versions: int) -> str:
+    return '"graph-' + "-".join(map(str, versions)) + '"'
+
+
+async def respond(request: Request) -> Response:
+    headers = {"Cache-Control": "no-cache"}
+    since = request.query_params.get("since")
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return Response("since must be an integer version", status_code=400)
+
+    version = await asyncio.to_thread(db.get_graph_version)
+    if since is not None and since > version:
+        since = None  # a version from before a restore; start over
+    etag = _etag(version) if since is None else _etag(since, version)
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    if since is None:
+        version, body = await asyncio.to_thread(full)
+        etag = _etag(version)
+    else:
+        payload = await asyncio.to_thread(changes, since)
+        body = _encode(payload)
+        etag = _etag(since, payload["version"])
+    return Response(body, media_type="application/json", headers={**headers, "ETag": etag})
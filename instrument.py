@@ -0,0 +1,284 @@
+"""Per-page and per-event profiling of db.* and llm.* calls.
+
+install() wraps every public function of db and llm. Each call is timed into
+a per-function histogram and attributed to the scope that made it: the HTTP
+route being rendered, or the UI event handler that is running. Attribution
+follows the call into threads and tasks started from the scope, since both
+copy the context. Nested db calls (one db function calling another) count once.
+
+render() produces the Prometheus text format served at /metrics. A scope that
+makes more than SLOW_PAGE_QUERIES db calls or takes longer than SLOW_PAGE_MS
+is logged as a warning.
+"""
+import functools
+import inspect
+import logging
+import sys
+import threading
+import time
+from contextvars import ContextVar
+
+import config
+
+log = logging.getLogger("papermind.instrument")
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_scope: ContextVar[dict | None] = ContextVar("papermind_scope", default=None)
+_in_call: ContextVar[frozenset] = ContextVar("papermind_in_call", default=frozenset())
+_lock = threading.Lock()
+_last_activity = time.monotonic()
+_active = 0
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets: tuple):
+        self.name, self.help, self.label, self.buckets = name, help, label, buckets
+        self.series: dict[str, list] = {}  # label value -> [bucket counts..., sum, count]
+
+    def observe(self, label: str, value: float):
+        with _lock:
+            s = self.series.get(label)
+            if s is None:
+                s = self.series[label] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            series = {k: list(v) for k, v in self.series.items()}
+        for value, s in sorted(series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+            for bound, count in zip(self.buckets, s):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {s[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {s[-2]}")
+            lines.append(f"{self.name}_count{{{label}}} {s[-1]}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+CALL_SECONDS = {
+    "db": Histogram("papermind_db_call_seconds", "Duration of db.* calls.", "function", DURATION_BUCKETS),
+    "llm": Histogram("papermind_llm_call_seconds", "Duration of llm.* calls.", "function", DURATION_BUCKETS),
+}
+SCOPE_SECONDS = Histogram("papermind_scope_seconds", "Duration of page renders and event handlers.", "scope",
+                          DURATION_BUCKETS)
+SCOPE_DB_CALLS = Histogram("papermind_scope_db_calls", "db.* calls per page render or event handler.", "scope",
+                           QUERY_BUCKETS)
+SCOPE_DB_SECONDS = Histogram("papermind_scope_db_seconds", "Time in db.* calls per page render or event handler.",
+                             "scope", DURATION_BUCKETS)
+SCOPE_LLM_CALLS = Histogram("papermind_scope_llm_calls", "llm.* calls per page render or event handler.", "scope",
+                            QUERY_BUCKETS)
+
+
+# ── Wrapping ────────────────────────────────────────────────────────────
+
+def _record(kind: str, name: str, elapsed: float):
+    CALL_SECONDS[kind].observe(name, elapsed)
+    scope = _scope.get()
+    if scope is not None:
+        scope[kind + "_calls"] += 1
+        scope[kind + "_seconds"] += elapsed
+
+
+def _wrap(kind: str, fn):
+    name = fn.__name__
+
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def agen(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                async for item in fn(*args, **kwargs):
+                    yield item
+            finally:
+                _record(kind, name, time.perf_counter() - start)
+        return agen
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def coro(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _record(kind, name, time.perf_counter() - start)
+        return coro
+
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        inside = _in_call.get()
+        if kind in inside:
+            return fn(*args, **kwargs)
+        token = _in_call.set(inside | {kind})
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record(kind, name, time.perf_counter() - start)
+            _in_call.reset(token)
+    return call
+
+
+def _instrument_module(kind: str, module):
+    for attr, fn in list(vars(module).items()):
+        if (attr.startswith("_") or not inspect.isfunction(fn) or fn.__module__ != module.__name__
+                or inspect.isgeneratorfunction(fn) or getattr(fn, "__wrapped__", None)):
+            continue
+        setattr(module, attr, _wrap(kind, fn))
+
+
+# ── Scopes ──────────────────────────────────────────────────────────────
+
+def _begin(name: str) -> tuple:
+    global _last_activity, _active
+    _last_activity = time.monotonic()
+    _active += 1
+    scope = {"name": name, "db_calls": 0, "db_seconds": 0.0, "llm_calls": 0, "llm_seconds": 0.0,
+             "start": time.perf_counter()}
+    return _scope.set(scope), scope
+
+
+def _end(scope: dict):
+    global _last_activity, _active
+    _last_activity = time.monotonic()
+    _active -= 1
+    if scope.get("delegated"):
+        return
+    elapsed = time.perf_counter() - scope["start"]
+    name = scope["name"]
+    SCOPE_SECONDS.observe(name, elapsed)
+    SCOPE_DB_CALLS.observe(name, scope["db_calls"])
+    SCOPE_DB_SECONDS.observe(name, scope["db_seconds"])
+    SCOPE_LLM_CALLS.observe(name, scope["llm_calls"])
+    # LLM time is expected to be long; only the rest counts towards a slow page
+    own_ms = (elapsed - scope["llm_seconds"]) * 1000
+    if scope["db_calls"] > config.SLOW_PAGE_QUERIES or own_ms > config.SLOW_PAGE_MS:
+        log.warning("slow %s: %.0f ms (%.0f ms in %d db calls, %.0f ms in %d llm calls)", name, elapsed * 1000,
+                    scope["db_seconds"] * 1000, scope["db_calls"], scope["llm_seconds"] * 1000, scope["llm_calls"])
+
+
+def idle_seconds() -> float:
+    """Seconds since the last page request or UI event in this process finished."""
+    return 0.0 if _active else time.monotonic() - _last_activity
+
+
+class ScopeMiddleware:
+    """ASGI middleware that makes each HTTP request, e.g. a page render, a scope."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/_nicegui"):
+            return await self.app(scope, receive, send)
+        token, stats = _begin(scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _scope.reset(token)
+            # Label by route template (/paper/{paper_id}), not by every concrete URL
+            route = scope.get("route")
+            stats["name"] = f"{scope['method']} {getattr(route, 'path', None) or 'unmatched'}"
+            _end(stats)
+
+
+def _handler_name(handler) -> str:
+    fn = getattr(handler, "func", handler)  # functools.partial
+    qualname = getattr(fn, "__qualname__", type(fn).__name__).replace("<locals>.", "")
+    return f"event {getattr(fn, '__module__', '?')}:{qualname}"
+
+
+def _instrument_events():
+    from nicegui import events, helpers
+    original = events.handle_event
+
+    def handle_event(handler, arguments, **kwargs):
+        # Other calls are NiceGUI's own bookkeeping, e.g. prop and class updates
+        if handler is None or not isinstance(arguments, events.UiEventArguments):
+            return original(handler, arguments, **kwargs)
+        name = _handler_name(handler)
+
+        def run(*args):
+            outer = _scope.get()
+            if outer is not None and outer.get("event"):
+                # A listener handing over to the user's handler, e.g. Button's click lambda
+                # calling on_click: the handler's scope replaces the listener's
+                outer["delegated"] = True
+            token, stats = _begin(name)
+            stats["event"] = True
+            try:
+                result = handler(*args)
+            except BaseException:
+                _end(stats)
+                raise
+            finally:
+                _scope.reset(token)
+            if not helpers.should_await(result):
+                _end(stats)
+                return result
+
+            async def finish():
+                # Runs as its own task, with its own copy of the context
+                _scope.set(stats)
+                try:
+                    return await result
+                finally:
+                    _end(stats)
+            return finish()
+
+        # Same arity as the handler, so NiceGUI passes the arguments exactly when it would have
+        expect_args = kwargs.pop("expect_args", None)
+        if expect_args is None:
+            expect_args = helpers.expects_arguments(handler)
+        traced = (lambda e: run(e)) if expect_args else (lambda: run())
+        return original(traced, arguments, **kwargs)
+
+    # Elements import handle_event by name (Button, ValueElement, ...), so replace every reference
+    for module in list(sys.modules.values()):
+        if module is not None and module.__name__.startswith("nicegui") and \
+                getattr(module, "handle_event", None) is original:
+            module.handle_event = handle_event
+
+
+def install(app=None):
+    """Wrap db and llm, and when given the app, make its requests and UI events scopes."""
+    import db
+    import llm
+    _instrument_module("db", db)
+    _instrument_module("llm", llm)
+    if app is not None:
+        app.add_middleware(ScopeMiddleware)
+        _instrument_events()
+
+
+# ── Exposition ──────────────────────────────────────────────────────────
+
+def render() -> str:
+    import db
+    import llm
+    import prewarm
+    lines = []
+    for histogram in (SCOPE_SECONDS, SCOPE_DB_CALLS, SCOPE_DB_SECONDS, SCOPE_LLM_CALLS, *CALL_SECONDS.values()):
+        lines += histogram.render()
+    lines += ["# HELP papermind_llm_requests_total LLM requests by outcome.",
+              "# TYPE papermind_llm_requests_total counter"]
+    lines += [f'papermind_llm_requests_total{{outcome="{k}"}} {v}' for k, v in llm.metrics().items()]
+    lines += ["# HELP papermind_prewarm_total Speculative chat openers by outcome.",
+              "# TYPE papermind_prewarm_total counter"]
+    lines += [f'papermind_prewarm_total{{outcome="{k}"}} {v}' for k, v in prewarm.metrics().items()]
+    storage = db.storage_info()
+    for key, help in (("file_bytes", "Database file size."), ("wal_bytes", "WAL file size."),
+                      ("page_count", "Pages in the database."), ("freelist_count", "Unused pages in the database.")):
+        lines += [f"# HELP papermind_db_{key} {help}", f"# TYPE papermind_db_{key} gauge",
+                  f"papermind_db_{key} {storage[key]}"]
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,249 @@
+import asyncio
+import functools
+import hashlib
 import json
-import litellm
-from config import LITELLM_MODEL
+import threading
+import time
+from collections import Counter
+import preflight
+import routing
 
-litellm.drop_params = True
+# litellm is imported on first use: the import is slow and fetches model cost
+# maps, which would otherwise delay every process start.
+_litellm = None
+_import_lock = threading.Lock()
+
+
+def _load_litellm():
+    global _litellm
+    with _import_lock:
+        if _litellm is None:
+            import litellm
+            litellm.drop_params = True
+            _litellm = litellm
+    return _litellm
+
+
+def warm_up():
+    """Import the LLM stack now, e.g. from a thread once the server is listening."""
+    _load_litellm()
+
+
+async def _acompletion(**kwargs):
+    lib = _litellm or await asyncio.to_thread(_load_litellm)
+    return await lib.acompletion(**kwargs)
+
+
+# ── Routing ─────────────────────────────────────────────────────────────
+
+def _usage_cost(model: str, usage) -> tuple[int | None, int | None, float | None]:
+    if usage is None:
+        return None, None, None
+    prompt, completion = usage.prompt_tokens, usage.completion_tokens
+    try:
+        cost = sum(_litellm.cost_per_token(model=model, prompt_tokens=prompt, completion_tokens=completion))
+    except Exception:
+        cost = None  # model missing from litellm's price map
+    return prompt, completion, cost
+
+
+@functools.cache
+def _model_info(model: str) -> dict:
+    """Context window and prices from litellm's model map; empty for models it does not know."""
+    try:
+        return dict(_load_litellm().get_model_info(model))
+    except Exception:
+        return {}
+
+
+def estimate_cost(task: str, prompt_tokens: int, completion_tokens: int) -> float | None:
+    """Price of a call on the task's first model, or None if litellm does not know the model."""
+    return preflight.cost(_model_info(routing.models(task)[0]), prompt_tokens, completion_tokens)
+
+
+async def _preflight(task: str, model: str, kwargs: dict) -> tuple[dict, dict]:
+    """kwargs with messages trimmed to `model`'s budget, and the estimate. Raises preflight.BudgetExceeded."""
+    info = await asyncio.to_thread(_model_info, model)
+    messages, estimate = await asyncio.to_thread(
+        preflight.plan, task, kwargs["messages"], kwargs.get("max_tokens"), info,
+    )
+    return {**kwargs, "messages": messages}, estimate
+
+
+def _rejected(task: str, error: preflight.BudgetExceeded) -> preflight.BudgetExceeded:
+    routing.record_rejected(task, str(error))
+    return error
+
+
+async def _routed(task: str, **kwargs):
+    """acompletion() on the task's route, falling back to the next model on error.
+
+    Each model's request is planned against its own context window and price,
+    so a fallback with a smaller window gets a request trimmed to fit it.
+    """
+    route = routing.models(task)
+    reason = "primary"
+    over_budget = None
+    for position, model in enumerate(route):
+        skipped = routing.skip_reason(task, position)
+        if skipped:
+            reason = f"{model} skipped: {skipped}"
+            continue
+        try:
+            call, estimate = await _preflight(task, model, kwargs)
+        except preflight.BudgetExceeded as e:
+            over_budget = over_budget or e
+            reason = f"{model} skipped: over budget"
+            continue
+        start = time.perf_counter()
+        try:
+            response = await _acompletion(model=model, **call)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            routing.record_failed(task, position, e, elapsed)
+            if position == len(route) - 1:
+                raise
+            reason = f"{model} failed: {type(e).__name__}"
+            continue
+        elapsed = time.perf_counter() - start
+        routing.record_used(task, position, reason, elapsed, elapsed,
+                            *_usage_cost(model, getattr(response, "usage", None)), estimate)
+        return response
+    if over_budget:
+        raise _rejected(task, over_budget)
+
+
+async def _routed_stream(task: str, **kwargs):
+    """Stream chunks from the task's route.
+
+    Falls back only until the first chunk arrives; after that the user is
+    already reading the answer. Latency is time to first chunk. Requests are
+    planned per model, as in _routed.
+    """
+    route = routing.models(task)
+    reason = "primary"
+    over_budget = None
+    for position, model in enumerate(route):
+        skipped = routing.skip_reason(task, position)
+        if skipped:
+            reason = f"{model} skipped: {skipped}"
+            continue
+        try:
+            call, estimate = await _preflight(task, model, kwargs)
+        except preflight.BudgetExceeded as e:
+            over_budget = over_budget or e
+            reason = f"{model} skipped: over budget"
+            continue
+        start = time.perf_counter()
+        response = None
+        try:
+            try:
+                response = await _acompletion(model=model, stream=True, stream_options={"include_usage": True},
+                                              **call)
+                first = await anext(response, None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                routing.record_failed(task, position, e, time.perf_counter() - start)
+                if position == len(route) - 1:
+                    raise
+                reason = f"{model} failed: {type(e).__name__}"
+                continue
+            first_latency = time.perf_counter() - start
+            if first is None:
+                routing.record_used(task, position, reason, first_latency, first_latency, estimate=estimate)
+                return
+            usage = getattr(first, "usage", None)
+            yield first
+            async for chunk in response:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+            routing.record_used(task, position, reason, first_latency, time.perf_counter() - start,
+                                *_usage_cost(model, usage), estimate)
+            return
+        finally:
+            # Closing the HTTP stream is what stops the provider generating (and billing)
+            if response is not None:
+                await response.aclose()
+    if over_budget:
+        raise _rejected(task, over_budget)
+
+
+# ── Cancellation & coalescing ───────────────────────────────────────────
+
+# upstream: calls sent to the provider; coalesced: callers served by another
+# caller's identical in-flight call; cancelled: calls aborted because every
+# tab waiting on them went away
+METRICS = Counter()
+_inflight: dict[str, tuple[asyncio.Task, list[int]]] = {}
+_client_tasks: dict[str, set[asyncio.Task]] = {}
+
+
+def _bind_to_client():
+    """Cancel the calling task once the browser tab that started it is gone.
+
+    Tied to client deletion rather than disconnect, so a brief network drop
+    that reconnects within NiceGUI's reconnect timeout does not abort anything.
+    """
+    try:
+        from nicegui import context
+        client = context.client
+    except RuntimeError:
+        return  # not running on behalf of a page, e.g. a startup task
+    task = asyncio.current_task()
+    if client.id not in _client_tasks:
+        _client_tasks[client.id] = set()
+
+        def cancel_all():
+            for t in _client_tasks.pop(client.id, ()):
+                t.cancel()
+        client.on_delete(cancel_all)
+    tasks = _client_tasks[client.id]
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+def _request_key(task: str, payload) -> str:
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return f"{task}:{','.join(routing.models(task))}:{digest}"
+
+
+async def _single_flight(key: str, factory):
+    """Await factory() shared with every concurrent caller passing the same key.
+
+    The upstream call runs in its own task; it is cancelled only when the
+    last caller waiting on it is.
+    """
+    _bind_to_client()
+    entry = _inflight.get(key)
+    if entry is None:
+        METRICS["upstream"] += 1
+        task = asyncio.ensure_future(factory())
+        entry = _inflight[key] = (task, [0])
+
+        def forget(t: asyncio.Task):
+            if _inflight.get(key, (None,))[0] is t:
+                del _inflight[key]
+        task.add_done_callback(forget)
+    else:
+        METRICS["coalesced"] += 1
+    task, waiters = entry
+    waiters[0] += 1
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if waiters[0] == 1 and not task.done():
+            task.cancel()
+            METRICS["cancelled"] += 1
+        raise
+    finally:
+        waiters[0] -= 1
+
+
+def metrics() -> dict[str, int]:
+    return {name: METRICS[name] for name in ("upstream", "coalesced", "cancelled")}
 
 PARSE_PAPER_SYSTEM = """You are an academic paper analysis assistant. Given a research paper, extract structured information as JSON.
 
@@ -27,6 +268,49 @@ Guidelines:
 - The summary MUST be at least 300 words. Be thorough and detailed — this is the user's primary way of understanding the paper. Tailor it to a student with a masters in computer science. Assume familiarity with CS fundamentals but not necessarily with the paper's specific subfield. Explain what the paper does, why it matters, how it works, and what it found. Include specific details about methods and results, not just high-level descriptions
 - If information is not found, use empty string or empty list as appropriate"""
 
+PARSE_SECTION_SYSTEM = """You are an academic paper analysis assistant. You are given one section (a page range) of a long research document, such as a thesis or survey. Other sections are analysed separately and merged afterwards.
+
+Return ONLY valid JSON with these fields:
+{
+  "title": "Full document title, if it appears in this section, else empty string",
+  "authors": ["Authors, if listed in this section, else an empty list"],
+  "abstract": "The document's abstract, if it appears in this section, else empty string",
+  "section_summary": "A detailed summary of this section (150-250 words): what it covers, the methods, and the results or arguments it presents",
+  "concepts": [
+    {"name": "concept name (lowercase, canonical)", "description": "Brief description of this concept as used in the document"}
+  ],
+  "concept_links": [
+    {"from": "concept_a name", "to": "concept_b name", "relationship": "brief description of relationship"}
+  ]
+}
+
+Guidelines:
+- Extract the 5-15 concepts most central to this section
+- Use canonical, lowercase concept names (e.g., "transformer" not "Transformers architecture")
+- Concept links should capture meaningful relationships (e.g., "extends", "is a type of", "improves upon")"""
+
+MERGE_SECTIONS_SYSTEM = """You are an academic paper analysis assistant. A long research document was analysed section by section. You are given each section's summary and the concepts and concept links found across all sections.
+
+Return ONLY valid JSON with these fields:
+{
+  "title": "Full document title",
+  "authors": ["Author One", "Author Two"],
+  "abstract": "The document's abstract",
+  "summary": "A LONG, detailed summary of the whole document, at least 400 words across 4-5 paragraphs: the problem and why it matters, the approach and key technical ideas, the main results, and limitations and implications. Use newlines between paragraphs.",
+  "concepts": [
+    {"name": "concept name (lowercase, canonical)", "description": "Brief description of this concept as used in the document"}
+  ],
+  "concept_links": [
+    {"from": "concept_a name", "to": "concept_b name", "relationship": "brief description of relationship"}
+  ]
+}
+
+Guidelines:
+- Keep the 10-25 concepts most important to the document as a whole; merge near-duplicates under one canonical lowercase name
+- Keep links between kept concepts, renamed to match, and add links across sections where the summaries support them
+- Tailor the summary to a student with a masters in computer science
+- If information is not found, use empty string or empty list as appropriate"""
+
 TEACH_SYSTEM = """You are the Teach agent in PaperMind — a patient, knowledgeable research mentor.
 
 Your role:
@@ -58,6 +342,16 @@ Start by asking a challenging question about the paper's core contribution or me
 
 Paper context will be provided in the first user message."""
 
+LIBRARY_SYSTEM = """You are the Teach agent in PaperMind, answering questions across the user's whole library of research papers.
+
+Each user message comes with numbered excerpts retrieved from the library, like "[3] Paper title: excerpt".
+
+Your role:
+- Answer from the excerpts, and cite every claim that relies on one with its number in square brackets, e.g. [2] or [1][4]
+- Compare and connect papers when several are relevant
+- Say plainly when the excerpts do not cover the question, then answer from general knowledge without citations
+- Never invent citation numbers that were not provided"""
+
 ASSESS_KNOWLEDGE_SYSTEM = """You are a knowledge assessment system. Given a conversation between a student and an examiner about a research paper, assess the student's understanding of each concept discussed.
 
 Return ONLY valid JSON:
@@ -75,12 +369,20 @@ Confidence scale:
 - 0.8-1.0: Strong, nuanced understanding"""
 
 
-async def parse_paper_with_llm(pdf_base64: str) -> dict:
-    """Send PDF directly to LLM via LiteLLM document understanding."""
+async def parse_paper_with_llm(pdf_base64: str, task: str = "parse") -> dict:
+    """Send PDF directly to LLM via LiteLLM document understanding.
+
+    task is "parse" for ingest, "summary" when regenerating an existing paper's
+    summary and "reextract" for bulk re-extraction.
+    """
+    return await _single_flight(_request_key(task, pdf_base64), lambda: _parse_paper(pdf_base64, task))
+
+
+async def _parse_paper(pdf_base64: str, task: str) -> dict:
     for attempt in range(3):
         try:
-            response = await litellm.acompletion(
-                model=LITELLM_MODEL,
+            response = await _routed(
+                task,
                 messages=[
                     {"role": "system", "content": PARSE_PAPER_SYSTEM},
                     {"role": "user", "content": [
@@ -104,20 +406,90 @@ async def parse_paper_with_llm(pdf_base64: str) -> dict:
             continue
 
 
-async def stream_chat_response(messages: list[dict], system_prompt: str):
-    response = await litellm.acompletion(
-        model=LITELLM_MODEL,
+async def _routed_json(task: str, messages: list[dict]) -> dict:
+    for attempt in range(3):
+        try:
+            response = await _routed(task, messages=messages, response_format={"type": "json_object"},
+                                     temperature=0.1)
+            return json.loads(response.choices[0].message.content)
+        except (json.JSONDecodeError, KeyError):
+            if attempt == 2:
+                raise
+
+
+async def parse_section(pdf_base64: str, first_page: int, last_page: int, total_pages: int,
+                        task: str = "parse") -> dict:
+    """Map step of long-document extraction: one page range, sent as its own PDF."""
+    return await _routed_json(task, [
+        {"role": "system", "content": PARSE_SECTION_SYSTEM},
+        {"role": "user", "content": [
+            {"type": "text", "text": f"This is pages {first_page}-{last_page} of a {total_pages}-page document."},
+            {"type": "file", "file": {"file_data": f"data:application/pdf;base64,{pdf_base64}"}},
+        ]},
+    ])
+
+
+async def merge_sections(sections: list[dict], concepts: list[dict], concept_links: list[dict],
+                         task: str = "parse") -> dict:
+    """Reduce step of long-document extraction; returns the same shape as parse_paper_with_llm."""
+    outline = "\n\n".join(
+        f"[Pages {s['pages']}]\n{s.get('section_summary', '')}" for s in sections
+    )
+    front = next((s for s in sections if s.get("title")), sections[0])
+    return await _routed_json(task, [
+        {"role": "system", "content": MERGE_SECTIONS_SYSTEM},
+        {"role": "user", "content": (
+            f"Title: {front.get('title', '')}\n"
+            f"Authors: {', '.join(front.get('authors', []))}\n"
+            f"Abstract: {front.get('abstract', '')}\n\n"
+            f"Section summaries:\n{outline}\n\n"
+            f"Concepts:\n{json.dumps(concepts)}\n\n"
+            f"Concept links:\n{json.dumps(concept_links)}"
+        )},
+    ])
+
+
+async def stream_chat_response(messages: list[dict], system_prompt: str, task: str = "chat-teach"):
+    # Streams are never coalesced: each belongs to one conversation in one tab
+    _bind_to_client()
+    METRICS["upstream"] += 1
+    chunks = _routed_stream(
+        task,
         messages=[{"role": "system", "content": system_prompt}] + messages,
-        stream=True,
         temperature=0.7,
     )
-    async for chunk in response:
-        delta = chunk.choices[0].delta
-        if delta.content:
-            yield delta.content
+    try:
+        async for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except asyncio.CancelledError:
+        METRICS["cancelled"] += 1
+        raise
+    finally:
+        await chunks.aclose()
+
+
+async def complete_chat(messages: list[dict], system_prompt: str, task: str = "chat-teach",
+                        max_tokens: int | None = None) -> str:
+    """A whole chat reply at once, for replies prepared before anyone is reading them."""
+    METRICS["upstream"] += 1
+    response = await _routed(
+        task,
+        messages=[{"role": "system", "content": system_prompt}] + messages,
+        temperature=0.7,
+        max_tokens=max_tokens,
+    )
+    return response.choices[0].message.content or ""
 
 
 async def assess_knowledge(messages: list[dict], paper_concepts: list[str]) -> list[dict]:
+    return await _single_flight(
+        _request_key("assess", [messages, paper_concepts]),
+        lambda: _assess_knowledge(messages, paper_concepts),
+    )
+
+
+async def _assess_knowledge(messages: list[dict], paper_concepts: list[str]) -> list[dict]:
     conversation_text = "\n".join(
         f"{'Student' if m['role'] == 'user' else 'Examiner'}: {m['content']}"
         for m in messages if m["role"] in ("user", "assistant")
@@ -126,8 +498,8 @@ async def assess_knowledge(messages: list[dict], paper_concepts: list[str]) -> l
 
     for attempt in range(3):
         try:
-            response = await litellm.acompletion(
-                model=LITELLM_MODEL,
+            response = await _routed(
+                "assess",
                 messages=[
                     {"role": "system", "content": ASSESS_KNOWLEDGE_SYSTEM},
                     {"role": "user", "content": (
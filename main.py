@@ -1,6 +1,18 @@
+import asyncio
 from nicegui import ui, app
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 import db
 import config
+import graph_layout
+import graph_metrics
+import graph_payload
+import instrument
+import llm
+import maintenance
+import pdf_store
+import related
+import retrieval
 
 # Import pages to register routes
 import pages.dashboard  # noqa: F401
@@ -8,18 +20,97 @@ import pages.upload  # noqa: F401
 import pages.paper_detail  # noqa: F401
 import pages.chat  # noqa: F401
 import pages.graph  # noqa: F401
+import pages.library  # noqa: F401
+import pages.author  # noqa: F401
+
+
+instrument.install(app)
+
+_pdf_files = pdf_store.PdfFiles(directory=config.UPLOAD_DIR)
+
+
+@app.get(pdf_store.URL_PREFIX + "/{path:path}")
+async def uploads(request: Request, path: str = ""):
+    return await _pdf_files.get_response(path, request.scope)
+
+
+@app.get("/api/graph")
+async def graph(request: Request):
+    return await graph_payload.respond(request)
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(instrument.render(), media_type="text/plain; version=0.0.4")
 
 
-app.add_static_files("/uploads", config.UPLOAD_DIR)
 app.on_startup(db.init_db)
 
 
+async def migrate_uploads():
+    # Other workers wait on the migration lease; off the event loop, so they keep serving meanwhile
+    await asyncio.to_thread(pdf_store.migrate_uploads)
+
+
+app.on_startup(migrate_uploads)
+
+
+async def place_new_concepts():
+    # Ingestion keeps the layout current; this catches databases from before it did
+    await asyncio.to_thread(graph_layout.update_layout)
+
+
+app.on_startup(place_new_concepts)
+
+
+async def index_new_papers():
+    # Builds the library search index on first run; later ingests append to it
+    await asyncio.to_thread(retrieval.update_index)
+
+
+app.on_startup(index_new_papers)
+
+
+async def fill_related_papers():
+    await asyncio.to_thread(related.rebuild_if_empty)
+
+
+app.on_startup(fill_related_papers)
+
+
+async def compute_graph_metrics():
+    # First run computes them; afterwards only if the graph changed enough while the app was down
+    await asyncio.to_thread(graph_metrics.refresh)
+
+
+app.on_startup(compute_graph_metrics)
+
+
+async def start_maintenance():
+    asyncio.create_task(maintenance.run_forever())
+
+
+app.on_startup(start_maintenance)
+
+
+async def preload_llm():
+    await asyncio.to_thread(llm.warm_up)
+
+
+if config.PRELOAD_LLM:
+    app.on_startup(preload_llm)
+
+
 def main():
+    if config.WORKERS > 1:
+        import serve
+        serve.run_workers(config.WORKERS)
+        return
     ui.run(
         title="PaperMind",
         host=config.NICEGUI_HOST,
         port=config.NICEGUI_PORT,
-        reload=True,
+        reload=config.NICEGUI_RELOAD,
         show=False,
     )
 
@@ -0,0 +1,127 @@
+"""Background storage maintenance for the SQLite database.
+
+run_forever() is started with the app. Every CHECK_INTERVAL seconds, once
+the process has been idle for IDLE_SECONDS, one worker (under a lease) runs
+whatever is due:
+
+- wal_checkpoint(TRUNCATE), when the WAL file is over WAL_BYTES
+- PRAGMA optimize, every OPTIMIZE_INTERVAL
+- compresses chats idle for config.CHAT_ARCHIVE_DAYS into chat_archive
+- recomputes graph metrics, when enough links changed (graph_metrics.refresh)
+- trims change_log to CHANGE_LOG_ROWS, when backups stopped collecting it
+- incremental_vacuum, when free pages exceed FREE_RATIO of the file
+
+Each run records file size, WAL size and free pages in storage_stats.
+
+Converting an old database to auto_vacuum=INCREMENTAL takes one full VACUUM,
+which holds the write lock for as long as it takes to rewrite the file, past
+other workers' busy timeout on a large library. Idleness is only known per
+process, so the app never does it; the CLI does.
+
+    python maintenance.py            # convert if needed, run every task now and print the result
+    python maintenance.py --history  # recorded samples
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import config
+import db
+import graph_metrics
+import instrument
+
+log = logging.getLogger("papermind.maintenance")
+
+CHECK_INTERVAL = 60
+IDLE_SECONDS = 120
+# Record a sample at least this often, even when nothing was due
+SAMPLE_INTERVAL = 3600
+OPTIMIZE_INTERVAL = 6 * 3600
+WAL_BYTES = 1024 * 1024
+FREE_RATIO = 0.1
+# Pages freed per incremental_vacuum call, so writers wait at most briefly
+VACUUM_STEP = 2048
+# Chats compressed per transaction
+ARCHIVE_BATCH = 200
+LEASE_TTL = 1800
+# Changes kept for the next incremental backup; past this it takes a new snapshot instead
+CHANGE_LOG_ROWS = 200_000
+
+_last = {"optimize": 0.0, "sample": 0.0}
+
+
+def run_once(force: bool = False) -> dict:
+    """Run the due tasks; returns the sample recorded.
+
+    With force (the CLI), run all of them, converting to auto_vacuum=INCREMENTAL first if needed.
+    """
+    token = db.acquire_lease("db_maintenance", ttl=LEASE_TTL)
+    if token is None:
+        return {}
+    try:
+        now = time.monotonic()
+        actions = []
+        if force and db.migrate_auto_vacuum():
+            actions.append("migrate_auto_vacuum")
+        info = db.storage_info()
+        if force or info["wal_bytes"] > WAL_BYTES:
+            db.checkpoint()
+            actions.append("checkpoint")
+        if force or now - _last["optimize"] > OPTIMIZE_INTERVAL:
+            db.optimize()
+            _last["optimize"] = now
+            actions.append("optimize")
+        if config.CHAT_ARCHIVE_DAYS > 0:
+            idle_before = (datetime.now(timezone.utc) - timedelta(days=config.CHAT_ARCHIVE_DAYS)).isoformat()
+            archived = 0
+            while n := db.archive_chats(idle_before, ARCHIVE_BATCH):
+                archived += n
+            if archived:
+                actions.append("archive_chats")
+        if graph_metrics.refresh(force):
+            actions.append("graph_metrics")
+        if db.trim_change_log(CHANGE_LOG_ROWS):
+            actions.append("trim_change_log")
+        info = db.storage_info()
+        if info["freelist_count"] and (force or info["freelist_count"] > FREE_RATIO * info["page_count"]):
+            while db.incremental_vacuum(VACUUM_STEP) == VACUUM_STEP:
+                pass
+            actions.append("incremental_vacuum")
+            # Vacuuming writes the WAL; fold it back in so the file actually shrinks
+            db.checkpoint()
+        if actions or now - _last["sample"] > SAMPLE_INTERVAL:
+            info = db.storage_info()
+            db.record_storage_stats(info, actions)
+            _last["sample"] = now
+        return {**info, "actions": actions}
+    finally:
+        db.release_lease("db_maintenance", token)
+
+
+async def run_forever():
+    while True:
+        await asyncio.sleep(CHECK_INTERVAL)
+        if instrument.idle_seconds() < IDLE_SECONDS:
+            continue
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception:
+            log.exception("storage maintenance failed")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", action="store_true")
+    args = parser.parse_args(argv)
+    db.init_db()
+    result = db.get_storage_stats() if args.history else run_once(force=True)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+from nicegui import ui
+from pages.layout import frame
+import db
+
+
+@ui.page("/author/{author_id}")
+def author_page(author_id: int):
+    frame("Author")
+
+    author = db.get_author(author_id)
+    if author is None:
+        with ui.column().classes("w-full max-w-4xl mx-auto p-4"):
+            ui.label("Author not found.").classes("text-red-500 text-xl")
+        return
+
+    papers = db.get_papers_by_author(author_id)
+    coauthors = db.get_coauthors(author_id)
+
+    with ui.column().classes("w-full max-w-4xl mx-auto p-4 gap-4"):
+        ui.label(author["name"]).classes("text-2xl font-bold")
+        ui.label(f"{author['paper_count']} paper{'s' if author['paper_count'] != 1 else ''} in your library").classes(
+            "text-sm text-gray-400"
+        )
+
+        with ui.card().classes("w-full"):
+            ui.label("Papers").classes("text-lg font-semibold mb-2")
+            for p in papers:
+                with ui.column().classes("w-full gap-0 py-1 border-b"):
+                    ui.link(p["title"], f"/paper/{p['id']}").classes("font-medium")
+                    ui.label(f"{p['authors_display']} · {p['added_at'][:10]}").classes("text-sm text-gray-500")
+
+        if coauthors:
+            with ui.card().classes("w-full"):
+                ui.label("Co-authors").classes("text-lg font-semibold mb-2")
+                with ui.row().classes("flex-wrap gap-2"):
+                    for c in coauthors:
+                        with ui.link(target=f"/author/{c['id']}").classes("no-underline"):
+                            ui.badge(f"{c['name']} ({c['shared']})").props("color=secondary outline")
@@ -1,8 +1,20 @@
+import json
+import time
+from collections.abc import AsyncIterator
 from nicegui import ui
 from starlette.requests import Request
 from pages.layout import frame
 import db
 import llm
+import prewarm
+
+# Streamed tokens are batched and sent at most this often (seconds)
+STREAM_FLUSH_INTERVAL = 0.05
+# First turn of a review session started from the dashboard
+REVIEW_PROMPT = "Quiz me on the concepts I am due to review: {names}. Start with the first, the most overdue."
+# Messages fetched per history page, and the most kept on screen at once
+HISTORY_PAGE_SIZE = 30
+MAX_RENDERED_MESSAGES = 90
 
 AGENT_STYLES = {
     "teach": {"label": "Teach", "color": "#6366f1", "bg": "#eef2ff", "border": "#c7d2fe"},
@@ -10,33 +22,44 @@ AGENT_STYLES = {
 }
 
 
-def _build_paper_context(paper: dict, concepts: list[dict], notes: list[dict]) -> str:
-    concept_list = ", ".join(c["name"] for c in concepts)
-    ctx = (
-        f"Paper: {paper['title']}\n"
-        f"Authors: {', '.join(paper['authors'])}\n"
-        f"Abstract: {paper['abstract']}\n\n"
-        f"Summary: {paper['summary']}\n\n"
-        f"Key concepts: {concept_list}"
-    )
-    if notes:
-        takeaways = "\n".join(f"- {n['takeaway']}" for n in notes)
-        ctx += f"\n\nUser's takeaways:\n{takeaways}"
-    return ctx
+async def coalesce(chunks: AsyncIterator[str], interval: float = STREAM_FLUSH_INTERVAL) -> AsyncIterator[str]:
+    """Re-yield a token stream as joined deltas, at most one per `interval` seconds.
+
+    The first chunk goes out immediately so the reply starts rendering without
+    delay; whatever is pending when the stream ends is flushed last.
+    """
+    pending: list[str] = []
+    last_flush = float("-inf")
+    async for chunk in chunks:
+        pending.append(chunk)
+        now = time.monotonic()
+        if now - last_flush >= interval:
+            yield "".join(pending)
+            pending.clear()
+            last_flush = now
+    if pending:
+        yield "".join(pending)
+
+
+def _append_text(element: ui.html, text: str, replace: bool = False):
+    """Send only `text` to the browser, as a plain text node on `element`."""
+    action = f"textContent = {json.dumps(text)}" if replace else f"append({json.dumps(text)})"
+    ui.run_javascript(f"getHtmlElement({element.id}).{action}")
 
 
-def _render_msg(container, msg: dict):
-    """Render a single message into the chat container."""
+def _render_msg(container, msg: dict) -> ui.element | None:
+    """Render a single message into the chat container and return its row."""
     with container:
         if msg["role"] == "user":
-            with ui.element("div").classes("flex justify-end w-full"):
+            with ui.element("div").classes("flex justify-end w-full") as row:
                 ui.html(msg["content"]).classes(
                     "rounded-xl px-4 py-2 max-w-[75%] bg-gray-100 text-gray-800"
                 )
+            return row
         elif msg["role"] == "assistant":
             agent = msg.get("agent", "teach")
             style = AGENT_STYLES[agent]
-            with ui.element("div").classes("flex justify-start w-full gap-2 items-start"):
+            with ui.element("div").classes("flex justify-start w-full gap-2 items-start") as row:
                 ui.badge(style["label"]).style(
                     f"background-color: {style['color']}; color: white; flex-shrink: 0; margin-top: 4px"
                 )
@@ -44,6 +67,8 @@ def _render_msg(container, msg: dict):
                     f"background-color: {style['bg']}; border: 1px solid {style['border']}; "
                     f"color: #1f2937"
                 ).classes("rounded-xl px-4 py-2 max-w-[75%]")
+            return row
+    return None
 
 
 @ui.page("/chat/new")
@@ -65,25 +90,26 @@ def new_chat_page(request: Request):
 def chat_page(chat_id: int, request: Request):
     frame("Chat")
 
-    chat = db.get_chat(chat_id)
+    chat = db.get_chat_info(chat_id)
     if chat is None:
         with ui.column().classes("w-full max-w-3xl mx-auto p-4"):
             ui.label("Chat not found.").classes("text-red-500")
         return
 
-    paper = db.get_paper(chat["paper_id"])
-    if paper is None:
+    inputs = prewarm.chat_inputs(chat["paper_id"])
+    if inputs is None:
         with ui.column().classes("w-full max-w-3xl mx-auto p-4"):
             ui.label("Paper not found.").classes("text-red-500")
         return
 
-    concepts = db.get_concepts_for_paper(chat["paper_id"])
-    notes = db.get_notes_for_paper(chat["paper_id"])
-    paper_context = _build_paper_context(paper, concepts, notes)
+    paper, concepts, notes, paper_context = inputs["paper"], inputs["concepts"], inputs["notes"], inputs["context"]
 
-    messages: list[dict] = chat["messages_json"]
     initial_agent = request.query_params.get("agent", "teach")
     state = {"agent": initial_agent, "sending": False}
+    # Concepts due for review, most overdue first, when opened from the dashboard's review queue
+    focus_ids = [int(i) for i in request.query_params.get("focus", "").split(",") if i.isdigit()]
+    by_id = {c["id"]: c for c in concepts}
+    focus = [by_id[i] for i in focus_ids if i in by_id]
 
     with ui.column().classes("w-full max-w-3xl mx-auto p-4 gap-2"):
         # Header
@@ -103,6 +129,8 @@ def chat_page(chat_id: int, request: Request):
             def set_agent(agent: str):
                 state["agent"] = agent
                 _update_toggle_styles()
+                if not window["total"]:
+                    ui.timer(0, show_opener, once=True)
 
             def _update_toggle_styles():
                 if state["agent"] == "teach":
@@ -118,7 +146,7 @@ def chat_page(chat_id: int, request: Request):
 
         # Summary & takeaways
         with ui.expansion("Paper Summary & Takeaways", icon="description").classes("w-full").props(
-            "default-opened" if not messages else ""
+            "default-opened" if not chat["message_count"] else ""
         ):
             ui.label(paper["summary"]).classes("text-sm text-gray-700")
             if notes:
@@ -127,12 +155,76 @@ def chat_page(chat_id: int, request: Request):
                 for n in notes:
                     ui.label(f"- {n['takeaway']}").classes("text-sm text-gray-600")
 
-        # Chat area
-        chat_container = ui.column().classes("w-full gap-3 flex-1 overflow-y-auto p-2").style("max-height: 55vh")
+        # Chat area: only a window of the transcript is rendered. Older pages load on
+        # scroll-up, and the newest rows are dropped once the window is full.
+        window = {"start": 0, "end": 0, "total": chat["message_count"]}
+        rendered: list[ui.element | None] = []  # one entry per message in the window
 
-        with chat_container:
-            for msg in messages:
-                _render_msg(chat_container, msg)
+        older_btn = ui.button("Load earlier messages", icon="expand_less").props("flat dense size=sm")
+        chat_container = ui.column().classes("w-full gap-3 flex-1 overflow-y-auto p-2").style("max-height: 55vh")
+        latest_btn = ui.button("Jump to latest", icon="expand_more").props("flat dense size=sm")
+
+        def _update_window_buttons():
+            older_btn.visible = window["start"] > 0
+            latest_btn.visible = window["end"] < window["total"]
+
+        def show_latest():
+            chat_container.clear()
+            rendered.clear()
+            window["total"] = db.get_chat_info(chat_id)["message_count"]
+            window["start"] = max(0, window["total"] - HISTORY_PAGE_SIZE)
+            window["end"] = window["total"]
+            for msg in db.get_chat_messages(chat_id, window["start"], window["end"] - window["start"]):
+                rendered.append(_render_msg(chat_container, msg))
+            _update_window_buttons()
+
+        def load_older():
+            start = window["start"]
+            if start == 0:
+                return
+            new_start = max(0, start - HISTORY_PAGE_SIZE)
+            older = [_render_msg(chat_container, m) for m in db.get_chat_messages(chat_id, new_start, start - new_start)]
+            position = 0
+            for row in older:
+                if row is not None:
+                    row.move(target_index=position)
+                    position += 1
+            rendered[:0] = older
+            window["start"] = new_start
+            while len(rendered) > MAX_RENDERED_MESSAGES:
+                row = rendered.pop()
+                if row is not None:
+                    chat_container.remove(row)
+                window["end"] -= 1
+            _update_window_buttons()
+
+        def trim_oldest():
+            while len(rendered) > MAX_RENDERED_MESSAGES:
+                row = rendered.pop(0)
+                if row is not None:
+                    chat_container.remove(row)
+                window["start"] += 1
+            _update_window_buttons()
+
+        older_btn.on_click(load_older)
+        latest_btn.on_click(show_latest)
+        chat_container.on(
+            "scroll", load_older, args=[], throttle=0.5,
+            js_handler="(e) => { if (e.target.scrollTop < 40) emit() }",
+        )
+        show_latest()
+
+        async def show_opener():
+            """Start an empty chat with the opener prepared from the paper page, if any."""
+            agent = state["agent"]
+            text = await prewarm.claim(chat["paper_id"], agent)
+            if text is None or state["sending"] or db.get_chat_info(chat_id)["message_count"]:
+                return
+            db.update_chat_messages(chat_id, [{"role": "assistant", "content": text, "agent": agent}])
+            show_latest()
+
+        if not window["total"] and not focus:
+            ui.timer(0, show_opener, once=True)
 
         # Input
         with ui.row().classes("w-full gap-2 items-end"):
@@ -151,24 +243,33 @@ def chat_page(chat_id: int, request: Request):
                 style = AGENT_STYLES[agent]
                 system_prompt = llm.TEACH_SYSTEM if agent == "teach" else llm.ZEALOT_SYSTEM
 
+                # The full transcript is only needed to build the LLM request
+                if window["end"] < window["total"]:
+                    show_latest()
+                messages = db.get_chat(chat_id)["messages_json"]
                 messages.append({"role": "user", "content": text})
 
                 with chat_container:
                     # User bubble
-                    with ui.element("div").classes("flex justify-end w-full"):
+                    with ui.element("div").classes("flex justify-end w-full") as user_row:
                         ui.html(text).classes("rounded-xl px-4 py-2 max-w-[75%] bg-gray-100 text-gray-800")
 
                     # Agent bubble (streaming)
-                    with ui.element("div").classes("flex justify-start w-full gap-2 items-start"):
+                    with ui.element("div").classes("flex justify-start w-full gap-2 items-start") as agent_row:
                         ui.badge(style["label"]).style(
                             f"background-color: {style['color']}; color: white; flex-shrink: 0; margin-top: 4px"
                         )
                         response_html = ui.html("...").style(
-                            f"background-color: {style['bg']}; border: 1px solid {style['border']}; color: #1f2937"
+                            f"background-color: {style['bg']}; border: 1px solid {style['border']}; color: #1f2937; "
+                            "white-space: pre-wrap"
                         ).classes("rounded-xl px-4 py-2 max-w-[75%]")
+                rendered.extend([user_row, agent_row])
 
-                # Build LLM messages with paper context on first user msg
+                # Build LLM messages with paper context on first user msg. A chat that
+                # opened with a prepared opener replays the request that produced it.
                 llm_messages = []
+                if messages[0]["role"] == "assistant":
+                    llm_messages.append(prewarm.opener_request(paper_context, messages[0].get("agent", "teach")))
                 for i, m in enumerate(messages):
                     if m["role"] == "assistant":
                         llm_messages.append({"role": "assistant", "content": m["content"]})
@@ -180,38 +281,56 @@ def chat_page(chat_id: int, request: Request):
                     else:
                         llm_messages.append({"role": m["role"], "content": m["content"]})
 
+                # Push only new text while streaming; the formatted message is set once at the end
                 full_response = ""
                 try:
-                    async for chunk in llm.stream_chat_response(llm_messages, system_prompt):
-                        full_response += chunk
-                        response_html.content = full_response.replace("\n", "<br>")
+                    async for delta in coalesce(llm.stream_chat_response(llm_messages, system_prompt, f"chat-{agent}")):
+                        _append_text(response_html, delta, replace=not full_response)
+                        full_response += delta
+                    response_html.content = full_response.replace("\n", "<br>")
                 except Exception as e:
                     full_response = f"Error: {e}"
                     response_html.content = full_response
 
                 messages.append({"role": "assistant", "content": full_response, "agent": agent})
                 db.update_chat_messages(chat_id, messages)
+                window["end"] = window["total"] = len(messages)
+                trim_oldest()
 
                 if agent == "zealot":
                     zealot_msgs = [m for m in messages if m.get("agent") == "zealot" or m["role"] == "user"]
                     if len(zealot_msgs) >= 8:
-                        await _run_assessment(chat["paper_id"], zealot_msgs, concepts)
+                        await _run_assessment(chat_id, zealot_msgs, concepts)
 
                 state["sending"] = False
 
             ui.button("Send", on_click=send_message).props("color=primary")
 
+            if focus and not window["total"]:
+                msg_input.value = REVIEW_PROMPT.format(names=", ".join(c["name"] for c in focus))
+                ui.timer(0, send_message, once=True)
+
             async def end_and_assess():
+                messages = db.get_chat(chat_id)["messages_json"]
                 zealot_msgs = [m for m in messages if m.get("agent") == "zealot" or m["role"] == "user"]
                 if len(zealot_msgs) >= 2:
-                    await _run_assessment(chat["paper_id"], zealot_msgs, concepts)
+                    await _run_assessment(chat_id, zealot_msgs, concepts)
                     ui.notify("Knowledge assessment updated!", type="positive")
             ui.button("Assess", icon="grading", on_click=end_and_assess).props("color=red outline dense")
 
 
-async def _run_assessment(paper_id: int, messages: list[dict], concepts: list[dict]):
-    concept_names = [c["name"] for c in concepts]
-    assessments = await llm.assess_knowledge(messages, concept_names)
+async def _run_assessment(chat_id: int, messages: list[dict], concepts: list[dict]):
+    # Another tab or worker already assessing this chat covers the same conversation;
+    # other chats on the paper are assessed on their own
+    lease = f"assess:{chat_id}"
+    token = db.acquire_lease(lease, ttl=300)
+    if token is None:
+        return
+    try:
+        concept_names = [c["name"] for c in concepts]
+        assessments = await llm.assess_knowledge(messages, concept_names)
+    finally:
+        db.release_lease(lease, token)
     for a in assessments:
         name = a.get("concept", "").strip().lower()
         confidence = a.get("confidence", 0.0)
@@ -1,7 +1,14 @@
+from datetime import datetime, timezone
 from nicegui import ui
 from pages.layout import frame
 import db
 
+# Periods shown on the progress chart
+PROGRESS_PERIODS = {"day": 90, "week": 52}
+# Due concepts listed on the dashboard, and the most one review session covers
+REVIEW_LISTED = 8
+REVIEW_SESSION = 10
+
 
 @ui.page("/")
 def dashboard_page():
@@ -11,6 +18,7 @@ def dashboard_page():
     papers = db.list_papers()
     knowledge = db.get_user_knowledge()
     recent_chats = db.list_chats(limit=10)
+    review = db.get_review_queue(limit=REVIEW_SESSION * 3)
 
     with ui.column().classes("w-full max-w-5xl mx-auto p-4 gap-4"):
         # Stats cards
@@ -28,6 +36,53 @@ def dashboard_page():
                 ui.label("Avg. Confidence").classes("text-sm text-gray-500")
                 ui.label(f"{stats['avg_confidence']:.0%}").classes("text-3xl font-bold")
 
+        # Review queue, straight off the due_at index
+        if review["due"] or review["next_due"]:
+            with ui.card().classes("w-full"):
+                with ui.row().classes("w-full items-center justify-between"):
+                    with ui.row().classes("items-center gap-2"):
+                        ui.label("Review Now").classes("text-lg font-semibold")
+                        if review["due_count"]:
+                            count = review["due_count"]
+                            ui.badge(f"{count}+ due" if count >= db.REVIEW_COUNT_CAP else f"{count} due",
+                                     color="negative")
+
+                    def start_review():
+                        picked = db.get_review_paper([c["id"] for c in review["due"]])
+                        if picked is None:
+                            ui.notify("None of the due concepts belong to a paper any more.", type="warning")
+                            return
+                        paper_id, concept_ids = picked
+                        chat_id = db.create_chat(paper_id, "zealot")
+                        focus = ",".join(map(str, concept_ids[:REVIEW_SESSION]))
+                        ui.navigate.to(f"/chat/{chat_id}?agent=zealot&focus={focus}")
+                    if review["due"]:
+                        ui.button("Start Review", icon="quiz", on_click=start_review).props("color=red dense")
+                if not review["due"]:
+                    ui.label(f"Nothing due. Next review {_when(review['next_due'])}.").classes("text-sm text-gray-500")
+                for c in review["due"][:REVIEW_LISTED]:
+                    with ui.row().classes("w-full items-center justify-between py-1 border-b"):
+                        ui.label(c["name"]).classes("text-sm")
+                        with ui.row().classes("items-center gap-3"):
+                            ui.badge(f"{c['confidence']:.0%}").style(
+                                f"background-color: {_confidence_color(c['confidence'])}; color: white"
+                            )
+                            ui.label(f"due {_when(c['due_at'])}").classes("text-sm text-gray-400")
+
+        # Progress over time, read from the daily/weekly rollups only
+        if db.get_knowledge_progress(limit=1):
+            with ui.card().classes("w-full"):
+                with ui.row().classes("w-full items-center justify-between"):
+                    ui.label("Learning Progress").classes("text-lg font-semibold")
+                    period = ui.toggle({"day": "Daily", "week": "Weekly"}, value="day").props("dense size=sm")
+                progress_chart = ui.echart(_progress_chart("day")).classes("w-full h-64")
+
+                def show_period(e):
+                    progress_chart.options.clear()
+                    progress_chart.options.update(_progress_chart(e.value))
+                    progress_chart.update()
+                period.on_value_change(show_period)
+
         # Knowledge confidence chart
         if knowledge:
             with ui.card().classes("w-full"):
@@ -65,10 +120,7 @@ def dashboard_page():
                     with ui.row().classes("w-full items-center justify-between py-2 border-b"):
                         with ui.column().classes("gap-0"):
                             ui.link(p["title"], f"/paper/{p['id']}").classes("font-medium")
-                            authors_str = ", ".join(p["authors"][:3])
-                            if len(p["authors"]) > 3:
-                                authors_str += " et al."
-                            ui.label(authors_str).classes("text-sm text-gray-500")
+                            ui.label(p["authors_display"]).classes("text-sm text-gray-500")
                         with ui.row().classes("items-center gap-3"):
                             rating = p.get("self_rating")
                             if rating is not None:
@@ -91,6 +143,46 @@ def dashboard_page():
                         ui.label(ch["created_at"][:10]).classes("text-sm text-gray-400")
 
 
+def _progress_chart(period: str) -> dict:
+    rows = db.get_knowledge_progress(period, limit=PROGRESS_PERIODS[period])
+    return {
+        "tooltip": {"trigger": "axis"},
+        "legend": {"data": ["Avg. confidence", "Assessments"]},
+        "xAxis": {"type": "time"},
+        "yAxis": [
+            {"type": "value", "min": 0, "max": 1, "name": "Confidence"},
+            {"type": "value", "name": "Assessments", "minInterval": 1, "splitLine": {"show": False}},
+        ],
+        "series": [
+            {
+                "name": "Avg. confidence",
+                "type": "line",
+                "step": "end",
+                "data": [[r["period"], round(r["avg_confidence"], 3)] for r in rows],
+                "itemStyle": {"color": "#6366f1"},
+            },
+            {
+                "name": "Assessments",
+                "type": "bar",
+                "yAxisIndex": 1,
+                "data": [[r["period"], r["assessments"]] for r in rows],
+                "itemStyle": {"color": "#c7d2fe"},
+            },
+        ],
+    }
+
+
+def _when(stamp: str) -> str:
+    """A due_at relative to now, e.g. "in 3 days" or "5 hours ago"."""
+    seconds = (datetime.fromisoformat(stamp) - datetime.now(timezone.utc)).total_seconds()
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        n = int(abs(seconds) // size)
+        if n:
+            span = f"{n} {unit}{'s' if n > 1 else ''}"
+            return f"in {span}" if seconds > 0 else f"{span} ago"
+    return "now"
+
+
 def _confidence_color(conf: float) -> str:
     if conf < 0.33:
         return "#ef4444"
@@ -1,83 +1,186 @@
-from nicegui import ui
+from nicegui import ui, events
+from starlette.requests import Request
 from pages.layout import frame
 import db
+import graph_payload
+
+# Concepts added to the view per node click / on opening a searched concept
+EXPAND_LIMIT = 30
+FOCUS_HOPS = 1
+# Seconds between checks for graph changes to apply to the open view
+LIVE_INTERVAL = 5.0
+TOP_SIZES = [25, 50, 100, 200]
+
+
+def _int_param(request: Request, name: str) -> int | None:
+    """A non-negative integer query parameter; None if missing or malformed, so bad links get the default view."""
+    value = request.query_params.get(name, "")
+    return int(value) if value.isascii() and value.isdigit() else None
 
 
 @ui.page("/graph")
-def graph_page():
+def graph_page(request: Request):
     frame("Knowledge Graph")
 
-    concepts = db.list_concepts()
-    links = db.get_all_concept_links()
-    knowledge = {k["concept_id"]: k["confidence"] for k in db.get_user_knowledge()}
+    concept_id = _int_param(request, "concept_id") or 0
+    paper_id = _int_param(request, "paper_id") or 0
+    top = min(_int_param(request, "top") or 0, TOP_SIZES[-1])
+    community = _int_param(request, "community")
+    # Read first, so changes made while the view is built are picked up by refresh()
+    state = {"version": db.get_graph_version(), "color_by": "community" if community is not None else "confidence"}
+
+    if top:
+        view = db.get_top_concepts_subgraph(top, community)
+        title = f"Top {top} concepts by centrality" + (f" in community {community}" if community is not None else "")
+    elif concept_id:
+        focus = db.get_concept(concept_id)
+        view = db.get_concept_neighborhood(concept_id, hops=FOCUS_HOPS, limit=EXPAND_LIMIT)
+        title = f"Around “{focus['name']}”" if focus else "Concept not found"
+    else:
+        paper_id = paper_id or db.get_latest_paper_id() or 0
+        paper = db.get_paper(paper_id) if paper_id else None
+        view = db.get_paper_subgraph(paper_id) if paper else {"nodes": [], "links": []}
+        title = f"Concepts in “{paper['title']}”" if paper else ""
 
     with ui.column().classes("w-full max-w-6xl mx-auto p-4 gap-4"):
         ui.label("Knowledge Graph").classes("text-2xl font-bold")
 
-        if not concepts:
-            ui.label("No concepts yet. Upload a paper to build your graph.").classes("text-gray-500")
+        # Concept search
+        with ui.row().classes("w-full items-center gap-2"):
+            search_input = ui.input(placeholder="Search concepts...").classes("flex-1").props("dense clearable")
+
+            def run_search():
+                results.clear()
+                query = (search_input.value or "").strip()
+                if not query:
+                    return
+                with results:
+                    matches = db.search_concepts(query)
+                    if not matches:
+                        ui.label("No matching concepts.").classes("text-sm text-gray-500")
+                    for m in matches:
+                        ui.link(m["name"], f"/graph?concept_id={m['id']}").classes("text-sm")
+
+            search_input.on("keydown.enter", run_search)
+            ui.button(icon="search", on_click=run_search).props("flat dense")
+        results = ui.row().classes("w-full flex-wrap gap-2")
+
+        # Most central concepts, of the whole graph or of one community
+        with ui.row().classes("w-full items-center gap-2"):
+            def show_top():
+                query = f"/graph?top={top_select.value}"
+                if community_select.value is not None:
+                    query += f"&community={community_select.value}"
+                ui.navigate.to(query)
+
+            top_select = ui.select(TOP_SIZES, value=top if top in TOP_SIZES else TOP_SIZES[1],
+                                   label="Top concepts").props("dense")
+            options = {c["community"]: f"{c['top_concept']} ({c['size']})" for c in db.get_communities()}
+            community_select = ui.select(options, value=community if community in options else None,
+                                         label="Community", clearable=True).classes("min-w-[16rem]").props("dense")
+            ui.button("Show", on_click=show_top).props("flat dense")
+            ui.space()
+            color_toggle = ui.toggle({"confidence": "Confidence", "community": "Community"},
+                                     value=state["color_by"]).props("dense")
+
+        if not view["nodes"]:
+            ui.label(title or "No concepts yet. Upload a paper to build your graph.").classes("text-gray-500")
             return
 
-        # Build ECharts graph data
-        nodes = []
-        for c in concepts:
-            conf = knowledge.get(c["id"], 0.0)
-            nodes.append({
-                "name": c["name"],
-                "symbolSize": 15 + conf * 35,
-                "value": c["description"],
-                "itemStyle": {"color": _confidence_color(conf)},
-            })
-
-        concept_names = {c["id"]: c["name"] for c in concepts}
-        edges = []
-        for link in links:
-            if link["concept_a"] in concept_names and link["concept_b"] in concept_names:
-                edges.append({
-                    "source": concept_names[link["concept_a"]],
-                    "target": concept_names[link["concept_b"]],
-                    "value": link["relationship"],
-                })
+        ui.label(title).classes("text-sm text-gray-600")
+        ui.label("Click a concept to expand its neighbours.").classes("text-xs text-gray-400")
+
+        shown = {n["id"] for n in view["nodes"]}
 
         chart_options = {
             "tooltip": {"formatter": "{b}: {c}"},
             "legend": {"show": False},
             "series": [{
                 "type": "graph",
-                "layout": "force",
+                "layout": "none",
                 "roam": True,
                 "draggable": True,
                 "label": {"show": True, "position": "right", "fontSize": 11},
-                "force": {
-                    "repulsion": 200,
-                    "gravity": 0.1,
-                    "edgeLength": [80, 200],
-                },
                 "emphasis": {"focus": "adjacency", "lineStyle": {"width": 4}},
                 "edgeSymbol": ["none", "arrow"],
                 "edgeLabel": {"show": True, "formatter": "{c}", "fontSize": 9},
-                "data": nodes,
-                "links": edges,
+                "data": [graph_payload.node(n, state["color_by"]) for n in view["nodes"]],
+                "links": [graph_payload.edge(link) for link in view["links"]],
                 "lineStyle": {"color": "source", "curveness": 0.1},
             }],
         }
 
-        ui.echart(chart_options).classes("w-full").style("height: 600px")
+        def expand(e: events.EChartPointClickEventArguments):
+            if e.data_type != "node" or not isinstance(e.data, dict):
+                return
+            delta = db.get_concept_neighborhood(
+                int(e.data["id"]), hops=1, limit=EXPAND_LIMIT, known_ids=list(shown),
+            )
+            if not delta["nodes"]:
+                ui.notify(f"No more neighbours of {e.name}")
+                return
+            shown.update(n["id"] for n in delta["nodes"])
+            series = chart_options["series"][0]
+            series["data"].extend(graph_payload.node(n, state["color_by"]) for n in delta["nodes"])
+            series["links"].extend(graph_payload.edge(link) for link in delta["links"])
+            chart.update()
+
+        def refresh():
+            """Apply changes to the concepts and links on screen, e.g. scores after a quiz or a re-layout."""
+            if db.get_graph_version() == state["version"]:
+                return
+            diff = graph_payload.changes(state["version"], state["color_by"])
+            state["version"] = diff["version"]
+            series = chart_options["series"][0]
+            changed = {n["id"]: n for n in diff["nodes"]}
+            removed = set(diff["removed_nodes"])
+            series["data"] = [changed.get(n["id"], n) for n in series["data"] if n["id"] not in removed]
+            shown.difference_update(int(i) for i in removed)
+            on_screen = {n["id"] for n in series["data"]}
+            links = {(link["source"], link["target"]): link for link in series["links"]}
+            for a, b in diff["removed_links"]:
+                links.pop((a, b), None)
+            for link in diff["links"]:
+                if link["source"] in on_screen and link["target"] in on_screen:
+                    links[(link["source"], link["target"])] = link
+            series["links"] = [link for link in links.values()
+                               if link["source"] in on_screen and link["target"] in on_screen]
+            chart.update()
+
+        def recolor(e):
+            state["color_by"] = e.value
+            for n in chart_options["series"][0]["data"]:
+                n["itemStyle"]["color"] = (graph_payload.community_color(n["community"]) if e.value == "community"
+                                           else graph_payload.confidence_color(n["confidence"]))
+            confidence_legend.set_visibility(e.value == "confidence")
+            community_legend.set_visibility(e.value == "community")
+            chart.update()
+
+        chart = ui.echart(chart_options, on_point_click=expand).classes("w-full").style("height: 600px")
+        ui.timer(LIVE_INTERVAL, refresh)
+        color_toggle.on_value_change(recolor)
 
         # Legend
-        with ui.row().classes("gap-4 items-center"):
+        ui.label("Size shows centrality; line width, how many papers state a link.").classes("text-xs text-gray-400")
+        with ui.row().classes("gap-4 items-center") as confidence_legend:
             ui.label("Confidence:").classes("text-sm font-medium")
             for label, color in [("Low", "#ef4444"), ("Medium", "#eab308"), ("High", "#22c55e"), ("Untested", "#94a3b8")]:
                 with ui.row().classes("items-center gap-1"):
                     ui.html(f'<div style="width:12px;height:12px;border-radius:50%;background:{color}"></div>')
                     ui.label(label).classes("text-xs")
+        with ui.row().classes("gap-4 items-center flex-wrap") as community_legend:
+            ui.label("Community:").classes("text-sm font-medium")
+            for c in db.get_communities(len(graph_payload.COMMUNITY_COLORS) - 1):
+                with ui.row().classes("items-center gap-1"):
+                    ui.html(f'<div style="width:12px;height:12px;border-radius:50%;'
+                            f'background:{graph_payload.community_color(c["community"])}"></div>')
+                    ui.link(c["top_concept"], f"/graph?top={top or TOP_SIZES[1]}&community={c['community']}").classes(
+                        "text-xs"
+                    )
+            with ui.row().classes("items-center gap-1"):
+                ui.html(f'<div style="width:12px;height:12px;border-radius:50%;'
+                        f'background:{graph_payload.COMMUNITY_COLORS[-1]}"></div>')
+                ui.label("Other").classes("text-xs")
+        confidence_legend.set_visibility(state["color_by"] == "confidence")
+        community_legend.set_visibility(state["color_by"] == "community")
 
-
-def _confidence_color(conf: float) -> str:
-    if conf == 0.0:
-        return "#94a3b8"  # gray for untested
-    if conf < 0.33:
-        return "#ef4444"
-    elif conf < 0.66:
-        return "#eab308"
-    return "#22c55e"
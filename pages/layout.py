@@ -9,4 +9,5 @@ def frame(title: str = "PaperMind"):
             ui.link("Dashboard", "/").classes("text-white no-underline")
             ui.link("Upload", "/upload").classes("text-white no-underline")
             ui.link("Graph", "/graph").classes("text-white no-underline")
+            ui.link("Ask Library", "/library").classes("text-white no-underline")
         ui.label(title).classes("text-white text-sm opacity-70")
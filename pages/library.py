@@ -0,0 +1,99 @@
+import html
+import re
+from nicegui import ui
+from pages.layout import frame
+from pages.chat import AGENT_STYLES, _append_text, coalesce
+import llm
+import retrieval
+
+_CITATION = re.compile(r"\[(\d+)\]")
+
+
+def _excerpts(hits: list[dict]) -> str:
+    return "\n\n".join(f"[{i}] {h['title']}: {h['text']}" for i, h in enumerate(hits, 1))
+
+
+def _link_citations(text: str, hits: list[dict]) -> str:
+    """Turn [n] markers into links to the cited paper."""
+    def link(m: re.Match) -> str:
+        n = int(m.group(1))
+        if not 1 <= n <= len(hits):
+            return m.group(0)
+        hit = hits[n - 1]
+        return f'<a href="/paper/{hit["paper_id"]}" title="{html.escape(hit["title"])}" class="text-indigo-600">[{n}]</a>'
+    return _CITATION.sub(link, text).replace("\n", "<br>")
+
+
+@ui.page("/library")
+def library_page():
+    frame("Ask Library")
+
+    style = AGENT_STYLES["teach"]
+    # Kept for this tab only; the LLM sees earlier turns without their excerpts
+    history: list[dict] = []
+    state = {"sending": False}
+
+    with ui.column().classes("w-full max-w-3xl mx-auto p-4 gap-2"):
+        ui.label("Ask your library").classes("text-2xl font-bold")
+        ui.label("Questions are answered from the most relevant papers, with citations.").classes(
+            "text-sm text-gray-500"
+        )
+
+        chat_container = ui.column().classes("w-full gap-3 flex-1 overflow-y-auto p-2").style("max-height: 60vh")
+
+        with ui.row().classes("w-full gap-2 items-end"):
+            msg_input = ui.textarea(placeholder="Ask about anything you've read...").classes("flex-1").props(
+                "rows=2 autofocus"
+            )
+
+            async def send_message():
+                if state["sending"]:
+                    return
+                text = msg_input.value.strip()
+                if not text:
+                    return
+                state["sending"] = True
+                msg_input.value = ""
+
+                hits = retrieval.search(text)
+
+                with chat_container:
+                    with ui.element("div").classes("flex justify-end w-full"):
+                        ui.html(text).classes("rounded-xl px-4 py-2 max-w-[75%] bg-gray-100 text-gray-800")
+                    with ui.element("div").classes("flex justify-start w-full gap-2 items-start"):
+                        ui.badge(style["label"]).style(
+                            f"background-color: {style['color']}; color: white; flex-shrink: 0; margin-top: 4px"
+                        )
+                        with ui.column().classes("max-w-[75%] gap-1"):
+                            response_html = ui.html("...").style(
+                                f"background-color: {style['bg']}; border: 1px solid {style['border']}; "
+                                "color: #1f2937; white-space: pre-wrap"
+                            ).classes("rounded-xl px-4 py-2")
+                            sources = ui.row().classes("gap-x-3 gap-y-0 flex-wrap")
+
+                if hits:
+                    prompt = f"[Library excerpts]\n{_excerpts(hits)}\n\n[User]\n{text}"
+                else:
+                    prompt = f"[Library excerpts]\nNothing in the library matched.\n\n[User]\n{text}"
+                llm_messages = history + [{"role": "user", "content": prompt}]
+
+                full_response = ""
+                try:
+                    async for delta in coalesce(llm.stream_chat_response(llm_messages, llm.LIBRARY_SYSTEM)):
+                        _append_text(response_html, delta, replace=not full_response)
+                        full_response += delta
+                    response_html.content = _link_citations(full_response, hits)
+                except Exception as e:
+                    full_response = f"Error: {e}"
+                    response_html.content = full_response
+
+                with sources:
+                    for i, hit in enumerate(hits, 1):
+                        ui.link(f"[{i}] {hit['title']}", f"/paper/{hit['paper_id']}").classes(
+                            "text-xs text-gray-500"
+                        )
+
+                history.extend([{"role": "user", "content": text}, {"role": "assistant", "content": full_response}])
+                state["sending"] = False
+
+            ui.button("Send", on_click=send_message).props("color=primary")
@@ -1,10 +1,14 @@
-import base64
+import asyncio
 from pathlib import Path
 from nicegui import ui
 from pages.layout import frame
-from config import UPLOAD_DIR
 import db
-import llm
+import extraction
+import graph_metrics
+import pdf_store
+import prewarm
+import related
+import retrieval
 
 
 @ui.page("/paper/{paper_id}")
@@ -24,8 +28,8 @@ def paper_detail_page(paper_id: int):
         # Title (editable) + PDF link
         with ui.row().classes("w-full items-center gap-2"):
             title_label = ui.label(paper["title"]).classes("text-2xl font-bold")
-            if paper["source_url"]:
-                ui.link("PDF", f"/uploads/{paper['source_url']}", new_tab=True).classes("text-sm")
+            if paper["pdf_sha256"]:
+                ui.link("PDF", pdf_store.url_for(paper["pdf_sha256"]), new_tab=True).classes("text-sm")
 
             title_input = ui.input(value=paper["title"]).classes("text-2xl font-bold flex-1")
             title_input.visible = False
@@ -37,7 +41,7 @@ def paper_detail_page(paper_id: int):
                 save_btn.visible = True
                 cancel_btn.visible = True
 
-            def save_rename():
+            async def save_rename():
                 new_title = title_input.value.strip()
                 if new_title:
                     db.update_paper_title(paper_id, new_title)
@@ -47,6 +51,9 @@ def paper_detail_page(paper_id: int):
                 title_input.visible = False
                 save_btn.visible = False
                 cancel_btn.visible = False
+                if new_title:
+                    # The title is part of every passage Ask Library searches
+                    await asyncio.to_thread(retrieval.update_index, changed=(paper_id,))
 
             def cancel_rename():
                 title_input.value = title_label.text
@@ -69,24 +76,36 @@ def paper_detail_page(paper_id: int):
                     ui.label("Delete this paper and all its data?").classes("font-medium")
                     with ui.row().classes("w-full justify-end gap-2 mt-2"):
                         ui.button("Cancel", on_click=dialog.close).props("flat")
-                        def do_delete():
-                            db.delete_paper(paper_id)
+                        async def do_delete():
+                            await asyncio.to_thread(related.delete_paper, paper_id)
+                            await asyncio.to_thread(graph_metrics.refresh)
                             dialog.close()
                             ui.navigate.to("/")
                         ui.button("Delete", on_click=do_delete).props("color=red")
                 dialog.open()
 
             ui.button(icon="delete", on_click=confirm_delete).props("flat dense size=sm color=red")
-        authors_str = ", ".join(paper["authors"])
-        if authors_str:
-            ui.label(authors_str).classes("text-gray-600")
+        if paper["authors"]:
+            with ui.row().classes("gap-x-1 gap-y-0 flex-wrap text-gray-600"):
+                for i, (author_id, name) in enumerate(zip(paper["author_ids"], paper["authors"])):
+                    ui.link(name + ("," if i < len(paper["authors"]) - 1 else ""), f"/author/{author_id}").classes(
+                        "text-gray-600 no-underline"
+                    )
         ui.label(f"Added {paper['added_at'][:10]}").classes("text-sm text-gray-400")
 
-        # Self-rating + chat button
+        # Chats open on the latest session directly, skipping the /chat/new redirect
+        chats = db.list_chats(paper_id=paper_id)
+        chat_url = f"/chat/{chats[0]['id']}?agent=" if chats else f"/chat/new?paper_id={paper_id}&agent="
+        # Openers are only shown in an empty chat, so only prepare them for one
+        if not chats or not db.get_chat_info(chats[0]["id"])["message_count"]:
+            ui.timer(prewarm.DWELL, lambda: prewarm.schedule(paper_id), once=True)
+
+        # Self-rating + chat buttons
         with ui.row().classes("w-full items-center gap-4"):
-            ui.button("Open Chat", icon="chat",
-                      on_click=lambda: ui.navigate.to(f"/chat/new?paper_id={paper_id}&agent=teach")
-                      ).props("color=primary")
+            ui.button("Open Chat", icon="chat", on_click=lambda: ui.navigate.to(chat_url + "teach")).props("color=primary")
+            ui.button("Quiz Me", icon="quiz", on_click=lambda: ui.navigate.to(chat_url + "zealot")).props(
+                "color=red outline"
+            )
 
             ui.label("My understanding:").classes("text-sm text-gray-500 ml-auto")
             current_rating = paper.get("self_rating") or 0.0
@@ -117,7 +136,7 @@ def paper_detail_page(paper_id: int):
                 regen_spinner.visible = False
 
                 async def regenerate_summary():
-                    pdf_path = UPLOAD_DIR / paper["source_url"] if paper["source_url"] else None
+                    pdf_path = pdf_store.path_for(paper["pdf_sha256"]) if paper["pdf_sha256"] else None
                     if not pdf_path or not pdf_path.exists():
                         ui.notify("PDF not found in uploads", type="negative")
                         return
@@ -127,11 +146,11 @@ def paper_detail_page(paper_id: int):
                     summary_label.text = "Regenerating summary..."
 
                     try:
-                        pdf_b64 = base64.standard_b64encode(pdf_path.read_bytes()).decode("utf-8")
-                        parsed = await llm.parse_paper_with_llm(pdf_b64)
+                        parsed = await extraction.extract(pdf_path.read_bytes(), task="summary")
                         new_summary = parsed.get("summary", "")
                         if new_summary:
                             db.update_paper_summary(paper_id, new_summary)
+                            await asyncio.to_thread(retrieval.update_index, changed=(paper_id,))
                             summary_label.text = new_summary
                             ui.notify("Summary regenerated!", type="positive")
                         else:
@@ -151,14 +170,25 @@ def paper_detail_page(paper_id: int):
         # Concepts
         if concepts:
             with ui.card().classes("w-full"):
-                ui.label("Key Concepts").classes("text-lg font-semibold mb-2")
+                with ui.row().classes("w-full items-center justify-between"):
+                    ui.label("Key Concepts").classes("text-lg font-semibold mb-2")
+                    ui.link("View in graph", f"/graph?paper_id={paper_id}").classes("text-sm")
                 with ui.row().classes("flex-wrap gap-2"):
                     for c in concepts:
                         with ui.badge(c["name"]).props("color=secondary outline"):
                             ui.tooltip(c["description"] or "No description")
 
+        # Related papers, precomputed from shared concepts
+        related_papers = db.get_related_papers(paper_id)
+        if related_papers:
+            with ui.card().classes("w-full"):
+                ui.label("Related Papers").classes("text-lg font-semibold mb-2")
+                for r in related_papers:
+                    with ui.column().classes("w-full gap-0 py-1 border-b"):
+                        ui.link(r["title"], f"/paper/{r['id']}").classes("text-sm font-medium")
+                        ui.label(f"Shares: {', '.join(r['shared'][:6])}").classes("text-xs text-gray-500")
+
         # Previous chats for this paper
-        chats = db.list_chats(paper_id=paper_id)
         if chats:
             with ui.card().classes("w-full"):
                 ui.label("Chat History").classes("text-lg font-semibold mb-2")
@@ -174,9 +204,10 @@ def paper_detail_page(paper_id: int):
 
             notes_container = ui.column().classes("w-full gap-2")
 
-            def render_notes():
+            def render_notes(current_notes: list[dict] | None = None):
                 notes_container.clear()
-                current_notes = db.get_notes_for_paper(paper_id)
+                if current_notes is None:
+                    current_notes = db.get_notes_for_paper(paper_id)
                 with notes_container:
                     if not current_notes:
                         ui.label("No takeaways yet.").classes("text-gray-400 text-sm")
@@ -185,7 +216,7 @@ def paper_detail_page(paper_id: int):
                             ui.label(n["takeaway"]).classes("flex-1 text-sm")
                             ui.label(n["created_at"][:10]).classes("text-xs text-gray-400")
 
-            render_notes()
+            render_notes(notes)
 
             with ui.row().classes("w-full gap-2 mt-2"):
                 note_input = ui.textarea(placeholder="Write a takeaway...").classes("flex-1").props("rows=2")
@@ -1,3 +1,4 @@
+import tempfile
 from pathlib import Path
 from nicegui import ui, events
 from pages.layout import frame
@@ -21,9 +22,10 @@ def upload_page():
             status.text = "Processing PDF..."
             status.classes(remove="text-red-500 text-green-500")
 
+            # A private temp file, so uploads sharing a name cannot overwrite each other before hashing
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                temp_path = Path(f.name)
             try:
-                # Save uploaded file to temp location
-                temp_path = Path("/tmp") / e.file.name
                 temp_path.write_bytes(await e.file.read())
 
                 paper_id = await pdf_processing.process_pdf(temp_path, e.file.name)
@@ -45,6 +47,10 @@ def upload_page():
                 status.classes(add="text-red-500", remove="text-green-500")
                 spinner.visible = False
 
+            finally:
+                # The store keeps its own copy
+                temp_path.unlink(missing_ok=True)
+
         ui.upload(
             label="Drop PDF here or click to browse",
             on_upload=handle_upload,
@@ -1,9 +1,15 @@
-import base64
-import shutil
+import asyncio
 from pathlib import Path
 import db
-import llm
-from config import UPLOAD_DIR
+import extraction
+import graph_layout
+import graph_metrics
+import pdf_store
+import related
+import retrieval
+
+# Upper bound on one ingest, after which a crashed worker's lease lapses
+INGEST_LEASE_TTL = 600
 
 
 class DuplicatePaperError(Exception):
@@ -12,22 +18,35 @@ class DuplicatePaperError(Exception):
         super().__init__(f"Paper already exists (id={paper_id})")
 
 
+class IngestInProgressError(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"{name} is already being processed")
+
+
 async def process_pdf(file_path: Path, original_name: str) -> int:
-    # Check for duplicate
-    existing = db.get_paper_by_filename(original_name)
+    sha256 = await asyncio.to_thread(pdf_store.hash_file, file_path)
+    # Only one worker ingests a given file at a time
+    lease = f"ingest:{sha256}"
+    token = db.acquire_lease(lease, ttl=INGEST_LEASE_TTL)
+    if token is None:
+        raise IngestInProgressError(original_name)
+    try:
+        return await _process_pdf(file_path, original_name, sha256)
+    finally:
+        db.release_lease(lease, token)
+
+
+async def _process_pdf(file_path: Path, original_name: str, sha256: str) -> int:
+    # Check for duplicate content; same-named but different files are separate papers
+    existing = db.get_paper_by_pdf(sha256)
     if existing:
         raise DuplicatePaperError(existing["id"])
 
-    # Save to uploads directory
-    dest = UPLOAD_DIR / original_name
-    if dest != file_path:
-        shutil.copy2(file_path, dest)
-
-    # Base64-encode PDF for LLM document understanding
-    pdf_base64 = base64.standard_b64encode(dest.read_bytes()).decode("utf-8")
+    # Save to the content-addressed store
+    await asyncio.to_thread(pdf_store.store, file_path, sha256)
 
-    # LLM parse — sends PDF directly, no local text extraction needed
-    parsed = await llm.parse_paper_with_llm(pdf_base64)
+    # LLM parse — sends the PDF directly, whole or in page ranges for long documents
+    parsed = await extraction.extract(pdf_store.path_for(sha256).read_bytes())
 
     # Check for duplicate by title
     title = parsed.get("title", "")
@@ -44,6 +63,7 @@ async def process_pdf(file_path: Path, original_name: str) -> int:
         summary=parsed.get("summary", ""),
         source_url=original_name,
         raw_text="",
+        pdf_sha256=sha256,
     )
 
     # Store concepts and link to paper
@@ -65,6 +85,13 @@ async def process_pdf(file_path: Path, original_name: str) -> int:
                 concept_name_to_id[a_name],
                 concept_name_to_id[b_name],
                 link.get("relationship", ""),
+                paper_id,
             )
 
+    # Place the new concepts in the stored graph layout off the event loop
+    await asyncio.to_thread(graph_layout.update_layout)
+    await asyncio.to_thread(retrieval.update_index)
+    await asyncio.to_thread(related.add_paper, paper_id)
+    await asyncio.to_thread(graph_metrics.refresh)
+
     return paper_id
@@ -0,0 +1,104 @@
+"""Content-addressed PDF storage.
+
+Each upload is stored once as UPLOAD_DIR/ab/cd/abcd….pdf, named by its
+SHA-256, and papers reference it through papers.pdf_sha256. A blob's URL
+therefore never changes content, which lets browsers cache it forever.
+"""
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+import db
+from config import UPLOAD_DIR
+
+URL_PREFIX = "/uploads"
+IMMUTABLE = "public, max-age=31536000, immutable"
+MIGRATION_LEASE_TTL = 600
+
+
+def hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _is_sha256(name: str) -> bool:
+    return len(name) == 64 and all(c in "0123456789abcdef" for c in name)
+
+
+def _relative(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf"
+
+
+def path_for(sha256: str) -> Path:
+    return UPLOAD_DIR / _relative(sha256)
+
+
+def url_for(sha256: str) -> str:
+    return f"{URL_PREFIX}/{_relative(sha256)}"
+
+
+def store(src: Path, sha256: str | None = None, move: bool = False) -> str:
+    """Put src into the store unless its content is already there; returns its hash."""
+    sha256 = sha256 or hash_file(src)
+    dest = path_for(sha256)
+    if dest.exists():
+        if move:
+            src.unlink()
+        return sha256
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+    if move:
+        shutil.move(src, tmp)
+    else:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+    return sha256
+
+
+def migrate_uploads() -> int:
+    """Move uploads saved under their original names into the store; returns papers migrated."""
+    token = db.acquire_lease("pdf_migration", ttl=MIGRATION_LEASE_TTL, wait=MIGRATION_LEASE_TTL)
+    if token is None:
+        return 0
+    try:
+        papers = db.get_papers_without_pdf()
+        # Several papers may share one legacy file; move it only after all are mapped
+        by_name: dict[str, list[int]] = {}
+        for p in papers:
+            by_name.setdefault(p["source_url"], []).append(p["id"])
+        migrated = 0
+        for name, ids in by_name.items():
+            legacy = UPLOAD_DIR / name
+            if not legacy.is_file():
+                continue
+            sha256 = hash_file(legacy)
+            store(legacy, sha256)
+            for paper_id in ids:
+                db.set_paper_pdf(paper_id, sha256)
+            legacy.unlink()
+            migrated += len(ids)
+        return migrated
+    finally:
+        db.release_lease("pdf_migration", token)
+
+
+class PdfFiles(StaticFiles):
+    """Static files whose ETag is the content hash in the file name."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        if not _is_sha256(Path(full_path).stem):
+            return super().file_response(full_path, stat_result, scope, status_code)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        response.headers["etag"] = f'"{Path(full_path).stem}"'
+        response.headers["cache-control"] = IMMUTABLE
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,234 @@
+"""Size, cost and budget checks run before every LLM call (see llm._routed).
+
+plan() estimates a request's prompt tokens from its messages: text at about
+CHARS_PER_TOKEN characters a token, and an attached PDF from its page count
+and sampled text, plus PDF_PAGE_TOKENS per page for the page image providers
+send alongside the text. Cost comes from litellm's price map.
+
+A request over its budget (the model's context window, MAX_PROMPT_TOKENS,
+or what CALL_BUDGET_USD buys) is shrunk, cheapest loss first:
+
+1. attached PDFs are sent as their extracted text, without page images
+2. the oldest turns of a conversation are dropped, keeping the context
+   message and the last KEEP_RECENT
+3. the longest text message is cut in the middle
+
+If it still does not fit, or the day's spend plus the estimate would pass
+DAILY_BUDGET_USD, BudgetExceeded is raised and nothing is sent. Estimates are
+logged next to actual usage in llm_route_log; `python routing.py` reports
+the ratio per task and model, which is what the constants here are tuned by.
+"""
+import base64
+import hashlib
+import io
+import math
+from datetime import datetime, timezone
+
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+import config
+import db
+
+CHARS_PER_TOKEN = 4
+# Role and framing tokens per message
+MESSAGE_OVERHEAD = 4
+PDF_PAGE_TOKENS = 1_000
+# Pages whose text is extracted to estimate the token count of the whole document
+SAMPLE_PAGES = 6
+# Expected completion when the caller sets no max_tokens
+COMPLETION_TOKENS = {"parse": 2_000, "summary": 2_000, "reextract": 2_000, "assess": 1_000,
+                     "chat-teach": 800, "chat-zealot": 800}
+KEEP_RECENT = 4
+PDF_CACHE_SIZE = 64
+_PDF_PREFIX = "data:application/pdf;base64,"
+_pdf_token_cache: dict[bytes, int] = {}
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+# ── Estimates ───────────────────────────────────────────────────────────
+
+def inspect_pdf(pdf_bytes: bytes) -> tuple[int, int]:
+    """Page count and estimated text tokens."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    pages = len(reader.pages)
+    if not pages:
+        return 0, 0
+    step = max(1, pages // SAMPLE_PAGES)
+    sample = range(0, pages, step)
+    chars = sum(len(reader.pages[i].extract_text() or "") for i in sample)
+    return pages, chars * pages // len(sample) // CHARS_PER_TOKEN
+
+
+def _pdf_tokens(data_url: str) -> int:
+    # Cached by digest, not by the data itself: a parse retry or fallback model
+    # re-checks the same document, and holding the documents would pin them in memory
+    digest = hashlib.sha256(data_url.encode()).digest()
+    if digest not in _pdf_token_cache:
+        _pdf_token_cache[digest] = _count_pdf_tokens(data_url)
+        while len(_pdf_token_cache) > PDF_CACHE_SIZE:
+            _pdf_token_cache.pop(next(iter(_pdf_token_cache)), None)
+    return _pdf_token_cache[digest]
+
+
+def _count_pdf_tokens(data_url: str) -> int:
+    try:
+        pages, tokens = inspect_pdf(base64.b64decode(data_url[len(_PDF_PREFIX):]))
+    except PyPdfError:
+        return 0  # unreadable here (e.g. encrypted); left to the provider
+    return tokens + pages * PDF_PAGE_TOKENS
+
+
+def _pdf(part: dict) -> str | None:
+    if part.get("type") != "file":
+        return None
+    data = part.get("file", {}).get("file_data", "")
+    return data if data.startswith(_PDF_PREFIX) else None
+
+
+def _text_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _message_tokens(message: dict) -> int:
+    content = message.get("content") or ""
+    if isinstance(content, str):
+        return _text_tokens(content) + MESSAGE_OVERHEAD
+    tokens = MESSAGE_OVERHEAD
+    for part in content:
+        pdf = _pdf(part)
+        tokens += _pdf_tokens(pdf) if pdf else _text_tokens(part.get("text", ""))
+    return tokens
+
+
+def prompt_tokens(messages: list[dict]) -> int:
+    return sum(_message_tokens(m) for m in messages)
+
+
+def cost(info: dict, prompt: int, completion: int) -> float | None:
+    """USD for a call, from litellm model info; None if the model is not priced."""
+    if info.get("input_cost_per_token") is None or info.get("output_cost_per_token") is None:
+        return None
+    return prompt * info["input_cost_per_token"] + completion * info["output_cost_per_token"]
+
+
+def _prompt_limit(info: dict, completion: int) -> int | None:
+    limits = []
+    if info.get("max_input_tokens"):
+        limits.append(info["max_input_tokens"] - completion)
+    if config.MAX_PROMPT_TOKENS:
+        limits.append(config.MAX_PROMPT_TOKENS)
+    price = info.get("input_cost_per_token")
+    if config.CALL_BUDGET_USD and price:
+        limits.append(int((config.CALL_BUDGET_USD - (cost(info, 0, completion) or 0)) / price))
+    return min(limits) if limits else None
+
+
+# ── Trimming ────────────────────────────────────────────────────────────
+
+def _pdf_text(data_url: str) -> str:
+    reader = PdfReader(io.BytesIO(base64.b64decode(data_url[len(_PDF_PREFIX):])))
+    return "\n\n".join(f"[Page {i}]\n{page.extract_text() or ''}" for i, page in enumerate(reader.pages, 1))
+
+
+def _text_part(part: dict) -> dict:
+    try:
+        return {"type": "text", "text": _pdf_text(_pdf(part))}
+    except PyPdfError:
+        return part
+
+
+def _without_page_images(messages: list[dict]) -> list[dict] | None:
+    """The messages with each readable PDF replaced by its text, or None if nothing changed."""
+    out, changed = [], False
+    for m in messages:
+        if isinstance(m.get("content"), list) and any(_pdf(p) for p in m["content"]):
+            parts = [_text_part(p) if _pdf(p) else p for p in m["content"]]
+            if parts != m["content"]:
+                m, changed = {**m, "content": parts}, True
+        out.append(m)
+    return out if changed else None
+
+
+def _drop_history(messages: list[dict], limit: int) -> tuple[list[dict], int]:
+    """Drop the oldest turns after the first (context) message until under `limit`."""
+    head = [m for m in messages if m["role"] == "system"]
+    rest = [m for m in messages if m["role"] != "system"]
+    if len(rest) <= KEEP_RECENT + 1:
+        return messages, 0
+    first, middle, recent = rest[:1], rest[1:-KEEP_RECENT], rest[-KEEP_RECENT:]
+    tokens = prompt_tokens(messages)
+    dropped = 0
+    # Whole user/assistant pairs, so the turns keep alternating
+    while dropped < len(middle) and tokens > limit:
+        for m in middle[dropped:dropped + 2]:
+            tokens -= _message_tokens(m)
+        dropped += 2
+    return head + first + middle[dropped:] + recent, min(dropped, len(middle))
+
+
+def _truncate_longest(messages: list[dict], limit: int) -> tuple[list[dict], int]:
+    """Cut the middle out of the longest text message to get under `limit`; returns characters cut."""
+    over = prompt_tokens(messages) - limit
+    texts = [i for i, m in enumerate(messages) if isinstance(m.get("content"), str) and m["role"] != "system"]
+    if over <= 0 or not texts:
+        return messages, 0
+    i = max(texts, key=lambda j: len(messages[j]["content"]))
+    text = messages[i]["content"]
+    cut = over * CHARS_PER_TOKEN + 64
+    if cut >= len(text) * 0.9:
+        return messages, 0
+    keep = len(text) - cut
+    head, tail = text[:keep * 2 // 3], text[len(text) - (keep - keep * 2 // 3):]
+    out = list(messages)
+    out[i] = {**messages[i], "content": f"{head}\n[… {cut:,} characters omitted …]\n{tail}"}
+    return out, cut
+
+
+# ── Plan ────────────────────────────────────────────────────────────────
+
+def _spent_today() -> float:
+    day = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return db.get_llm_spend(day.isoformat())
+
+
+def plan(task: str, messages: list[dict], max_tokens: int | None, info: dict) -> tuple[list[dict], dict]:
+    """The messages to send, trimmed to budget, and the estimate for them.
+
+    `info` is litellm's model info for the model the request is for (empty if unknown).
+    Raises BudgetExceeded when the request cannot be brought within budget.
+    """
+    completion = max_tokens or COMPLETION_TOKENS.get(task, 1_000)
+    limit = _prompt_limit(info, completion)
+    tokens = prompt_tokens(messages)
+    trimmed = []
+    if limit is not None and tokens > limit:
+        text_only = _without_page_images(messages)
+        if text_only is not None:
+            messages, tokens = text_only, prompt_tokens(text_only)
+            trimmed.append("page images")
+        if tokens > limit:
+            messages, dropped = _drop_history(messages, limit)
+            if dropped:
+                tokens = prompt_tokens(messages)
+                trimmed.append(f"{dropped} earlier messages")
+        if tokens > limit:
+            messages, cut = _truncate_longest(messages, limit)
+            if cut:
+                tokens = prompt_tokens(messages)
+                trimmed.append(f"{cut:,} characters")
+        if tokens > limit:
+            raise BudgetExceeded(f"{task} request is ~{tokens:,} prompt tokens after trimming "
+                                 f"({', '.join(trimmed) or 'nothing to trim'}); the limit is {limit:,}")
+
+    estimate = {"prompt_tokens": tokens, "completion_tokens": completion, "cost_usd": cost(info, tokens, completion),
+                "trimmed": trimmed}
+    if config.DAILY_BUDGET_USD and estimate["cost_usd"] is not None:
+        spent = _spent_today()
+        if spent + estimate["cost_usd"] > config.DAILY_BUDGET_USD:
+            raise BudgetExceeded(f"daily LLM budget of ${config.DAILY_BUDGET_USD:.2f} reached "
+                                 f"(${spent:.2f} spent today, this call ~${estimate['cost_usd']:.3f})")
+    return messages, estimate
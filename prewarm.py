@@ -0,0 +1,124 @@
+"""Speculative chat openers, prepared while the user reads a paper's page.
+
+After DWELL seconds on a paper's detail page, the Zealot's first question
+(plus a Teach overview with PREWARM_TEACH) is generated in the background, so
+it is on screen as soon as an empty chat opens. Only the openers are kept;
+chat inputs are read fresh, so edits from other workers or CLIs show at once.
+Speculation is bounded: at most PREWARM_PER_HOUR generations per process,
+each capped at MAX_TOKENS, and anything not claimed within TTL seconds is
+discarded.
+"""
+import asyncio
+import time
+from collections import Counter, deque
+
+import config
+import db
+import llm
+
+DWELL = 3.0
+TTL = 900
+MAX_TOKENS = 350
+
+OPENER_PROMPTS = {
+    "zealot": "I have read the paper. Start the session.",
+    "teach": "I have just opened this paper. Give me a short overview to start from and suggest where to dig in.",
+}
+SYSTEM_PROMPTS = {"teach": llm.TEACH_SYSTEM, "zealot": llm.ZEALOT_SYSTEM}
+
+# started: generations launched; used: openers shown in a chat; discarded:
+# openers that expired or failed unclaimed; capped: generations refused by the
+# hourly cap
+METRICS = Counter()
+_openers: dict[tuple[int, str], tuple[float, asyncio.Task]] = {}
+_started: deque = deque()
+
+
+def build_paper_context(paper: dict, concepts: list[dict], notes: list[dict]) -> str:
+    concept_list = ", ".join(c["name"] for c in concepts)
+    ctx = (
+        f"Paper: {paper['title']}\n"
+        f"Authors: {', '.join(paper['authors'])}\n"
+        f"Abstract: {paper['abstract']}\n\n"
+        f"Summary: {paper['summary']}\n\n"
+        f"Key concepts: {concept_list}"
+    )
+    if notes:
+        takeaways = "\n".join(f"- {n['takeaway']}" for n in notes)
+        ctx += f"\n\nUser's takeaways:\n{takeaways}"
+    return ctx
+
+
+def opener_request(paper_context: str, agent: str) -> dict:
+    """The user turn an opener answers; chats that start with one replay it to the LLM."""
+    return {"role": "user", "content": f"[Paper Context]\n{paper_context}\n\n[User]\n{OPENER_PROMPTS[agent]}"}
+
+
+def chat_inputs(paper_id: int) -> dict | None:
+    """Paper, concepts, notes and the LLM paper context."""
+    paper = db.get_paper(paper_id)
+    if paper is None:
+        return None
+    concepts = db.get_concepts_for_paper(paper_id)
+    notes = db.get_notes_for_paper(paper_id)
+    return {"paper": paper, "concepts": concepts, "notes": notes,
+            "context": build_paper_context(paper, concepts, notes)}
+
+
+def agents() -> list[str]:
+    return ["zealot", "teach"] if config.PREWARM_TEACH else ["zealot"]
+
+
+def schedule(paper_id: int):
+    """Start generating the paper's openers, unless ready, running, or over the cap."""
+    _expire()
+    now = time.monotonic()
+    while _started and now - _started[0] > 3600:
+        _started.popleft()
+    for agent in agents():
+        if (paper_id, agent) in _openers:
+            continue
+        if len(_started) >= config.PREWARM_PER_HOUR:
+            METRICS["capped"] += 1
+            return
+        _started.append(now)
+        METRICS["started"] += 1
+        task = asyncio.create_task(_generate(paper_id, agent))
+        _openers[(paper_id, agent)] = (now, task)
+
+
+async def _generate(paper_id: int, agent: str) -> str | None:
+    inputs = chat_inputs(paper_id)
+    if inputs is None:
+        return None
+    try:
+        return await llm.complete_chat([opener_request(inputs["context"], agent)], SYSTEM_PROMPTS[agent],
+                                       task=f"chat-{agent}", max_tokens=MAX_TOKENS)
+    except Exception:
+        return None  # the chat falls back to a normal first turn
+
+
+async def claim(paper_id: int, agent: str) -> str | None:
+    """Take the paper's opener for `agent`, waiting for it if still generating."""
+    _expire()
+    entry = _openers.pop((paper_id, agent), None)
+    if entry is None:
+        return None
+    text = await entry[1]
+    if not text:
+        METRICS["discarded"] += 1
+        return None
+    METRICS["used"] += 1
+    return text
+
+
+def _expire():
+    now = time.monotonic()
+    for key, (created, task) in list(_openers.items()):
+        if now - created > TTL and task.done():
+            del _openers[key]
+            METRICS["discarded"] += 1
+
+
+def metrics() -> dict[str, int]:
+    return {name: METRICS[name] for name in ("started", "used", "discarded", "capped")}
@@ -0,0 +1,257 @@
+"""Re-run extraction over the library, e.g. after changing PARSE_PAPER_SYSTEM or the model.
+
+    python reextract.py                      # every paper with a stored PDF
+    python reextract.py --papers 3,7,12      # just these
+    python reextract.py --since 2025-01-01   # papers added on or after a date
+    python reextract.py --resume             # continue the last unfinished run
+    python reextract.py --dry-run            # print the estimate and stop
+
+Extraction uses the "reextract" route (PAPERMIND_ROUTE_REEXTRACT, by default
+the parse route), on at most --concurrency papers at a time. Each paper's
+outcome is checkpointed in reextract_items as it finishes, so an interrupted
+run continues with --resume. Results are diff-applied by
+db.apply_reextraction: concepts are added and removed without touching
+notes, chats or knowledge, and only --fields of the paper are overwritten.
+
+Before starting it prints an estimate and asks for confirmation (--yes
+skips it). The cost estimate comes from each PDF's page count and sampled
+text; the ETA comes from the route's recorded latencies. The final report
+gives throughput, and the actual cost taken from llm_route_log.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from pypdf.errors import PyPdfError
+
+import config
+import db
+import extraction
+import graph_layout
+import graph_metrics
+import llm
+import pdf_store
+import preflight
+import related
+import retrieval
+
+TASK = "reextract"
+# Tokens per LLM call besides the document: system prompt and instructions in, JSON out
+PROMPT_OVERHEAD = 1_000
+COMPLETION_TOKENS = preflight.COMPLETION_TOKENS[TASK]
+ITEM_LEASE_TTL = 1800
+
+
+# ── Estimate ────────────────────────────────────────────────────────────
+
+def _calls(pages: int, tokens: int) -> list[tuple[int, int]]:
+    """(prompt, completion) tokens of each LLM call extraction.extract will make."""
+    # Providers send an image of each page besides its text
+    document = tokens + pages * preflight.PDF_PAGE_TOKENS
+    if extraction.choose_mode(pages, tokens) == "single":
+        return [(document + PROMPT_OVERHEAD, COMPLETION_TOKENS)]
+    sections = -(-pages // extraction.SECTION_PAGES)
+    merge = (sections * COMPLETION_TOKENS + PROMPT_OVERHEAD, COMPLETION_TOKENS)
+    return [(document // sections + PROMPT_OVERHEAD, COMPLETION_TOKENS)] * sections + [merge]
+
+
+def estimate(items: list[dict], concurrency: int) -> dict:
+    """Fills in each item's pages and est_tokens where missing; returns the totals.
+
+    Items whose PDF pypdf cannot read get an "unreadable" error instead.
+    """
+    prompt = completion = calls = missing = unreadable = 0
+    for item in items:
+        path = pdf_store.path_for(item["pdf_sha256"])
+        if not path.exists():
+            missing += 1
+            continue
+        if item.get("pages") is None:
+            try:
+                item["pages"], item["est_tokens"] = extraction.inspect(path.read_bytes())
+            except PyPdfError as e:
+                item["unreadable"] = f"unreadable PDF: {type(e).__name__}: {e}"
+                unreadable += 1
+                continue
+        for p, c in _calls(item["pages"], item["est_tokens"]):
+            prompt, completion, calls = prompt + p, completion + c, calls + 1
+
+    model = config.MODEL_ROUTES[TASK][0]
+    stats = {(s["task"], s["model"]): s for s in db.get_route_stats()}
+    history = stats.get((TASK, model)) or stats.get(("parse", model))
+    per_call = history["avg_duration_ms"] / 1000 if history and history["avg_duration_ms"] else None
+    return {
+        "papers": len(items),
+        "missing_pdf": missing,
+        "unreadable_pdf": unreadable,
+        "model": model,
+        "llm_calls": calls,
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "est_cost_usd": llm.estimate_cost(TASK, prompt, completion),
+        "est_minutes": round(per_call * calls / concurrency / 60, 1) if per_call else None,
+        "latency_samples": history["calls"] if history else 0,
+    }
+
+
+def _print_estimate(est: dict, fields: list[str], concurrency: int):
+    cost = f"${est['est_cost_usd']:.2f}" if est["est_cost_usd"] is not None else "unknown (model not priced)"
+    eta = (f"~{est['est_minutes']} min at concurrency {concurrency} (from {est['latency_samples']} recorded calls)"
+           if est["est_minutes"] is not None else "unknown (no recorded calls on this model yet)")
+    print(f"Re-extracting {est['papers']} papers on {est['model']}, updating {', '.join(fields) or 'concepts only'}",
+          file=sys.stderr)
+    if est["missing_pdf"]:
+        print(f"  {est['missing_pdf']} have no PDF in {config.UPLOAD_DIR} and will fail", file=sys.stderr)
+    if est["unreadable_pdf"]:
+        print(f"  {est['unreadable_pdf']} have a PDF that cannot be read and will be marked failed", file=sys.stderr)
+    print(f"  ~{est['llm_calls']} LLM calls, ~{est['prompt_tokens']:,} prompt and "
+          f"~{est['completion_tokens']:,} completion tokens", file=sys.stderr)
+    print(f"  estimated cost {cost}", file=sys.stderr)
+    print(f"  ETA {eta}", file=sys.stderr)
+
+
+def _confirm() -> bool:
+    try:
+        return input("Start? [y/N] ").strip().lower() in ("y", "yes")
+    except EOFError:
+        return False
+
+
+# ── Run ─────────────────────────────────────────────────────────────────
+
+async def _reextract(run_id: int, item: dict, fields: tuple[str, ...], limit: asyncio.Semaphore) -> str | None:
+    async with limit:
+        # Another process resuming the same run may already have this paper
+        lease = f"reextract:{item['paper_id']}"
+        token = db.acquire_lease(lease, ttl=ITEM_LEASE_TTL)
+        if token is None:
+            return None
+        start = time.perf_counter()
+        try:
+            pdf_bytes = await asyncio.to_thread(pdf_store.path_for(item["pdf_sha256"]).read_bytes)
+            parsed = await extraction.extract(pdf_bytes, task=TASK)
+            result = await asyncio.to_thread(db.apply_reextraction, item["paper_id"], parsed, fields)
+            result["mode"] = parsed["_extraction"]["mode"]
+            status = "done"
+        except Exception as e:
+            result, status = f"{type(e).__name__}: {e}", "failed"
+        finally:
+            db.release_lease(lease, token)
+        db.finish_reextract_item(run_id, item["paper_id"], status, result, round(time.perf_counter() - start, 2))
+        return status
+
+
+async def run(run_id: int, items: list[dict], fields: tuple[str, ...], concurrency: int) -> dict:
+    limit = asyncio.Semaphore(concurrency)
+    outcomes = {"done": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+
+    async def one(item: dict):
+        status = await _reextract(run_id, item, fields, limit)
+        outcomes[status or "skipped"] += 1
+        finished = outcomes["done"] + outcomes["failed"]
+        rate = finished / (time.perf_counter() - start) * 60
+        print(f"[{finished + outcomes['skipped']}/{len(items)}] paper {item['paper_id']} {status or 'skipped'} "
+              f"· {rate:.1f} papers/min", file=sys.stderr)
+
+    await asyncio.gather(*(one(item) for item in items))
+    elapsed = time.perf_counter() - start
+    return {**outcomes, "elapsed_s": round(elapsed, 1),
+            "papers_per_min": round((outcomes["done"] + outcomes["failed"]) / elapsed * 60, 2) if elapsed else None}
+
+
+def _refresh_derived():
+    """Layout for new concepts, graph metrics, related papers and the search index, which all read what changed."""
+    graph_layout.update_layout()
+    graph_metrics.refresh()
+    related.rebuild()
+    retrieval.update_index(full=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", default="", help="comma-separated paper ids (default: all)")
+    parser.add_argument("--since", help="only papers added on or after this ISO date")
+    parser.add_argument("--fields", default="abstract,summary",
+                        help=f"paper columns to overwrite, from {','.join(db.REEXTRACT_FIELDS)} (may be empty)")
+    parser.add_argument("--concurrency", type=int, default=4, help="papers extracted at once")
+    parser.add_argument("--resume", action="store_true", help="continue the last unfinished run")
+    parser.add_argument("--run", type=int, help="continue this run")
+    parser.add_argument("--retry-failed", action="store_true", help="when resuming, retry papers that failed")
+    parser.add_argument("--new", action="store_true", help="start a new run even if one is unfinished")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("-y", "--yes", action="store_true", help="do not ask for confirmation")
+    args = parser.parse_args(argv)
+    db.init_db()
+
+    if args.resume or args.run:
+        current = db.get_reextract_run(args.run)
+        if current is None:
+            parser.error("no unfinished run to resume" if args.run is None else f"no run {args.run}")
+        run_id, fields, unfinished = current["id"], tuple(f for f in current["fields"].split(",") if f), None
+        if args.retry_failed and not args.dry_run:
+            db.retry_failed_reextract_items(run_id)
+        items = db.get_reextract_items(run_id)
+        print(f"Resuming run {run_id}: {current['done']} done, {current['failed']} failed", file=sys.stderr)
+    else:
+        fields = tuple(f for f in args.fields.split(",") if f)
+        unknown = set(fields) - set(db.REEXTRACT_FIELDS)
+        if unknown:
+            parser.error(f"unknown fields: {', '.join(sorted(unknown))}")
+        unfinished = db.get_reextract_run()
+        if unfinished and not args.new:
+            parser.error(f"run {unfinished['id']} is unfinished ({unfinished['done']} done, "
+                         f"{unfinished['pending']} pending); pass --resume to continue it or --new to start another")
+        wanted = {int(p) for p in args.papers.split(",") if p}
+        items = [{"paper_id": p["id"], "pdf_sha256": p["pdf_sha256"]} for p in db.get_papers_with_pdf(args.since)
+                 if not wanted or p["id"] in wanted]
+        run_id = None
+
+    if not items:
+        print("Nothing to re-extract.", file=sys.stderr)
+        return 0
+    est = estimate(items, args.concurrency)
+    _print_estimate(est, list(fields), args.concurrency)
+    if args.dry_run:
+        print(json.dumps(est, indent=2))
+        return 0
+    if not args.yes and not _confirm():
+        return 1
+
+    if run_id is None:
+        if unfinished:
+            db.finish_reextract_run(unfinished["id"])
+        run_id = db.create_reextract_run(items, TASK, config.MODEL_ROUTES[TASK], fields)
+    for item in items:
+        if "unreadable" in item:
+            db.finish_reextract_item(run_id, item["paper_id"], "failed", item["unreadable"], 0)
+    items = [item for item in items if "unreadable" not in item]
+    try:
+        outcome = asyncio.run(run(run_id, items, fields, args.concurrency))
+    except KeyboardInterrupt:
+        print(f"Interrupted; finished papers are saved. Continue with: python reextract.py --run {run_id}",
+              file=sys.stderr)
+        return 130
+    if outcome["done"]:
+        _refresh_derived()
+
+    current = db.get_reextract_run(run_id)
+    # A run with failures stays open for --resume --retry-failed
+    if not current["pending"] and not current["failed"]:
+        db.finish_reextract_run(run_id)
+    spent = [s["cost_usd"] for s in db.get_route_stats(current["started_at"]) if s["task"] == TASK]
+    print(json.dumps({
+        "run": run_id,
+        **outcome,
+        "pending": current["pending"],
+        "failed_total": current["failed"],
+        "est_cost_usd": est["est_cost_usd"],
+        "cost_usd": round(sum(c for c in spent if c), 4) if any(c is not None for c in spent) else None,
+    }, indent=2))
+    return 0 if not current["failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Related papers from concept overlap.
+
+Papers are rows of a sparse paper × concept matrix, weighted by concept IDF
+so that sharing a rare concept counts for more than sharing "neural network".
+Similarity is the cosine between rows. Only the top TOP_K per paper is
+kept, in paper_similarity, so the detail page reads a handful of rows.
+
+An ingest does not build the matrix: it scores the new paper against the
+papers sharing one of its concepts, using their vector lengths from
+paper_norms, then merges it into the lists it now belongs to. Those
+lengths and the scores already in the lists keep the IDF of when they were
+computed, so once the papers added since the last full rebuild exceed
+REBUILD_RATIO of the library everything is rebuilt from scratch. A delete
+recomputes the lists that pointed at the paper against the whole matrix.
+"""
+import numpy as np
+from scipy import sparse
+
+import db
+
+TOP_K = 10
+REBUILD_RATIO = 0.2
+_BLOCK = 512
+LEASE_TTL = 600
+
+
+def _idf(df: np.ndarray, n_papers: int) -> np.ndarray:
+    return (np.log((1 + n_papers) / (1 + df)) + 1).astype(np.float32)
+
+
+def _matrix() -> tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """Row-normalised IDF-weighted paper × concept matrix, the paper id and the norm of each row."""
+    pairs = np.array(db.get_paper_concept_pairs(), dtype=np.int64).reshape(-1, 2)
+    paper_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    _, cols = np.unique(pairs[:, 1], return_inverse=True)
+    n_papers = len(paper_ids)
+    x = sparse.csr_matrix((np.ones(len(pairs), dtype=np.float32), (rows, cols)),
+                          shape=(n_papers, cols.max() + 1 if len(cols) else 0))
+    w = x @ sparse.diags(_idf(np.asarray(x.sum(axis=0)).ravel(), n_papers))
+    norms = np.sqrt(np.asarray(w.multiply(w).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ w), paper_ids, norms
+
+
+def _top_k(w: sparse.csr_matrix, paper_ids: np.ndarray, rows: np.ndarray) -> dict[int, list[tuple[int, float]]]:
+    related = {}
+    for start in range(0, len(rows), _BLOCK):
+        block = rows[start:start + _BLOCK]
+        scores = (w[block] @ w.T).toarray()
+        scores[np.arange(len(block)), block] = 0.0
+        k = min(TOP_K, scores.shape[1])
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for i, row in enumerate(block):
+            picks = sorted(((float(scores[i, j]), int(paper_ids[j])) for j in best[i] if scores[i, j] > 0),
+                           reverse=True)
+            related[int(paper_ids[row])] = [(pid, score) for score, pid in picks]
+    return related
+
+
+def _locked(fn, *args):
+    token = db.acquire_lease("related_papers", ttl=LEASE_TTL, wait=LEASE_TTL)
+    if token is None:
+        return 0
+    try:
+        return fn(*args)
+    finally:
+        db.release_lease("related_papers", token)
+
+
+def _refresh(paper_ids: list[int]) -> int:
+    w, ids, _ = _matrix()
+    rows = np.flatnonzero(np.isin(ids, paper_ids))
+    related = _top_k(w, ids, rows) if len(rows) else {}
+    # Papers left without concepts still get their old list cleared
+    related.update({pid: [] for pid in paper_ids if pid not in related})
+    db.replace_related_papers(related)
+    return len(related)
+
+
+def _add(paper_id: int) -> int:
+    build = db.get_related_build()
+    added = db.count_papers_with_concepts(after_id=build["last_paper_id"] if build else 0)
+    if added > REBUILD_RATIO * max(build["papers"] if build else 0, 1):
+        return _rebuild()
+    frequencies, n_papers = db.get_concept_frequencies(paper_id)
+    if not frequencies:
+        return 0
+    concepts = np.array(list(frequencies), dtype=np.int64)
+    weight = _idf(np.array(list(frequencies.values())), n_papers) ** 2
+    norm = float(np.sqrt(weight.sum()))
+    postings = np.array(db.get_concept_postings(paper_id), dtype=np.float64).reshape(-1, 3)
+    others, rows = np.unique(postings[:, 0].astype(np.int64), return_inverse=True)
+    order = np.argsort(concepts)
+    shared = weight[order][np.searchsorted(concepts[order], postings[:, 1].astype(np.int64))]
+    other_norms = np.zeros(len(others))
+    other_norms[rows] = postings[:, 2]
+    scores = np.bincount(rows, weights=shared, minlength=len(others)) / (norm * other_norms)
+    best = np.argsort(-scores, kind="stable")[:TOP_K]
+    related = {paper_id: [(int(others[j]), float(scores[j])) for j in best]}
+    # The newcomer only enters lists that are short or whose lowest score it beats
+    candidates = dict(zip(others.tolist(), scores.tolist()))
+    floors = db.get_related_floors(list(candidates))
+    affected = [pid for pid, score in candidates.items()
+                if floors.get(pid, (0, 0.0))[0] < TOP_K or score > floors[pid][1]]
+    lists = db.get_related_lists(affected)
+    for pid in affected:
+        merged = [(rid, s) for rid, s in lists.get(pid, []) if rid != paper_id] + [(paper_id, candidates[pid])]
+        related[pid] = sorted(merged, key=lambda pair: pair[1], reverse=True)[:TOP_K]
+    db.replace_related_papers(related)
+    db.set_paper_norms({paper_id: norm})
+    return len(related)
+
+
+def _rebuild() -> int:
+    w, ids, norms = _matrix()
+    related = _top_k(w, ids, np.arange(len(ids))) if len(ids) else {}
+    db.replace_related_papers(related)
+    db.set_paper_norms(dict(zip(ids.tolist(), norms.tolist())))
+    db.record_related_build(len(ids), int(ids.max()) if len(ids) else 0)
+    return len(related)
+
+
+def add_paper(paper_id: int) -> int:
+    """Compute a new paper's related list and insert it into lists it now belongs to.
+
+    Returns the number of lists rewritten.
+    """
+    return _locked(_add, paper_id)
+
+
+def delete_paper(paper_id: int) -> int:
+    """Delete a paper and recompute the lists that pointed at it."""
+    affected = db.get_papers_related_to(paper_id)
+    db.delete_paper(paper_id)
+    return _locked(_refresh, affected) if affected else 0
+
+
+def rebuild() -> int:
+    return _locked(_rebuild)
+
+
+def rebuild_if_empty() -> int:
+    """Fill paper_similarity for libraries from before it existed."""
+    if db.has_related_papers() or db.get_latest_paper_id() is None:
+        return 0
+    return rebuild()
@@ -0,0 +1,250 @@
+"""Passage retrieval across the whole library, for the Ask Library chat.
+
+Each paper is cut into passages: title and abstract, each summary paragraph,
+and its concepts with their descriptions. A passage becomes a TF-IDF vector
+hashed into DIM signed buckets. All vectors sit in one contiguous float32
+file that readers memory-map, so a query is a single matrix-vector product
+and never touches the database until the hits are known.
+
+New papers are appended using the IDF of the last full build. A paper whose
+text changed is appended again, and meta.json records where its current
+passages start so search skips the old ones. Once appended passages reach
+REBUILD_RATIO of the index, it is rebuilt from scratch.
+"""
+import json
+import math
+import os
+import re
+import shutil
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+import config
+import db
+
+DIM = 512
+REBUILD_RATIO = 0.2
+TOP_K = 8
+PER_PAPER = 2
+LEASE_TTL = 600
+INDEX_DIR = config.INDEX_DIR
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from has have how i in into is it its of on or our
+that the their them then there these they this to was we were what when which while who why will with
+""".split())
+_PARAGRAPH = re.compile(r"\n\s*\n|\n")
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+
+
+@lru_cache(maxsize=1 << 18)
+def _bucket(token: str) -> tuple[int, float]:
+    h = zlib.crc32(token.encode())
+    return h % DIM, 1.0 if h & 0x80000000 else -1.0
+
+
+def _vector(tokens: list[str], idf: dict[str, float], default_idf: float) -> np.ndarray:
+    v = np.zeros(DIM, dtype=np.float32)
+    for token, count in Counter(tokens).items():
+        bucket, sign = _bucket(token)
+        v[bucket] += sign * (1 + math.log(count)) * idf.get(token, default_idf)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+def _passages(paper: dict) -> list[tuple[str, list[str]]]:
+    """(text, tokens) per passage; the title is folded into every passage's tokens."""
+    title_tokens = tokenize(paper["title"])
+    texts = [paper["abstract"] or paper["title"]]
+    texts += [p.strip() for p in _PARAGRAPH.split(paper["summary"]) if p.strip()]
+    if paper["concepts"]:
+        texts.append("Concepts: " + "; ".join(
+            f"{c['name']} ({c['description']})" if c["description"] else c["name"] for c in paper["concepts"]
+        ))
+    return [(text, title_tokens + tokenize(text)) for text in texts]
+
+
+# ── Building ────────────────────────────────────────────────────────────
+
+def _read_meta() -> dict | None:
+    path = INDEX_DIR / "meta.json"
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def _write_meta(meta: dict):
+    tmp = INDEX_DIR / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, INDEX_DIR / "meta.json")
+
+
+def _append(gen_dir, papers: list[dict], idf: dict[str, float], default_idf: float, text_bytes: int):
+    """Write the papers' passages to the end of gen_dir's files; returns (passages, text_bytes)."""
+    vectors, paper_ids, ends, texts = [], [], [], []
+    for paper in papers:
+        for text, tokens in _passages(paper):
+            data = text.encode()
+            text_bytes += len(data)
+            vectors.append(_vector(tokens, idf, default_idf))
+            paper_ids.append(paper["id"])
+            ends.append(text_bytes)
+            texts.append(data)
+    if vectors:
+        with open(gen_dir / "vectors.f32", "ab") as f:
+            np.asarray(vectors, dtype=np.float32).tofile(f)
+        with open(gen_dir / "paper_ids.i32", "ab") as f:
+            np.asarray(paper_ids, dtype=np.int32).tofile(f)
+        with open(gen_dir / "ends.i64", "ab") as f:
+            np.asarray(ends, dtype=np.int64).tofile(f)
+        with open(gen_dir / "texts.bin", "ab") as f:
+            f.write(b"".join(texts))
+    return len(vectors), text_bytes
+
+
+def _idf(papers: list[dict]) -> tuple[dict[str, float], float]:
+    df = Counter()
+    n_docs = 0
+    for paper in papers:
+        for _, tokens in _passages(paper):
+            df.update(set(tokens))
+            n_docs += 1
+    idf = {t: math.log((n_docs + 1) / (n + 1)) + 1 for t, n in df.items()}
+    return idf, math.log(n_docs + 1) + 1
+
+
+def _build() -> int:
+    papers = db.get_papers_for_index()
+    idf, default_idf = _idf(papers)
+    meta = _read_meta()
+    generation = (meta["generation"] + 1) if meta else 1
+    gen_dir = INDEX_DIR / f"gen-{generation}"
+    shutil.rmtree(gen_dir, ignore_errors=True)
+    gen_dir.mkdir(parents=True)
+    (gen_dir / "idf.json").write_text(json.dumps({"idf": idf, "default": default_idf}))
+    passages, text_bytes = _append(gen_dir, papers, idf, default_idf, 0)
+    _write_meta({
+        "generation": generation,
+        "passages": passages,
+        "built_passages": passages,
+        "text_bytes": text_bytes,
+        "max_paper_id": papers[-1]["id"] if papers else 0,
+    })
+    # Readers that still have an old generation mapped keep it until they reload
+    for old in INDEX_DIR.glob("gen-*"):
+        if old != gen_dir:
+            shutil.rmtree(old, ignore_errors=True)
+    return passages
+
+
+def update_index(full: bool = False, changed: tuple[int, ...] = ()) -> int:
+    """Index papers added since the last update, and re-index the `changed` ones.
+
+    Returns how many passages were written.
+    """
+    token = db.acquire_lease("retrieval_index", ttl=LEASE_TTL, wait=LEASE_TTL)
+    if token is None:
+        return 0
+    try:
+        meta = _read_meta()
+        if full or meta is None:
+            return _build()
+        papers = db.get_papers_for_index(after_id=meta["max_paper_id"])
+        # Papers not yet indexed are covered by the append below
+        stale = [p for p in db.get_papers_for_index(paper_ids=list(changed)) if p["id"] <= meta["max_paper_id"]] \
+            if changed else []
+        if not papers and not stale:
+            return 0
+        if meta["passages"] - meta["built_passages"] > REBUILD_RATIO * max(meta["built_passages"], 1):
+            return _build()
+        gen_dir = INDEX_DIR / f"gen-{meta['generation']}"
+        stored = json.loads((gen_dir / "idf.json").read_text())
+        # Drop anything a crashed append left past the committed length
+        for name, size in (("vectors.f32", meta["passages"] * DIM * 4), ("paper_ids.i32", meta["passages"] * 4),
+                           ("ends.i64", meta["passages"] * 8), ("texts.bin", meta["text_bytes"])):
+            os.truncate(gen_dir / name, size)
+        passages, text_bytes, live_from = meta["passages"], meta["text_bytes"], dict(meta.get("live_from", {}))
+        for paper in stale:
+            live_from[str(paper["id"])] = passages
+            added, text_bytes = _append(gen_dir, [paper], stored["idf"], stored["default"], text_bytes)
+            passages += added
+        added, text_bytes = _append(gen_dir, papers, stored["idf"], stored["default"], text_bytes)
+        passages += added
+        _write_meta({**meta, "passages": passages, "text_bytes": text_bytes, "live_from": live_from,
+                     "max_paper_id": papers[-1]["id"] if papers else meta["max_paper_id"]})
+        return passages - meta["passages"]
+    finally:
+        db.release_lease("retrieval_index", token)
+
+
+# ── Searching ───────────────────────────────────────────────────────────
+
+_loaded: dict = {"key": None}
+
+
+def _open() -> dict | None:
+    """Memory-map the current index, reusing the mapping until meta.json changes."""
+    try:
+        stat = (INDEX_DIR / "meta.json").stat()
+    except FileNotFoundError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    if _loaded["key"] != key:
+        meta = _read_meta()
+        n = meta["passages"]
+        gen_dir = INDEX_DIR / f"gen-{meta['generation']}"
+        try:
+            stored = json.loads((gen_dir / "idf.json").read_text())
+        except FileNotFoundError:
+            # Replaced by a rebuild between reading meta and opening; keep the old mapping
+            return _loaded if _loaded["key"] else None
+        _loaded.update(
+            key=key,
+            n=n,
+            idf=stored["idf"],
+            default_idf=stored["default"],
+            live_from={int(p): i for p, i in meta.get("live_from", {}).items()},
+            vectors=np.memmap(gen_dir / "vectors.f32", np.float32, "r", shape=(n, DIM)) if n else None,
+            paper_ids=np.memmap(gen_dir / "paper_ids.i32", np.int32, "r", shape=(n,)) if n else None,
+            ends=np.memmap(gen_dir / "ends.i64", np.int64, "r", shape=(n,)) if n else None,
+            texts=np.memmap(gen_dir / "texts.bin", np.uint8, "r") if n else None,
+        )
+    return _loaded
+
+
+def search(query: str, k: int = TOP_K, per_paper: int = PER_PAPER) -> list[dict]:
+    """Top passages for `query`, at most `per_paper` from any one paper, best first."""
+    index = _open()
+    tokens = tokenize(query)
+    if not index or not index["n"] or not tokens:
+        return []
+    q = _vector(tokens, index["idf"], index["default_idf"])
+    scores = index["vectors"] @ q
+    # Over-fetch so the per-paper cap and deleted or superseded passages can't starve the result
+    pool = min(index["n"], k * per_paper * 4)
+    candidates = np.argpartition(-scores, pool - 1)[:pool]
+    candidates = candidates[np.argsort(-scores[candidates])]
+
+    titles = db.get_paper_titles(sorted({int(index["paper_ids"][i]) for i in candidates}))
+    hits, per = [], Counter()
+    for i in candidates:
+        paper_id = int(index["paper_ids"][i])
+        if (scores[i] <= 0 or paper_id not in titles or per[paper_id] >= per_paper
+                or i < index["live_from"].get(paper_id, 0)):
+            continue
+        start = int(index["ends"][i - 1]) if i else 0
+        hits.append({
+            "paper_id": paper_id,
+            "title": titles[paper_id],
+            "text": bytes(index["texts"][start:int(index["ends"][i])]).decode(),
+            "score": float(scores[i]),
+        })
+        per[paper_id] += 1
+        if len(hits) == k:
+            break
+    return hits
@@ -0,0 +1,97 @@
+"""Per-task model routing with latency-aware fallback.
+
+config.MODEL_ROUTES lists the models to try for each task, best first. A
+model is passed over while the p95 of its recent latencies is above the
+task's limit, and the next one is tried when a call fails. The last model is
+always tried. Every decision lands in llm_route_log, so routes can be
+compared on latency and cost, and preflight's estimates on accuracy:
+
+    python routing.py                   # per task and model, all time
+    python routing.py --since 2025-01-01
+"""
+import argparse
+import json
+import sys
+from collections import Counter, deque
+
+import config
+import db
+
+WINDOW = 50
+MIN_SAMPLES = 5
+# A slow model still gets every Nth request, so it can recover once it speeds up
+PROBE_EVERY = 10
+
+_latencies: dict[tuple[str, str], deque] = {}
+_skips = Counter()
+
+
+def models(task: str) -> list[str]:
+    return config.MODEL_ROUTES[task]
+
+
+def _window(task: str, model: str) -> deque:
+    key = (task, model)
+    if key not in _latencies:
+        # Start from what earlier processes observed
+        _latencies[key] = deque(db.get_route_latencies(task, model, WINDOW), maxlen=WINDOW)
+    return _latencies[key]
+
+
+def p95(task: str, model: str) -> float | None:
+    """p95 latency in seconds, or None until there are enough samples."""
+    samples = _window(task, model)
+    if len(samples) < MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] / 1000
+
+
+def skip_reason(task: str, position: int) -> str | None:
+    """Why the model at `position` should be passed over now, or None to try it."""
+    route = models(task)
+    if position == len(route) - 1:
+        return None
+    model = route[position]
+    observed = p95(task, model)
+    limit = config.ROUTE_P95_LIMITS[task]
+    if observed is None or observed <= limit:
+        return None
+    _skips[(task, model)] += 1
+    if _skips[(task, model)] % PROBE_EVERY == 0:
+        return None
+    reason = f"p95 {observed:.1f}s > {limit:.0f}s"
+    db.log_route_decision(task, model, position, "skipped", reason)
+    return reason
+
+
+def record_used(task: str, position: int, reason: str, latency: float, duration: float,
+                prompt_tokens: int | None = None, completion_tokens: int | None = None,
+                cost_usd: float | None = None, estimate: dict | None = None):
+    model = models(task)[position]
+    _window(task, model).append(latency * 1000)
+    db.log_route_decision(task, model, position, "used", reason, latency * 1000, duration * 1000,
+                          prompt_tokens, completion_tokens, cost_usd, estimate)
+
+
+def record_rejected(task: str, reason: str):
+    """A call refused by preflight before any model was tried."""
+    db.log_route_decision(task, models(task)[0], 0, "skipped", f"budget: {reason}"[:300])
+
+
+def record_failed(task: str, position: int, error: Exception, duration: float):
+    db.log_route_decision(task, models(task)[position], position, "failed",
+                          f"{type(error).__name__}: {error}"[:300], duration_ms=duration * 1000)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", help="ISO date or timestamp")
+    args = parser.parse_args(argv)
+    print(json.dumps({"routes": config.MODEL_ROUTES, "p95_limits_s": config.ROUTE_P95_LIMITS,
+                      "stats": db.get_route_stats(args.since)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
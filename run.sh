@@ -10,7 +10,7 @@ fi
 
 source .venv/bin/activate
 
-.venv/bin/pip install -q nicegui litellm python-dotenv
+.venv/bin/pip install -q nicegui litellm python-dotenv numpy scipy pypdf
 
 if [ ! -f .env ]; then
     cp .env.example .env
@@ -18,4 +18,4 @@ if [ ! -f .env ]; then
     exit 1
 fi
 
-exec .venv/bin/python main.py
+NICEGUI_RELOAD=1 exec .venv/bin/python main.py
@@ -0,0 +1,69 @@
+"""Spaced-repetition schedule of tested concepts, kept in user_knowledge.
+
+A concept has a stability S in days, the time for recall to fall to 90%
+(recall decays as 0.9 ** (days / S)), and a difficulty D from 1 to 10. Each
+assessment is a review graded by its confidence, updated FSRS-style with
+fixed rather than fitted weights:
+
+- the first review sets S from the grade, between MIN_STABILITY and
+  FIRST_STABILITY, and D from 10 (nothing known) down
+- a pass (confidence >= PASS) multiplies S by more the better the grade,
+  the easier the concept and the further recall had decayed, so reviewing
+  early barely counts and long-stable concepts grow more slowly
+- a lapse cuts S to a fraction of what it was
+- D rises on poor grades and falls on good ones
+
+The next review is due when recall is predicted to reach RETENTION. due_at
+is indexed, so the dashboard's "Review now" queue is a range scan however
+many concepts have been tested.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+
+PASS = 0.6
+RETENTION = 0.9
+MIN_STABILITY = 0.25
+FIRST_STABILITY = 4.0
+MAX_STABILITY = 365.0
+GROWTH = 4.5
+LAPSE_FACTOR = 0.3
+
+
+def stamp(when: datetime) -> str:
+    """due_at as stored: UTC to the second, so due_at sorts and compares as text."""
+    return when.astimezone(timezone.utc).isoformat(timespec="seconds")
+
+
+def recall(stability: float, days: float) -> float:
+    return 0.9 ** (max(0.0, days) / stability)
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def review(state: dict | None, confidence: float, now: datetime) -> dict:
+    """The schedule after an assessment at `now`.
+
+    `state` is the concept's stability, difficulty, reviews and last_tested
+    from before it, or None (or without a stability) on its first review.
+    """
+    if state is None or state.get("stability") is None:
+        stability = MIN_STABILITY + (FIRST_STABILITY - MIN_STABILITY) * confidence ** 2
+        difficulty = _clamp(10 - 9 * confidence, 1, 10)
+        reviews = 1
+    else:
+        old, difficulty = state["stability"], state["difficulty"]
+        days = (now - datetime.fromisoformat(state["last_tested"])) / timedelta(days=1)
+        retained = recall(old, days)
+        if confidence >= PASS:
+            grade = 0.5 + (confidence - PASS) / (1 - PASS)
+            stability = old * (1 + GROWTH * (11 - difficulty) * old ** -0.2 * (math.exp(1 - retained) - 1) * grade)
+        else:
+            stability = old * LAPSE_FACTOR * (0.5 + confidence / PASS)
+        difficulty = _clamp(difficulty + 5 * (PASS - confidence), 1, 10)
+        reviews = state["reviews"] + 1
+    stability = _clamp(stability, MIN_STABILITY, MAX_STABILITY)
+    interval = stability * math.log(RETENTION) / math.log(0.9)
+    return {"stability": round(stability, 3), "difficulty": round(difficulty, 2), "reviews": reviews,
+            "due_at": stamp(now + timedelta(days=interval))}
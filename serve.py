@@ -0,0 +1,86 @@
+"""Production serving with several worker processes behind one port.
+
+NiceGUI keeps each tab's UI state in the process that rendered the page, so
+the page request and its websocket must reach the same worker. The front
+process is a plain TCP proxy that pins each client IP to one worker, which
+keeps that guarantee without having to understand HTTP or websockets.
+"""
+import asyncio
+import hashlib
+import os
+import signal
+import subprocess
+import sys
+import config
+
+RESTART_DELAY = 1.0
+
+
+def _worker_port(ip: str, ports: list[int]) -> int:
+    digest = hashlib.blake2b(ip.encode(), digest_size=4).digest()
+    return ports[int.from_bytes(digest, "big") % len(ports)]
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _proxy(ports: list[int]):
+    async def handle(client_reader, client_writer):
+        ip = client_writer.get_extra_info("peername")[0]
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", _worker_port(ip, ports))
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(_pipe(client_reader, upstream_writer), _pipe(upstream_reader, client_writer))
+
+    server = await asyncio.start_server(handle, config.NICEGUI_HOST, config.NICEGUI_PORT)
+    async with server:
+        await server.serve_forever()
+
+
+def _spawn(port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "NICEGUI_HOST": "127.0.0.1",
+        "NICEGUI_PORT": str(port),
+        "NICEGUI_RELOAD": "0",
+        "PAPERMIND_WORKERS": "1",
+    }
+    return subprocess.Popen([sys.executable, str(config.BASE_DIR / "main.py")], env=env)
+
+
+async def _supervise(procs: dict[int, subprocess.Popen]):
+    while True:
+        await asyncio.sleep(RESTART_DELAY)
+        for port, proc in procs.items():
+            if proc.poll() is not None:
+                print(f"worker on port {port} exited ({proc.returncode}), restarting", file=sys.stderr)
+                procs[port] = _spawn(port)
+
+
+async def _serve(procs: dict[int, subprocess.Popen]):
+    await asyncio.gather(_proxy(list(procs)), _supervise(procs))
+
+
+def run_workers(n: int):
+    ports = [config.NICEGUI_PORT + 1 + i for i in range(n)]
+    procs = {port: _spawn(port) for port in ports}
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(_serve(procs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            proc.wait()